@@ -0,0 +1,368 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from backend.config import get_settings
+from backend.storage import (
+    get_blob_generation,
+    read_parquet_blob,
+    read_parquet_series,
+)
+
+# Number of locks shared by the cache keys, a load only holds the lock of its key
+LOCK_STRIPES = 64
+
+
+def get_entry_key(blob_name: str, series: Optional[Tuple[int, int]] = None) -> str:
+    """
+    This function returns the cache key of a blob, or of a single series of the blob.
+    """
+
+    if series is None:
+        return blob_name
+
+    return f"{blob_name}/{series[0]}/{series[1]}"
+
+
+@dataclass
+class CacheEntry:
+    """
+    This class holds a cached value of a blob with the generation of the blob it was
+    loaded from and the time of the last generation check.
+    """
+
+    value: Any
+    generation: Optional[int]
+    checked_at: float
+
+
+class DatasetCache:
+    """
+    This class caches the datasets stored in the storage in the process memory.
+
+    A cached dataset is served without any request to the storage for ttl seconds,
+    after which the generation of the blob is checked with a metadata-only request.
+    The dataset is only downloaded again when the generation changed, i.e. the blob
+    was written again. The "invalidate" method marks the datasets as stale, so a
+    publish notification makes the next request check the generation before the TTL.
+
+    Values derived from the datasets, for eg. the encoded responses, are cached with
+    the "get_derived" method and only built again when one of the datasets changed.
+
+    The "aget" and "aget_derived" methods are used by the async endpoints, a fresh
+    value is returned directly and otherwise the storage requests run in a bounded
+    thread pool, so the event loop is never blocked. Concurrent requests of the same
+    value share a single load.
+
+    With a series, i.e. a (municipality_num, branch) tuple, only the series is loaded
+    from the blob and cached, so a cold request reads a single series instead of the
+    whole dataset.
+
+    The cached values and the derived values are kept in two least recently used
+    caches of at most max_entries and max_derived values, so the per series values do
+    not grow without bound.
+
+    Parameters
+    ----------
+    ttl: float, default=30.0
+        Number of seconds a dataset is served before its generation is checked.
+
+    loader: Callable, default=read_parquet_blob
+        A function loading the value of a blob from its name.
+
+    series_loader: Callable, default=read_parquet_series
+        A function loading a series of a blob from its name, municipality number and
+        branch.
+
+    max_workers: int, default=4
+        Maximum number of threads loading the values for the async methods.
+
+    max_entries: int, default=4096
+        Maximum number of cached values of the blobs and series.
+
+    max_derived: int, default=4096
+        Maximum number of cached derived values.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 30.0,
+        loader: Callable[[str], Any] = read_parquet_blob,
+        series_loader: Callable[[str, int, int], Any] = read_parquet_series,
+        max_workers: int = 4,
+        max_entries: int = 4096,
+        max_derived: int = 4096,
+    ):
+        self.ttl = ttl
+        self.loader = loader
+        self.series_loader = series_loader
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="dataset_cache"
+        )
+        self.max_entries = max_entries
+        self.max_derived = max_derived
+        self.entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self.derived: OrderedDict[str, Tuple[Tuple, Any]] = OrderedDict()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "refreshes": 0,
+            "revalidations": 0,
+            "builds": 0,
+            "evictions": 0,
+        }
+        self._lock = threading.Lock()
+        self._key_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def _get_key_lock(self, key: str) -> threading.Lock:
+        return self._key_locks[hash(key) % LOCK_STRIPES]
+
+    def _count(self, stat: str):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _touch(self, cache: OrderedDict, key: str) -> Any:
+        """
+        This method returns the value of the key and marks it as the most recently
+        used, None if the key is not cached.
+        """
+
+        with self._lock:
+            value = cache.get(key)
+            if value is not None:
+                cache.move_to_end(key)
+
+            return value
+
+    def _put(self, cache: OrderedDict, key: str, value: Any, max_size: int):
+        """
+        This method caches the value of the key and evicts the least recently used
+        values above max_size.
+        """
+
+        with self._lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            while len(cache) > max_size:
+                cache.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def _get_fresh_entry(self, entry_key: str) -> Optional[CacheEntry]:
+        entry = self._touch(self.entries, entry_key)
+        if entry is None or time.monotonic() - entry.checked_at >= self.ttl:
+            return None
+
+        return entry
+
+    def _get_fresh_derived(self, name: str, entry_keys: List[str]) -> Any:
+        cached = self.derived.get(name)
+        if cached is None:
+            return None
+
+        entries = [self._get_fresh_entry(key) for key in entry_keys]
+        if any(entry is None for entry in entries):
+            return None
+
+        if cached[0] != tuple(entry.generation for entry in entries):
+            return None
+
+        for _ in entry_keys:
+            self._count("hits")
+
+        return self._touch(self.derived, name)
+
+    def _get_entry(
+        self, blob_name: str, series: Optional[Tuple[int, int]] = None
+    ) -> CacheEntry:
+        """
+        This method returns the cache entry of the blob, or of a single series of the
+        blob, see the "get" method.
+        """
+
+        entry_key = get_entry_key(blob_name=blob_name, series=series)
+        entry = self._get_fresh_entry(entry_key)
+        if entry is not None:
+            self._count("hits")
+            return entry
+
+        # A single request checks and loads the blob, the concurrent requests wait and
+        # reuse its result
+        with self._get_key_lock(entry_key):
+            entry = self._get_fresh_entry(entry_key)
+            if entry is not None:
+                self._count("hits")
+                return entry
+
+            entry = self.entries.get(entry_key)
+            generation = get_blob_generation(blob_name)
+            if entry is not None and generation == entry.generation:
+                entry.checked_at = time.monotonic()
+                self._count("revalidations")
+                return entry
+
+            if series is None:
+                value = self.loader(blob_name)
+            else:
+                value = self.series_loader(blob_name, *series)
+            self._count("misses" if entry is None else "refreshes")
+            entry = CacheEntry(
+                value=value, generation=generation, checked_at=time.monotonic()
+            )
+            self._put(self.entries, entry_key, entry, max_size=self.max_entries)
+
+            return entry
+
+    def get(self, blob_name: str, series: Optional[Tuple[int, int]] = None) -> Any:
+        """
+        This method returns the value of the blob, or of a single series of the blob,
+        from the cache when it is fresh or its generation did not change, otherwise it
+        is loaded from the storage.
+        """
+
+        return self._get_entry(blob_name=blob_name, series=series).value
+
+    def get_derived(
+        self,
+        name: str,
+        blob_names: List[str],
+        builder: Callable[..., Any],
+        series: Optional[Tuple[int, int]] = None,
+    ) -> Any:
+        """
+        This method returns the value built by the builder from the values of the
+        blobs, or of a single series of the blobs, passed in the same order as
+        blob_names. The built value is cached and only built again when the
+        generation of one of the blobs changed.
+        """
+
+        entries = [
+            self._get_entry(blob_name, series=series) for blob_name in blob_names
+        ]
+        key = tuple(entry.generation for entry in entries)
+
+        cached = self._touch(self.derived, name)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        with self._get_key_lock(f"derived:{name}"):
+            cached = self._touch(self.derived, name)
+            if cached is not None and cached[0] == key:
+                return cached[1]
+
+            value = builder(*[entry.value for entry in entries])
+            self._put(self.derived, name, (key, value), max_size=self.max_derived)
+            self._count("builds")
+
+            return value
+
+    async def _run_single_flight(self, key: str, func: Callable[[], Any]) -> Any:
+        """
+        This method runs the function in the thread pool, a concurrent call with the
+        same key awaits the running function instead of running it again.
+        """
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(self.executor, func)
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        # A cancelled request does not cancel the load shared with other requests
+        return await asyncio.shield(future)
+
+    async def aget(
+        self, blob_name: str, series: Optional[Tuple[int, int]] = None
+    ) -> Any:
+        """
+        This method is the async version of the "get" method.
+        """
+
+        entry_key = get_entry_key(blob_name=blob_name, series=series)
+        entry = self._get_fresh_entry(entry_key)
+        if entry is not None:
+            self._count("hits")
+            return entry.value
+
+        return await self._run_single_flight(
+            key=f"blob:{entry_key}", func=lambda: self.get(blob_name, series=series)
+        )
+
+    async def aget_derived(
+        self,
+        name: str,
+        blob_names: List[str],
+        builder: Callable[..., Any],
+        series: Optional[Tuple[int, int]] = None,
+    ) -> Any:
+        """
+        This method is the async version of the "get_derived" method.
+        """
+
+        cached = self._get_fresh_derived(
+            name=name,
+            entry_keys=[get_entry_key(blob_name, series) for blob_name in blob_names],
+        )
+        if cached is not None:
+            return cached[1]
+
+        return await self._run_single_flight(
+            key=f"derived:{name}",
+            func=lambda: self.get_derived(
+                name=name, blob_names=blob_names, builder=builder, series=series
+            ),
+        )
+
+    def invalidate(self, blob_name: Optional[str] = None) -> int:
+        """
+        This method marks the cached values of the blob and its series as stale, by
+        default all the cached values, so their generation is checked on the next
+        request. The number of invalidated values is returned.
+        """
+
+        with self._lock:
+            cached_entries = list(self.entries.items())
+
+        entries = [
+            entry
+            for name, entry in cached_entries
+            if blob_name is None
+            or name == blob_name
+            or name.startswith(f"{blob_name}/")
+        ]
+        for entry in entries:
+            entry.checked_at = float("-inf")
+
+        return len(entries)
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        This method returns the hit, miss, refresh, revalidation, build and eviction
+        counts of the cache and the number of cached values and derived values.
+        """
+
+        with self._lock:
+            return {
+                **self.stats,
+                "entries": len(self.entries),
+                "derived": len(self.derived),
+            }
+
+
+@lru_cache()
+def get_dataset_cache() -> DatasetCache:
+    """
+    This function returns the dataset cache of the process.
+    """
+
+    return DatasetCache(
+        ttl=get_settings().DATASET_CACHE_TTL_SECONDS,
+        max_workers=get_settings().DATASET_CACHE_MAX_WORKERS,
+        max_entries=get_settings().DATASET_CACHE_MAX_ENTRIES,
+        max_derived=get_settings().DATASET_CACHE_MAX_DERIVED,
+    )
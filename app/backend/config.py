@@ -1,5 +1,6 @@
 import enum
 from functools import lru_cache
+from typing import Optional
 
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -42,12 +43,30 @@ class Settings(BaseSettings):
     WORKERS_COUNT: int = 1
     RELOAD: bool = False
 
-    # Google cloud configuration
-    GCP_PROJECT: str = Field(alias="GOOGLE_CLOUD_PROJECT")
-    GCP_BUCKET_NAME: str = Field(alias="GOOGLE_CLOUD_BUCKET_NAME")
-    GCP_SERVICE_ACCOUNT_FILE: str = Field(
-        alias="GOOGLE_CLOUD_SERVICE_ACCOUNT_JSON_PATH"
+    # Google cloud configuration, only needed when the data is stored in GCS
+    GCP_PROJECT: Optional[str] = Field(default=None, alias="GOOGLE_CLOUD_PROJECT")
+    GCP_BUCKET_NAME: Optional[str] = Field(
+        default=None, alias="GOOGLE_CLOUD_BUCKET_NAME"
     )
+    GCP_SERVICE_ACCOUNT_FILE: Optional[str] = Field(
+        default=None, alias="GOOGLE_CLOUD_SERVICE_ACCOUNT_JSON_PATH"
+    )
+
+    # Storage URL of the data, for eg. "file:///data/bucket" or "memory://bucket",
+    # by default the GCS bucket "gs://<GOOGLE_CLOUD_BUCKET_NAME>"
+    STORAGE_URL: Optional[str] = Field(default=None, alias="STORAGE_URL")
+
+    # Number of seconds a cached dataset is served before the generation of its blob
+    # is checked in the storage
+    DATASET_CACHE_TTL_SECONDS: float = 30.0
+
+    # Maximum number of threads reading the datasets from the storage
+    DATASET_CACHE_MAX_WORKERS: int = 4
+
+    # Maximum number of cached datasets and series, and of cached response bodies and
+    # indexes built from them, the least recently used are evicted
+    DATASET_CACHE_MAX_ENTRIES: int = 4096
+    DATASET_CACHE_MAX_DERIVED: int = 4096
 
 
 @lru_cache()
@@ -1,20 +1,57 @@
-from typing import Dict, List
+import datetime
+from typing import Callable, Dict, List, Optional
 
-import gcsfs
-import pandas as pd
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Query, Response, status
+from starlette.concurrency import run_in_threadpool
 
 from backend import schemas
+from backend.cache import get_dataset_cache
 from backend.config import get_settings
-
-gcs_filesystem = gcsfs.GCSFileSystem(
-    project=get_settings().GCP_PROJECT,
-    token=get_settings().GCP_SERVICE_ACCOUNT_FILE,
+from backend.responses import (
+    build_batch_prediction_response,
+    build_metrics_response,
+    build_monitor_prediction_responses,
+    build_prediction_index,
+    build_prediction_response,
+    build_prediction_responses,
 )
+from backend.storage import is_series_blob
 
 api_router = APIRouter()
 
 
+async def get_series_response(
+    name: str,
+    blob_names: List[str],
+    builder: Callable,
+    municipality_number: int,
+    branch: int,
+) -> Optional[bytes]:
+    """
+    This function gets the response body of a series from the dataset cache, the
+    body is built again when the blobs change. Only the series is read from the blobs
+    with a row group for every series, the other blobs are read whole once and the
+    bodies of all their series are built together. None is returned if the series
+    does not exists.
+    """
+
+    series = (municipality_number, branch)
+
+    if all(is_series_blob(blob_name) for blob_name in blob_names):
+        return await get_dataset_cache().aget_derived(
+            name=f"{name}/{municipality_number}/{branch}",
+            blob_names=blob_names,
+            builder=lambda *dataframes: builder(*dataframes).get(series),
+            series=series,
+        )
+
+    responses = await get_dataset_cache().aget_derived(
+        name=name, blob_names=blob_names, builder=builder
+    )
+
+    return responses.get(series)
+
+
 @api_router.get(
     path="/health",
     response_model=schemas.HealthCheck,
@@ -34,6 +71,34 @@ def health() -> Dict:
     return health_check_data.model_dump()
 
 
+@api_router.get(
+    path="/cache/stats",
+    response_model=schemas.CacheStats,
+    status_code=status.HTTP_200_OK,
+)
+def cache_stats() -> Dict[str, int]:
+    """
+    This endpoint gets the hit, miss, refresh, revalidation and eviction counts of
+    the dataset cache, and the number of cached datasets and derived values.
+    """
+
+    return get_dataset_cache().get_stats()
+
+
+@api_router.post(
+    path="/cache/invalidate",
+    response_model=schemas.CacheInvalidation,
+    status_code=status.HTTP_200_OK,
+)
+def cache_invalidate(blob_name: Optional[str] = None) -> Dict[str, int]:
+    """
+    This endpoint is notified when the datasets are published, the cached datasets
+    are marked as stale and their generation is checked on the next request.
+    """
+
+    return {"invalidated": get_dataset_cache().invalidate(blob_name=blob_name)}
+
+
 @api_router.get(
     path="/municipality_number_values",
     response_model=schemas.UniqueMunicipalityNumber,
@@ -44,11 +109,8 @@ def municipality_number_values() -> Dict[str, List]:
     This endpoint gets the unique municipality number from the stored data in GCS.
     """
 
-    # Connecting to GCS filesystem and downloading the data
-    input_df = pd.read_parquet(
-        path=f"{get_settings().GCP_BUCKET_NAME}/input.parquet",
-        filesystem=gcs_filesystem,
-    )
+    # Getting the data from the dataset cache
+    input_df = get_dataset_cache().get(blob_name="input.parquet")
 
     unique_municipality_number = list(input_df.index.unique(level="municipality_num"))
 
@@ -65,11 +127,8 @@ def branch_values() -> Dict[str, List]:
     This endpoint gets the unique branch values from the stored data in GCS.
     """
 
-    # Connecting to GCS filesystem and downloading the data
-    input_df = pd.read_parquet(
-        path=f"{get_settings().GCP_BUCKET_NAME}/input.parquet",
-        filesystem=gcs_filesystem,
-    )
+    # Getting the data from the dataset cache
+    input_df = get_dataset_cache().get(blob_name="input.parquet")
 
     unique_branch = list(input_df.index.unique(level="branch"))
 
@@ -81,41 +140,51 @@ def branch_values() -> Dict[str, List]:
     response_model=schemas.PredictionResults,
     status_code=status.HTTP_200_OK,
 )
-async def get_prediction(municipality_number: int, branch: int) -> Dict[str, List]:
+async def get_prediction(
+    municipality_number: int,
+    branch: int,
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+    max_points: Optional[int] = Query(default=None, ge=3),
+) -> Response:
     """
     This endpoint gets the forecasted prediction for the provided municipality number
-    and branch from the stored data in GCS.
+    and branch from the stored data in GCS, optionally between the start and end
+    datetimes. With max_points the historical and prediction data are downsampled to
+    at most max_points points, from the hourly, daily or weekly averages.
     """
 
-    # Connecting to GCS filesystem and downloading the data
-    historical_df = pd.read_parquet(
-        path=f"{get_settings().GCP_BUCKET_NAME}/target.parquet",
-        filesystem=gcs_filesystem,
-    )
-    prediction_df = pd.read_parquet(
-        path=f"{get_settings().GCP_BUCKET_NAME}/prediction.parquet",
-        filesystem=gcs_filesystem,
-    )
-
-    # Filtering the dataframe with the provided municipality number and brach values
-    try:
-        historical_df = historical_df.xs(
-            key=(municipality_number, branch), level=["municipality_num", "branch"]
+    series = (municipality_number, branch)
+    series_blob_names = ["target_by_series.parquet", "prediction_by_series.parquet"]
+
+    if start is None and end is None and max_points is None:
+        # Getting the response body of the series, only the row group of the series
+        # is read from the blobs with a row group for every series
+        body = await get_series_response(
+            name="prediction",
+            blob_names=series_blob_names,
+            builder=build_prediction_responses,
+            municipality_number=municipality_number,
+            branch=branch,
         )
-        prediction_df = prediction_df.xs(
-            key=(municipality_number, branch), level=["municipality_num", "branch"]
+    else:
+        # Getting the index of the series with its resolution levels, it is built
+        # once every time the data changes
+        prediction_index = await get_dataset_cache().aget_derived(
+            name=f"prediction_index/{municipality_number}/{branch}",
+            blob_names=series_blob_names,
+            builder=build_prediction_index,
+            series=series,
         )
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=(
-                "Data not found for the provided municipality number: "
-                f"{municipality_number} and branch: {branch}.\nException "
-                f"error detail as follows:\n\t{e}"
-            ),
+        body = build_prediction_response(
+            prediction_index=prediction_index,
+            series_key=series,
+            start=start,
+            end=end,
+            max_points=max_points,
         )
 
-    if len(historical_df) == 0 or len(prediction_df) == 0:
+    if body is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=(
@@ -124,27 +193,40 @@ async def get_prediction(municipality_number: int, branch: int) -> Dict[str, Lis
             ),
         )
 
-    # Returning the latest data that is been observed
-    # historical_df = historical_df.sort_index().tail(24 * 31)
+    return Response(content=body, media_type="application/json")
 
-    # Returning the datetime and consumption for both the dataframe in list format
-    historical_datetime = (
-        historical_df.index.get_level_values("datetime_dk").astype("int64").to_list()
-    )
-    historical_consumption = historical_df.consumption_kwh.to_list()
-    prediction_datetime = (
-        prediction_df.index.get_level_values("datetime_dk").astype("int64").to_list()
+
+@api_router.post(
+    path="/prediction/batch",
+    response_model=schemas.BatchPredictionResults,
+    status_code=status.HTTP_200_OK,
+)
+async def get_batch_prediction(request: schemas.BatchPredictionRequest) -> Response:
+    """
+    This endpoint gets the forecasted prediction of many municipality numbers and
+    branches in a single request, optionally between the start and end datetimes and
+    downsampled to max_points points.
+    The series that are not found are returned in the "missing" list.
+    """
+
+    # Getting the index of every series, it is built once every time the data changes
+    prediction_index = await get_dataset_cache().aget_derived(
+        name="prediction_index",
+        blob_names=["target_by_series.parquet", "prediction_by_series.parquet"],
+        builder=build_prediction_index,
     )
-    prediction_consumption = prediction_df.consumption_kwh.to_list()
 
-    result = {
-        "historical_datetime": historical_datetime,
-        "historical_consumption": historical_consumption,
-        "prediction_datetime": prediction_datetime,
-        "prediction_consumption": prediction_consumption,
-    }
+    # Encoding the response outside of the event loop
+    body = await run_in_threadpool(
+        build_batch_prediction_response,
+        prediction_index=prediction_index,
+        series_keys=[(key.municipality_number, key.branch) for key in request.series],
+        start=request.start,
+        end=request.end,
+        max_points=request.max_points,
+    )
 
-    return result
+    return Response(content=body, media_type="application/json")
 
 
 @api_router.get(
@@ -152,18 +234,19 @@ async def get_prediction(municipality_number: int, branch: int) -> Dict[str, Lis
     response_model=schemas.MonitorMetrics,
     status_code=status.HTTP_200_OK,
 )
-async def get_metrics() -> Dict[str, List]:
+async def get_metrics() -> Response:
     """
     This endpoint get the performance metrics stored in the GCS.
     """
 
-    # Connecting to GCS filesystem and downloading the data
-    metrics_df = pd.read_parquet(
-        path=f"{get_settings().GCP_BUCKET_NAME}/performance_metrics.parquet",
-        filesystem=gcs_filesystem,
+    # Getting the response body, it is built once every time the data changes
+    body = await get_dataset_cache().aget_derived(
+        name="metrics",
+        blob_names=["performance_metrics.parquet"],
+        builder=build_metrics_response,
     )
 
-    if len(metrics_df) == 0:
+    if body is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=(
@@ -171,13 +254,7 @@ async def get_metrics() -> Dict[str, List]:
             ),
         )
 
-    datetime = metrics_df.index.astype("int64").to_list()
-    mape = metrics_df.mape.to_list()
-    rmspe = metrics_df.rmspe.to_list()
-
-    result = {"datetime": datetime, "mape": mape, "rmspe": rmspe}
-
-    return result
+    return Response(content=body, media_type="application/json")
 
 
 @api_router.get(
@@ -185,44 +262,23 @@ async def get_metrics() -> Dict[str, List]:
     response_model=schemas.MonitorPrediction,
     status_code=status.HTTP_200_OK,
 )
-async def get_cached_prediction(
-    municipality_number: int, branch: int
-) -> Dict[str, List]:
+async def get_cached_prediction(municipality_number: int, branch: int) -> Response:
     """
     This endpoint gets the forecasted cached prediction and its ground truth dataframe
     from GCS to monitor the prediction performance of the model by comparing
     it with the ground truth.
     """
 
-    # Connecting to GCS filesystem and downloading the data
-    ground_truth_df = pd.read_parquet(
-        path=f"{get_settings().GCP_BUCKET_NAME}/ground_truth.parquet",
-        filesystem=gcs_filesystem,
+    # Getting the response body of the series, the blobs are read whole as they do
+    # not have a row group for every series
+    body = await get_series_response(
+        name="monitor_prediction",
+        blob_names=["ground_truth.parquet", "cached_prediction.parquet"],
+        builder=build_monitor_prediction_responses,
+        municipality_number=municipality_number,
+        branch=branch,
     )
-    cached_prediction_df = pd.read_parquet(
-        path=f"{get_settings().GCP_BUCKET_NAME}/cached_prediction.parquet",
-        filesystem=gcs_filesystem,
-    )
-
-    # Filtering the dataframe with the provided municipality number and brach values
-    try:
-        ground_truth_df = ground_truth_df.xs(
-            key=(municipality_number, branch), level=["municipality_num", "branch"]
-        )
-        cached_prediction_df = cached_prediction_df.xs(
-            key=(municipality_number, branch), level=["municipality_num", "branch"]
-        )
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=(
-                "Data not found for the provided municipality number: "
-                f"{municipality_number} and branch: {branch}.\nException "
-                f"error detail as follows:\n\t{e}"
-            ),
-        )
-
-    if len(ground_truth_df) == 0 or len(cached_prediction_df) == 0:
+    if body is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=(
@@ -231,23 +287,4 @@ async def get_cached_prediction(
             ),
         )
 
-    # Returning the datetime and consumption for both the dataframe in list format
-    ground_truth_datetime = (
-        ground_truth_df.index.get_level_values("datetime_dk").astype("int64").to_list()
-    )
-    ground_truth_consumption = ground_truth_df.consumption_kwh.to_list()
-    cached_prediction_datetime = (
-        cached_prediction_df.index.get_level_values("datetime_dk")
-        .astype("int64")
-        .to_list()
-    )
-    cached_prediction_consumption = cached_prediction_df.consumption_kwh.to_list()
-
-    result = {
-        "ground_truth_datetime": ground_truth_datetime,
-        "ground_truth_consumption": ground_truth_consumption,
-        "cached_prediction_datetime": cached_prediction_datetime,
-        "cached_prediction_consumption": cached_prediction_consumption,
-    }
-
-    return result
+    return Response(content=body, media_type="application/json")
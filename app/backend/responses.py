@@ -0,0 +1,515 @@
+import datetime
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+SERIES_LEVELS = ["municipality_num", "branch"]
+
+# Time zone of the series datetimes, they are stored as naive Danish local times
+SERIES_TIMEZONE = "Europe/Copenhagen"
+
+# Resolution levels of the series index with their bucket size in hours, the epoch
+# (1970-01-01) is a Thursday so the weekly buckets are shifted by 3 days to start
+# on Monday
+RESOLUTION_HOURS = {"hourly": 1, "daily": 24, "weekly": 24 * 7}
+RESOLUTION_OFFSET_HOURS = {"hourly": 0, "daily": 0, "weekly": 24 * 3}
+
+# A resolution level is downsampled to max_points when it has at most this many
+# times max_points points, otherwise the next coarser level is used
+LEVEL_POINTS_FACTOR = 4
+
+
+def to_json_list(array: np.ndarray) -> List:
+    """
+    This function converts an array to a list of python values, the missing values
+    are converted to None (null in JSON).
+    """
+
+    if array.dtype.kind == "f" and np.isnan(array).any():
+        array = array.astype(object)
+        array[pd.isna(array)] = None
+
+    return array.tolist()
+
+
+def encode_json(content: Dict) -> bytes:
+    """
+    This function encodes the content as compact JSON bytes.
+    """
+
+    return json.dumps(content, separators=(",", ":")).encode("utf-8")
+
+
+@dataclass
+class SeriesIndex:
+    """
+    This class holds the datetime and value arrays of every series of a dataset,
+    keyed by municipality number and branch. The datetimes are sorted and converted
+    to integers, the original datetime dtype is kept to convert the time ranges.
+
+    The levels hold the series averaged over coarser resolutions (for eg. "daily"
+    and "weekly") with the start of every bucket as datetime, see
+    "add_resolution_levels".
+    """
+
+    series: Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]]
+    datetime_dtype: Any
+    levels: Dict[str, Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]]] = field(
+        default_factory=dict
+    )
+
+
+def build_series_index(
+    dataframe: pd.DataFrame, column: str = "consumption_kwh"
+) -> SeriesIndex:
+    """
+    This function splits the dataframe indexed by municipality_num, branch and
+    datetime_dk into the datetime and column arrays of every series. The datetimes
+    are converted to integers once for the whole dataframe.
+    """
+
+    datetime_index = dataframe.index.get_level_values("datetime_dk")
+    datetime_values = np.asarray(datetime_index.astype("int64"))
+    column_values = dataframe[column].to_numpy()
+
+    series = {}
+    for key, positions in dataframe.groupby(
+        level=SERIES_LEVELS, sort=False
+    ).indices.items():
+        positions = positions[np.argsort(datetime_values[positions], kind="stable")]
+        series[(int(key[0]), int(key[1]))] = (
+            datetime_values[positions],
+            column_values[positions],
+        )
+
+    return SeriesIndex(series=series, datetime_dtype=datetime_index.dtype)
+
+
+def get_hour_unit(datetime_dtype: Any) -> Optional[int]:
+    """
+    This function returns the number of integer datetime units in an hour for the
+    datetime dtype, None if the resolution levels are not supported by the dtype.
+    """
+
+    if isinstance(datetime_dtype, pd.PeriodDtype):
+        return 1 if datetime_dtype.freq == pd.offsets.Hour() else None
+
+    if np.dtype(datetime_dtype).kind == "M":
+        return int(
+            np.timedelta64(1, "h")
+            / np.timedelta64(1, np.datetime_data(datetime_dtype)[0])
+        )
+
+    return None
+
+
+def aggregate_series(
+    datetimes: np.ndarray, values: np.ndarray, bucket_size: int, offset: int = 0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    This function averages the sorted series over buckets of bucket_size integer
+    datetime units, shifted by offset units. The start of every bucket is returned
+    as datetime, the missing values are ignored.
+    """
+
+    if len(datetimes) == 0:
+        return datetimes, values
+
+    buckets = np.floor_divide(datetimes + offset, bucket_size)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+
+    is_valid = ~np.isnan(values)
+    sums = np.add.reduceat(np.where(is_valid, values, 0.0), starts)
+    counts = np.add.reduceat(is_valid.astype("int64"), starts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.where(counts > 0, sums / counts, np.nan)
+
+    return buckets[starts] * bucket_size - offset, means
+
+
+def add_resolution_levels(series_index: SeriesIndex) -> SeriesIndex:
+    """
+    This function adds the coarser resolution levels of "RESOLUTION_HOURS" to the
+    series index, the index is returned without levels if its datetime dtype does
+    not support them.
+    """
+
+    hour_unit = get_hour_unit(series_index.datetime_dtype)
+    if hour_unit is None:
+        return series_index
+
+    for resolution, hours in RESOLUTION_HOURS.items():
+        if hours == 1:
+            continue
+
+        series_index.levels[resolution] = {
+            key: aggregate_series(
+                datetimes=datetimes,
+                values=values.astype("float64"),
+                bucket_size=hours * hour_unit,
+                offset=RESOLUTION_OFFSET_HOURS[resolution] * hour_unit,
+            )
+            for key, (datetimes, values) in series_index.series.items()
+        }
+
+    return series_index
+
+
+def downsample_lttb(
+    datetimes: np.ndarray, values: np.ndarray, n_out: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    This function downsamples the series to n_out points with the Largest Triangle
+    Three Buckets algorithm. The first and last points are kept and the points in
+    between are split in n_out - 2 buckets, from every bucket the point forming the
+    largest triangle with its neighbour buckets is selected.
+
+    All the buckets are solved at once, so the average of the previous bucket is
+    used as the first vertex of the triangle instead of the point selected in the
+    previous bucket.
+
+    The missing values are excluded from the averages and never selected, a bucket
+    whose triangles cannot be computed selects its first valid point, and a bucket
+    without any valid point keeps a missing value so the gap stays visible.
+    """
+
+    n_points = len(datetimes)
+    if n_out >= n_points or n_out < 3:
+        return datetimes, values
+
+    x = datetimes.astype("float64")
+    y = values.astype("float64")
+    is_valid = np.isfinite(y)
+
+    # Splitting the inner points in buckets of contiguous points
+    edges = np.linspace(1, n_points - 1, n_out - 1).astype("int64")
+    starts = edges[:-1]
+    bucket_ids = np.repeat(np.arange(n_out - 2), np.diff(edges))
+    positions = np.arange(1, n_points - 1)
+
+    # Averages of the valid points of every bucket, with the first and last points as
+    # the outer buckets
+    counts = np.add.reduceat(is_valid[1:-1].astype("int64"), starts - 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x_mean = np.r_[
+            x[0],
+            np.add.reduceat(np.where(is_valid, x, 0.0)[1:-1], starts - 1) / counts,
+            x[-1],
+        ]
+        y_mean = np.r_[
+            y[0],
+            np.add.reduceat(np.where(is_valid, y, 0.0)[1:-1], starts - 1) / counts,
+            y[-1],
+        ]
+
+    # Area of the triangle between the previous bucket average, the point and the
+    # next bucket average, an area that cannot be computed is 0 for a valid point
+    x_prev, y_prev = x_mean[bucket_ids], y_mean[bucket_ids]
+    x_next, y_next = x_mean[bucket_ids + 2], y_mean[bucket_ids + 2]
+    with np.errstate(invalid="ignore"):
+        areas = np.abs(
+            (x_prev - x_next) * (y[positions] - y_prev)
+            - (x_prev - x[positions]) * (y_next - y_prev)
+        )
+    areas = np.where(np.isfinite(areas), areas, 0.0)
+    areas[~is_valid[positions]] = -np.inf
+
+    # Selecting the first point with the largest area of every bucket
+    is_largest = areas == np.maximum.reduceat(areas, starts - 1)[bucket_ids]
+    _, first = np.unique(bucket_ids[is_largest], return_index=True)
+    selected = np.r_[0, positions[is_largest][first], n_points - 1]
+
+    return datetimes[selected], values[selected]
+
+
+def select_series_points(
+    series_index: SeriesIndex,
+    key: Tuple[int, int],
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    max_points: Optional[int] = None,
+) -> Tuple[np.ndarray, np.ndarray, str]:
+    """
+    This function selects the points of a series between the start and end integer
+    datetimes (both included). With max_points, the finest resolution level with at
+    most LEVEL_POINTS_FACTOR * max_points points in the time range is selected and
+    downsampled to max_points points with LTTB. The resolution of the points is
+    returned with them.
+    """
+
+    datetimes, values = slice_series(*series_index.series[key], start, end)
+    if max_points is None or len(datetimes) <= max_points:
+        return datetimes, values, "hourly"
+
+    resolution = "hourly"
+    hour_unit = get_hour_unit(series_index.datetime_dtype)
+    for level, level_series in series_index.levels.items():
+        if len(datetimes) <= LEVEL_POINTS_FACTOR * max_points:
+            break
+
+        # Including the bucket containing the start datetime
+        level_start = start
+        if start is not None:
+            bucket_size = RESOLUTION_HOURS[level] * hour_unit
+            offset = RESOLUTION_OFFSET_HOURS[level] * hour_unit
+            level_start = (start + offset) // bucket_size * bucket_size - offset
+
+        datetimes, values = slice_series(*level_series[key], level_start, end)
+        resolution = level
+
+    datetimes, values = downsample_lttb(
+        datetimes=datetimes, values=values, n_out=max_points
+    )
+
+    return datetimes, values, resolution
+
+
+def to_datetime_value(date_time: datetime.datetime, datetime_dtype: Any) -> int:
+    """
+    This function converts a datetime to the integer datetime of a series index, a
+    timezone-aware datetime is first converted to the naive Danish local time of the
+    series.
+    """
+
+    timestamp = pd.Timestamp(date_time)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert(SERIES_TIMEZONE).tz_localize(None)
+
+    if isinstance(datetime_dtype, pd.PeriodDtype):
+        return pd.Period(timestamp, freq=datetime_dtype.freq).ordinal
+
+    return timestamp.as_unit("ns").value
+
+
+def slice_series(
+    datetimes: np.ndarray,
+    values: np.ndarray,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    This function selects the points of a series between the start and end integer
+    datetimes (both included) with a binary search on the sorted datetimes.
+    """
+
+    start_position = 0 if start is None else np.searchsorted(datetimes, start, "left")
+    end_position = (
+        len(datetimes) if end is None else np.searchsorted(datetimes, end, "right")
+    )
+
+    return datetimes[start_position:end_position], values[start_position:end_position]
+
+
+def get_series_columns(
+    dataframe: pd.DataFrame, column: str = "consumption_kwh"
+) -> Dict[Tuple[int, int], Tuple[List, List]]:
+    """
+    This function returns the datetime and column values of every series in the
+    dataframe as lists, see "build_series_index".
+    """
+
+    return {
+        key: (datetimes.tolist(), to_json_list(values))
+        for key, (datetimes, values) in build_series_index(
+            dataframe=dataframe, column=column
+        ).series.items()
+    }
+
+
+def build_series_responses(
+    first_df: pd.DataFrame,
+    second_df: pd.DataFrame,
+    first_name: str,
+    second_name: str,
+) -> Dict[Tuple[int, int], bytes]:
+    """
+    This function builds the response body of every series present in both the
+    dataframes, keyed by municipality number and branch. A body contains the
+    "{first_name}_datetime", "{first_name}_consumption", "{second_name}_datetime" and
+    "{second_name}_consumption" lists encoded as JSON bytes.
+    """
+
+    first_columns = get_series_columns(first_df)
+    second_columns = get_series_columns(second_df)
+
+    responses = {}
+    for key in first_columns.keys() & second_columns.keys():
+        first_datetime, first_consumption = first_columns[key]
+        second_datetime, second_consumption = second_columns[key]
+        if len(first_datetime) == 0 or len(second_datetime) == 0:
+            continue
+
+        responses[key] = encode_json(
+            {
+                f"{first_name}_datetime": first_datetime,
+                f"{first_name}_consumption": first_consumption,
+                f"{second_name}_datetime": second_datetime,
+                f"{second_name}_consumption": second_consumption,
+            }
+        )
+
+    return responses
+
+
+def build_prediction_responses(
+    historical_df: pd.DataFrame, prediction_df: pd.DataFrame
+) -> Dict[Tuple[int, int], bytes]:
+    """
+    This function builds the prediction response body of every series.
+    """
+
+    return build_series_responses(
+        first_df=historical_df,
+        second_df=prediction_df,
+        first_name="historical",
+        second_name="prediction",
+    )
+
+
+def build_monitor_prediction_responses(
+    ground_truth_df: pd.DataFrame, cached_prediction_df: pd.DataFrame
+) -> Dict[Tuple[int, int], bytes]:
+    """
+    This function builds the monitor prediction response body of every series.
+    """
+
+    return build_series_responses(
+        first_df=ground_truth_df,
+        second_df=cached_prediction_df,
+        first_name="ground_truth",
+        second_name="cached_prediction",
+    )
+
+
+def build_metrics_response(metrics_df: pd.DataFrame) -> Optional[bytes]:
+    """
+    This function builds the performance metrics response body, None if the metrics
+    are empty.
+    """
+
+    if len(metrics_df) == 0:
+        return None
+
+    return encode_json(
+        {
+            "datetime": np.asarray(metrics_df.index.astype("int64")).tolist(),
+            "mape": to_json_list(metrics_df["mape"].to_numpy()),
+            "rmspe": to_json_list(metrics_df["rmspe"].to_numpy()),
+        }
+    )
+
+
+def build_prediction_index(
+    historical_df: pd.DataFrame, prediction_df: pd.DataFrame
+) -> Tuple[SeriesIndex, SeriesIndex]:
+    """
+    This function builds the series index of the historical and prediction data
+    with their resolution levels.
+    """
+
+    return (
+        add_resolution_levels(build_series_index(historical_df)),
+        add_resolution_levels(build_series_index(prediction_df)),
+    )
+
+
+def build_series_prediction_results(
+    prediction_index: Tuple[SeriesIndex, SeriesIndex],
+    series_keys: List[Tuple[int, int]],
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+    max_points: Optional[int] = None,
+) -> Tuple[List[Dict], List[Dict]]:
+    """
+    This function builds the prediction results of the series keys in a single pass
+    over the series index, see "select_series_points" for the start, end and
+    max_points selection. The results and the keys of the series that are not
+    present in both the historical and prediction data are returned.
+    """
+
+    # Converting the time range to the integer datetimes of every series index
+    series_indexes = dict(zip(["historical", "prediction"], prediction_index))
+    bounds = {
+        name: [
+            (
+                None
+                if date_time is None
+                else to_datetime_value(date_time, series_index.datetime_dtype)
+            )
+            for date_time in [start, end]
+        ]
+        for name, series_index in series_indexes.items()
+    }
+
+    results, missing = [], []
+    for municipality_number, branch in series_keys:
+        key = (municipality_number, branch)
+        if not all(key in index.series for index in series_indexes.values()):
+            missing.append(
+                {"municipality_number": municipality_number, "branch": branch}
+            )
+            continue
+
+        result = {"municipality_number": municipality_number, "branch": branch}
+        for name, series_index in series_indexes.items():
+            datetimes, values, resolution = select_series_points(
+                series_index, key, *bounds[name], max_points=max_points
+            )
+            result[f"{name}_datetime"] = datetimes.tolist()
+            result[f"{name}_consumption"] = to_json_list(values)
+            result[f"{name}_resolution"] = resolution
+        results.append(result)
+
+    return results, missing
+
+
+def build_batch_prediction_response(
+    prediction_index: Tuple[SeriesIndex, SeriesIndex],
+    series_keys: List[Tuple[int, int]],
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+    max_points: Optional[int] = None,
+) -> bytes:
+    """
+    This function builds the batch prediction response body of the series keys, see
+    "build_series_prediction_results". The series that are not found are returned in
+    the "missing" list.
+    """
+
+    results, missing = build_series_prediction_results(
+        prediction_index=prediction_index,
+        series_keys=series_keys,
+        start=start,
+        end=end,
+        max_points=max_points,
+    )
+
+    return encode_json({"results": results, "missing": missing})
+
+
+def build_prediction_response(
+    prediction_index: Tuple[SeriesIndex, SeriesIndex],
+    series_key: Tuple[int, int],
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+    max_points: Optional[int] = None,
+) -> Optional[bytes]:
+    """
+    This function builds the prediction response body of a series, see
+    "build_series_prediction_results". None is returned if the series is not found.
+    """
+
+    results, _ = build_series_prediction_results(
+        prediction_index=prediction_index,
+        series_keys=[series_key],
+        start=start,
+        end=end,
+        max_points=max_points,
+    )
+    if len(results) == 0:
+        return None
+
+    return encode_json(results[0])
@@ -1,6 +1,7 @@
-from typing import List
+import datetime
+from typing import List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class HealthCheck(BaseModel):
@@ -22,6 +23,30 @@ class PredictionResults(BaseModel):
     historical_consumption: List[float]
     prediction_datetime: List[int]
     prediction_consumption: List[float]
+    historical_resolution: Optional[str] = None
+    prediction_resolution: Optional[str] = None
+
+
+class SeriesKey(BaseModel):
+    municipality_number: int
+    branch: int
+
+
+class BatchPredictionRequest(BaseModel):
+    series: List[SeriesKey] = Field(min_length=1, max_length=1000)
+    start: Optional[datetime.datetime] = None
+    end: Optional[datetime.datetime] = None
+    max_points: Optional[int] = Field(default=None, ge=3)
+
+
+class SeriesPredictionResults(PredictionResults):
+    municipality_number: int
+    branch: int
+
+
+class BatchPredictionResults(BaseModel):
+    results: List[SeriesPredictionResults]
+    missing: List[SeriesKey]
 
 
 class MonitorMetrics(BaseModel):
@@ -35,3 +60,18 @@ class MonitorPrediction(BaseModel):
     ground_truth_consumption: List[float]
     cached_prediction_datetime: List[int]
     cached_prediction_consumption: List[float]
+
+
+class CacheStats(BaseModel):
+    hits: int
+    misses: int
+    refreshes: int
+    revalidations: int
+    builds: int
+    evictions: int
+    entries: int
+    derived: int
+
+
+class CacheInvalidation(BaseModel):
+    invalidated: int
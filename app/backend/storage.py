@@ -0,0 +1,99 @@
+from functools import lru_cache
+from typing import BinaryIO, List, Optional
+
+import pandas as pd
+from energy_consumption_forecasting.inference_pipeline.storage import FsspecBucket
+
+from backend.config import get_settings
+
+
+# Suffix of the blobs written by the pipelines with a row group for every series
+SERIES_BLOB_SUFFIX = "_by_series.parquet"
+
+
+@lru_cache()
+def get_storage() -> FsspecBucket:
+    """
+    This function connects to the bucket where the data is stored, using the storage
+    URL of the settings. The data is stored in GCS by default, a local directory
+    ("file://") or the in-memory filesystem ("memory://") can be used to run the API
+    without cloud credentials. The bucket is the same fsspec bucket used by the
+    pipelines, so both sides read and write the blobs the same way.
+    """
+
+    settings = get_settings()
+    storage_url = settings.STORAGE_URL or f"gs://{settings.GCP_BUCKET_NAME}"
+
+    storage_options = {}
+    if storage_url.startswith("gs://"):
+        storage_options = {
+            "project": settings.GCP_PROJECT,
+            "token": settings.GCP_SERVICE_ACCOUNT_FILE,
+        }
+
+    return FsspecBucket(storage_url=storage_url, **storage_options)
+
+
+def get_blob_generation(blob_name: str) -> Optional[int]:
+    """
+    This function returns the generation number of a blob with a metadata-only
+    request, the generation changes every time the blob is written. None is returned
+    if the blob does not exists.
+    """
+
+    blob = get_storage().get_blob(blob_name=blob_name)
+
+    return None if blob is None else blob.generation
+
+
+def is_series_blob(blob_name: str) -> bool:
+    """
+    This function checks whether a blob has a row group for every series, so a single
+    series can be read without downloading the whole blob.
+    """
+
+    return blob_name.endswith(SERIES_BLOB_SUFFIX)
+
+
+def open_blob(blob_name: str, mode: str = "rb") -> BinaryIO:
+    """
+    This function opens a blob as a file object, the file object reads the blob with
+    byte-range requests and a local blob is written atomically.
+    """
+
+    return get_storage().blob(blob_name=blob_name).open(mode=mode)
+
+
+def read_parquet_blob(blob_name: str, **kwargs) -> pd.DataFrame:
+    """
+    This function reads a parquet blob as a dataframe, the keyword arguments are
+    passed to "pd.read_parquet".
+    """
+
+    with open_blob(blob_name) as file:
+        return pd.read_parquet(path=file, **kwargs)
+
+
+def read_parquet_series(
+    blob_name: str,
+    municipality_num: int,
+    branch: int,
+    columns: Optional[List[str]] = ["consumption_kwh"],
+) -> pd.DataFrame:
+    """
+    This function reads a single series from a parquet blob indexed by
+    municipality_num, branch and datetime_dk. The series is selected with pyarrow
+    filters and only the columns and the index are read, so for a blob with a row
+    group for every series (the "_by_series" blobs of the inference pipeline) only
+    the footer and the row group of the series are fetched from the storage.
+    """
+
+    with open_blob(blob_name) as file:
+        return pd.read_parquet(
+            path=file,
+            columns=columns,
+            filters=[
+                ("municipality_num", "==", municipality_num),
+                ("branch", "==", branch),
+            ],
+        )
@@ -0,0 +1,188 @@
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend.cache import DatasetCache, get_dataset_cache
+from backend.config import get_settings
+from backend.storage import get_storage, open_blob, read_parquet_blob
+
+
+# Creating a local bucket for the storage of the API
+@pytest.fixture
+def get_bucket(tmp_path, monkeypatch):
+    monkeypatch.setenv("STORAGE_URL", f"file://{tmp_path}/bucket")
+    for function in [get_settings, get_storage, get_dataset_cache]:
+        function.cache_clear()
+
+    yield get_storage()
+
+    for function in [get_settings, get_storage, get_dataset_cache]:
+        function.cache_clear()
+
+
+@pytest.fixture
+def get_data():
+    index = pd.MultiIndex.from_product(
+        [
+            [101, 147],
+            [1, 2],
+            pd.period_range(start="2024-01-01 00:00", periods=24, freq="h"),
+        ],
+        names=["municipality_num", "branch", "datetime_dk"],
+    )
+    return pd.DataFrame({"consumption_kwh": np.arange(len(index), dtype=float)}, index)
+
+
+def write_parquet_blob(blob_name: str, data: pd.DataFrame):
+    with open_blob(blob_name, mode="wb") as file:
+        data.to_parquet(file)
+
+
+# Counting the loads of the blobs
+class CountingLoader:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.n_loads = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, blob_name: str) -> pd.DataFrame:
+        with self.lock:
+            self.n_loads += 1
+        time.sleep(self.delay)
+        return read_parquet_blob(blob_name)
+
+
+def test_cache_ttl(get_bucket, get_data):
+    """
+    In this test a fresh dataset is served without any storage request, and an
+    expired dataset is only loaded again when the generation of its blob changed.
+    """
+
+    write_parquet_blob("input.parquet", get_data)
+
+    loader = CountingLoader()
+    cache = DatasetCache(ttl=3600, loader=loader)
+    for _ in range(2):
+        pd.testing.assert_frame_equal(cache.get("input.parquet"), get_data)
+    assert loader.n_loads == 1
+
+    # The rewritten blob is not checked before the TTL
+    write_parquet_blob("input.parquet", get_data.iloc[:10])
+    assert len(cache.get("input.parquet")) == len(get_data)
+
+    loader = CountingLoader()
+    cache = DatasetCache(ttl=0, loader=loader)
+    for _ in range(2):
+        cache.get("input.parquet")
+    assert loader.n_loads == 1
+
+    write_parquet_blob("input.parquet", get_data)
+    assert len(cache.get("input.parquet")) == len(get_data)
+    assert loader.n_loads == 2
+
+    stats = cache.get_stats()
+    assert (stats["misses"], stats["revalidations"], stats["refreshes"]) == (1, 1, 1)
+
+
+def test_cache_invalidate(get_bucket, get_data):
+    """
+    In this test the invalidated datasets and series of a blob check their generation
+    on the next request before the TTL, the other blobs are not invalidated.
+    """
+
+    write_parquet_blob("target_by_series.parquet", get_data)
+    write_parquet_blob("input.parquet", get_data)
+
+    cache = DatasetCache(ttl=3600)
+    cache.get("input.parquet")
+    series = cache.get("target_by_series.parquet", series=(147, 2))
+    assert len(series) == 24
+    assert (series.index.get_level_values("municipality_num") == 147).all()
+
+    write_parquet_blob("target_by_series.parquet", get_data.iloc[:10])
+    assert cache.invalidate(blob_name="target_by_series.parquet") == 1
+    assert len(cache.get("target_by_series.parquet", series=(147, 2))) == 0
+    assert cache.get_stats()["refreshes"] == 1
+
+    assert cache.invalidate() == 2
+
+
+def test_cache_derived(get_bucket, get_data):
+    """
+    In this test a derived value is only built again when one of its blobs changed,
+    and the least recently used values are evicted above the limits.
+    """
+
+    write_parquet_blob("target.parquet", get_data)
+    write_parquet_blob("prediction.parquet", get_data)
+
+    cache = DatasetCache(ttl=0, max_entries=2, max_derived=1)
+    for _ in range(2):
+        value = cache.get_derived(
+            name="total",
+            blob_names=["target.parquet", "prediction.parquet"],
+            builder=lambda target, prediction: len(target) + len(prediction),
+        )
+    assert value == 2 * len(get_data)
+    assert cache.get_stats()["builds"] == 1
+
+    write_parquet_blob("prediction.parquet", get_data.iloc[:10])
+    value = cache.get_derived(
+        name="total",
+        blob_names=["target.parquet", "prediction.parquet"],
+        builder=lambda target, prediction: len(target) + len(prediction),
+    )
+    assert value == len(get_data) + 10
+
+    cache.get_derived(
+        name="series",
+        blob_names=["target.parquet"],
+        builder=len,
+        series=(101, 1),
+    )
+    stats = cache.get_stats()
+    assert (stats["builds"], stats["entries"], stats["derived"]) == (3, 2, 1)
+    assert stats["evictions"] == 2
+    assert list(cache.entries) == ["prediction.parquet", "target.parquet/101/1"]
+
+
+def test_cache_single_flight(get_bucket, get_data):
+    """
+    In this test the concurrent async requests of the same dataset and derived value
+    share a single load and build.
+    """
+
+    write_parquet_blob("input.parquet", get_data)
+    loader = CountingLoader(delay=0.2)
+    cache = DatasetCache(ttl=3600, loader=loader, max_workers=5)
+    n_builds = []
+
+    def builder(dataframe: pd.DataFrame) -> int:
+        n_builds.append(1)
+        return len(dataframe)
+
+    async def request_all():
+        values = await asyncio.gather(*[cache.aget("input.parquet") for _ in range(5)])
+
+        # The waiting requests reuse the load instead of hitting the cache
+        assert cache.get_stats()["hits"] == 0
+        cache.invalidate()
+        derived_values = await asyncio.gather(
+            *[
+                cache.aget_derived(
+                    name="length", blob_names=["input.parquet"], builder=builder
+                )
+                for _ in range(5)
+            ]
+        )
+        return values, derived_values
+
+    values, derived_values = asyncio.run(request_all())
+    assert all(value is values[0] for value in values)
+    assert derived_values == [len(get_data)] * 5
+    assert loader.n_loads == 1 and len(n_builds) == 1
+    assert cache.get_stats()["revalidations"] == 1
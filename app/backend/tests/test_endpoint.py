@@ -0,0 +1,148 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.application import get_app
+from backend.cache import get_dataset_cache
+from backend.config import get_settings
+from backend.storage import get_storage, open_blob
+
+
+# Creating a local bucket for the storage of the API
+@pytest.fixture
+def get_bucket(tmp_path, monkeypatch):
+    monkeypatch.setenv("STORAGE_URL", f"file://{tmp_path}/bucket")
+    for function in [get_settings, get_storage, get_dataset_cache]:
+        function.cache_clear()
+
+    yield get_storage()
+
+    for function in [get_settings, get_storage, get_dataset_cache]:
+        function.cache_clear()
+
+
+# Creating dummy historical data of 2 days and prediction data of the next day, and
+# publishing them in the bucket
+@pytest.fixture
+def get_client(get_bucket):
+    blobs = {}
+    for blob_name, start, periods in [
+        ("target_by_series.parquet", "2024-01-01 00:00", 48),
+        ("prediction_by_series.parquet", "2024-01-03 00:00", 24),
+        ("ground_truth.parquet", "2024-01-01 00:00", 48),
+        ("cached_prediction.parquet", "2024-01-01 00:00", 48),
+    ]:
+        index = pd.MultiIndex.from_product(
+            [
+                [101, 147],
+                [1, 2],
+                pd.period_range(start=start, periods=periods, freq="h"),
+            ],
+            names=["municipality_num", "branch", "datetime_dk"],
+        )
+        blobs[blob_name] = pd.DataFrame(
+            {"consumption_kwh": np.arange(len(index), dtype=float)}, index
+        )
+        with open_blob(blob_name, mode="wb") as file:
+            blobs[blob_name].to_parquet(file)
+
+    return TestClient(get_app()), blobs
+
+
+def test_prediction_response(get_client):
+    """
+    In this test the response body of a series is built once from the published data
+    and served again from the cache, and a missing series is not found.
+    """
+
+    client, blobs = get_client
+    for _ in range(2):
+        response = client.get("/api/v1/prediction/147/2")
+        assert response.status_code == 200
+
+    content = response.json()
+    historical = blobs["target_by_series.parquet"].loc[(147, 2)]
+    assert content["historical_datetime"] == list(historical.index.asi8)
+    assert content["historical_consumption"] == list(historical["consumption_kwh"])
+    assert len(content["prediction_datetime"]) == 24
+
+    stats = client.get("/api/v1/cache/stats").json()
+    assert (stats["builds"], stats["derived"]) == (1, 1)
+
+    assert client.get("/api/v1/prediction/999/1").status_code == 404
+
+    response = client.get("/api/v1/prediction/147/2", params={"max_points": 20})
+    content = response.json()
+    assert len(content["historical_datetime"]) == 20
+    assert content["historical_resolution"] == "hourly"
+
+    # The historical data does not fit in the hourly level with 10 points
+    response = client.get("/api/v1/prediction/147/2", params={"max_points": 10})
+    assert response.json()["historical_resolution"] == "daily"
+
+
+def test_monitor_prediction_response(get_client):
+    """
+    In this test the monitor response bodies of all the series are built from a
+    single read of the whole blobs.
+    """
+
+    client, blobs = get_client
+    for municipality_number, branch in [(101, 1), (101, 2), (147, 1)]:
+        response = client.get(
+            f"/api/v1/monitor/prediction/{municipality_number}/{branch}"
+        )
+        assert response.status_code == 200
+
+    content = response.json()
+    assert content["ground_truth_consumption"] == list(
+        blobs["ground_truth.parquet"].loc[(147, 1), "consumption_kwh"]
+    )
+
+    stats = client.get("/api/v1/cache/stats").json()
+    assert (stats["misses"], stats["builds"], stats["entries"]) == (2, 1, 2)
+
+
+def test_batch_prediction(get_client):
+    """
+    In this test the batch prediction returns the series found in the data and lists
+    the missing series, and an invalid request is rejected.
+    """
+
+    client, _ = get_client
+    response = client.post(
+        "/api/v1/prediction/batch",
+        json={
+            "series": [
+                {"municipality_number": 101, "branch": 1},
+                {"municipality_number": 999, "branch": 1},
+                {"municipality_number": 147, "branch": 2},
+            ],
+            "start": "2024-01-02T00:00:00",
+            "max_points": 12,
+        },
+    )
+    assert response.status_code == 200
+
+    content = json.loads(response.content)
+    assert [
+        (result["municipality_number"], result["branch"])
+        for result in content["results"]
+    ] == [(101, 1), (147, 2)]
+    assert content["missing"] == [{"municipality_number": 999, "branch": 1}]
+    assert all(
+        len(result["historical_datetime"]) == 12 for result in content["results"]
+    )
+
+    series = [{"municipality_number": 101, "branch": 1}]
+    for request in [
+        {"series": []},
+        {"series": series * 1001},
+        {"series": series, "max_points": 2},
+        {"series": series, "start": "not a datetime"},
+    ]:
+        response = client.post("/api/v1/prediction/batch", json=request)
+        assert response.status_code == 422
@@ -0,0 +1,152 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend.responses import (
+    add_resolution_levels,
+    build_series_index,
+    downsample_lttb,
+    select_series_points,
+    slice_series,
+    to_datetime_value,
+)
+
+
+# Creating a dummy hourly consumption of 60 days for a single series
+@pytest.fixture
+def get_series_index():
+    index = pd.MultiIndex.from_product(
+        [
+            [101],
+            [1],
+            pd.period_range(start="2024-01-01 00:00", periods=60 * 24, freq="h"),
+        ],
+        names=["municipality_num", "branch", "datetime_dk"],
+    )
+    dataframe = pd.DataFrame(
+        {"consumption_kwh": np.arange(len(index), dtype=float) % 24}, index
+    )
+    return add_resolution_levels(build_series_index(dataframe))
+
+
+def test_slice_series(get_series_index):
+    """
+    In this test the points of a series between the start and end datetimes are
+    selected, both included.
+    """
+
+    series_index = get_series_index
+    datetimes, values = series_index.series[(101, 1)]
+    assert np.all(np.diff(datetimes) > 0)
+
+    start, end = [
+        to_datetime_value(date_time, series_index.datetime_dtype)
+        for date_time in [datetime.datetime(2024, 2, 1), datetime.datetime(2024, 2, 2)]
+    ]
+    sliced_datetimes, sliced_values = slice_series(datetimes, values, start, end)
+    assert len(sliced_datetimes) == 25
+    assert (sliced_datetimes[0], sliced_datetimes[-1]) == (start, end)
+    assert sliced_values[0] == 0.0
+
+    sliced_datetimes, _ = slice_series(datetimes, values, start=start)
+    assert sliced_datetimes[-1] == datetimes[-1]
+
+
+def test_select_series_points(get_series_index):
+    """
+    In this test the finest resolution level fitting the time range is selected and
+    downsampled to at most max_points points.
+    """
+
+    series_index = get_series_index
+    key = (101, 1)
+
+    datetimes, values, resolution = select_series_points(series_index, key)
+    assert (len(datetimes), resolution) == (60 * 24, "hourly")
+
+    datetimes, values, resolution = select_series_points(
+        series_index, key, max_points=1000
+    )
+    assert (len(datetimes), resolution) == (1000, "hourly")
+
+    datetimes, values, resolution = select_series_points(
+        series_index, key, max_points=100
+    )
+    assert (len(datetimes), resolution) == (60, "daily")
+    assert np.allclose(values, 11.5)
+
+    # The weekly buckets start on Monday, 2024-01-01 is a Monday
+    datetimes, values, resolution = select_series_points(
+        series_index, key, max_points=10
+    )
+    assert resolution == "weekly" and len(datetimes) <= 10
+    assert all(
+        pd.Period(ordinal=date_time, freq="h").dayofweek == 0 for date_time in datetimes
+    )
+
+    # A time range of 10 days fits in the hourly level
+    start = to_datetime_value(
+        datetime.datetime(2024, 2, 20), series_index.datetime_dtype
+    )
+    datetimes, values, resolution = select_series_points(
+        series_index, key, start=start, max_points=100
+    )
+    assert (len(datetimes), resolution) == (100, "hourly")
+    assert datetimes[0] == start
+
+
+def test_downsample_lttb():
+    """
+    In this test the first and last points and the peaks are kept, and a missing
+    value is never selected in place of a valid point.
+    """
+
+    datetimes = np.arange(100)
+    values = np.ones(100)
+    values[[30, 70]] = [10.0, -10.0]
+
+    sampled_datetimes, sampled_values = downsample_lttb(datetimes, values, n_out=10)
+    assert len(sampled_datetimes) == 10
+    assert (sampled_datetimes[0], sampled_datetimes[-1]) == (0, 99)
+    assert {30, 70} <= set(sampled_datetimes)
+    assert np.all(np.diff(sampled_datetimes) > 0)
+
+    # A gap is only kept for the buckets without any valid point
+    values = np.ones(100)
+    values[20:40] = np.nan
+    sampled_datetimes, sampled_values = downsample_lttb(datetimes, values, n_out=10)
+    assert len(sampled_datetimes) == 10
+    assert np.isnan(sampled_values).sum() == 1
+    assert np.isfinite(sampled_values[sampled_datetimes < 20]).all()
+
+    datetimes, values = downsample_lttb(datetimes, values, n_out=200)
+    assert len(datetimes) == 100
+
+
+def test_to_datetime_value():
+    """
+    In this test a timezone-aware datetime is converted to the naive Danish local
+    time of the series.
+    """
+
+    period_dtype = pd.PeriodDtype("h")
+    assert (
+        to_datetime_value(datetime.datetime(2024, 1, 1, 12), period_dtype)
+        == pd.Period("2024-01-01 12:00", freq="h").ordinal
+    )
+    assert (
+        to_datetime_value(
+            datetime.datetime(2024, 7, 1, 12, tzinfo=datetime.timezone.utc),
+            period_dtype,
+        )
+        == pd.Period("2024-07-01 14:00", freq="h").ordinal
+    )
+    assert (
+        to_datetime_value(
+            datetime.datetime(2024, 1, 1, 12, tzinfo=datetime.timezone.utc),
+            np.dtype("datetime64[ns]"),
+        )
+        == pd.Timestamp("2024-01-01 13:00").value
+    )
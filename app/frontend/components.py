@@ -6,7 +6,9 @@ from yarl import URL
 from utils import build_dataframe
 
 
-def build_prediction_plot(api_url: URL, municipality_num: int, branch: int):
+def build_prediction_plot(
+    api_url: URL, municipality_num: int, branch: int, max_points: int = 2000
+):
     """
     This function builds the prediction plot component.
 
@@ -21,6 +23,10 @@ def build_prediction_plot(api_url: URL, municipality_num: int, branch: int):
     branch: int
         The branch number to access the data and send request to server.
 
+    max_points: int, default=2000
+        The maximum number of points of the historical and prediction data, the API
+        downsamples the data to keep the plot responsive.
+
     Returns
     -------
     plotly.graph_objects.Figure
@@ -30,7 +36,10 @@ def build_prediction_plot(api_url: URL, municipality_num: int, branch: int):
 
     # Getting the prediction from API by providing the argument values
     response = requests.get(
-        url=api_url / "prediction" / str(municipality_num) / str(branch), verify=False
+        url=(api_url / "prediction" / str(municipality_num) / str(branch)).with_query(
+            max_points=max_points
+        ),
+        verify=False,
     )
 
     if response.status_code != 200:
@@ -0,0 +1,449 @@
+import argparse
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+from google.cloud import storage
+from pydantic import validate_call
+
+from energy_consumption_forecasting.exceptions import log_exception
+from energy_consumption_forecasting.inference_pipeline.utils import (
+    get_gcs_bucket,
+    read_blob_from_bucket,
+    write_blob_to_bucket,
+)
+from energy_consumption_forecasting.logger import get_logger
+
+logger = get_logger(name=Path(__file__).name)
+
+DRIFT_SKETCH_BLOB_NAME = "drift_sketches.parquet"
+SKETCH_LEVELS = ["quantity", "municipality_num", "branch", "day"]
+SERIES_LEVELS = ["quantity", "municipality_num", "branch"]
+
+# The histogram bins are uniform over the signed log of the values, between
+# -log1p(1e7) and log1p(1e7), so the same bins fit the consumption and the residuals
+N_BINS = 128
+BIN_LIMIT = np.log1p(1e7)
+BIN_COLUMNS = [f"bin_{i:03d}" for i in range(N_BINS)]
+
+# Smallest probability of a histogram bin when comparing two histograms
+PSI_EPSILON = 1e-4
+
+
+def get_day_index(datetime_index: pd.Index) -> pd.PeriodIndex:
+    """
+    This function returns the day of every datetime in an hourly period or datetime
+    index.
+    """
+
+    if isinstance(datetime_index, pd.PeriodIndex):
+        return datetime_index.asfreq("D")
+
+    return pd.DatetimeIndex(datetime_index).to_period("D")
+
+
+def get_sketch_cells(values: pd.Series, quantity: str) -> pd.MultiIndex:
+    """
+    This function returns the sketch cell of every value, i.e. its quantity, series
+    and day.
+    """
+
+    return pd.MultiIndex.from_arrays(
+        [
+            np.full(len(values), quantity),
+            values.index.get_level_values("municipality_num"),
+            values.index.get_level_values("branch"),
+            get_day_index(values.index.get_level_values("datetime_dk")),
+        ],
+        names=SKETCH_LEVELS,
+    )
+
+
+def count_sketched_hours(hours: np.ndarray) -> np.ndarray:
+    """
+    This function returns the number of hours set in the hour bitmasks of the sketches.
+    """
+
+    hour_bits = np.unpackbits(hours.astype(">u4").view(np.uint8).reshape(-1, 4), axis=1)
+
+    return hour_bits.sum(axis=1)
+
+
+def build_drift_sketches(values: pd.Series, quantity: str) -> pd.DataFrame:
+    """
+    This function builds the sketch of the values of every series and day, containing
+    the running moments (count, sum and sum of squares) and a histogram over fixed
+    signed log bins. Every column of the sketches is a sum, so the sketches of many
+    days can be merged exactly by adding them together. The "hours" column is the
+    bitmask of the sketched hours of the day, so the sketches of the same day from
+    different runs can be merged without counting an hour twice.
+
+    Parameters
+    ----------
+    values: pd.Series
+        A series indexed by municipality_num, branch and datetime_dk containing the
+        values to sketch, for eg. the consumption or the forecast residuals.
+
+    quantity: str
+        The name of the sketched quantity, for eg. "target" or "residual".
+
+    Returns
+    -------
+    pd.DataFrame
+        A dataframe indexed by quantity, municipality_num, branch and day containing
+        the moment, sketched hours and histogram bin columns.
+    """
+
+    values = values.dropna()
+    codes, cells = pd.factorize(
+        get_sketch_cells(values=values, quantity=quantity), sort=True
+    )
+    hour_index = values.index.get_level_values("datetime_dk").hour.to_numpy()
+
+    array = values.to_numpy(dtype="float64")
+    signed_log = np.sign(array) * np.log1p(np.abs(array))
+    bins = np.clip(
+        ((signed_log + BIN_LIMIT) / (2 * BIN_LIMIT) * N_BINS).astype("int64"),
+        0,
+        N_BINS - 1,
+    )
+
+    # Counting the bins of all the cells in a single pass
+    histograms = np.bincount(
+        codes * N_BINS + bins, minlength=len(cells) * N_BINS
+    ).reshape(len(cells), N_BINS)
+
+    sketches = pd.DataFrame(histograms.astype("int32"), columns=BIN_COLUMNS)
+    sketches.insert(0, "count", np.bincount(codes, minlength=len(cells)))
+    sketches.insert(1, "sum", np.bincount(codes, weights=array, minlength=len(cells)))
+    sketches.insert(
+        2, "sum_sq", np.bincount(codes, weights=array**2, minlength=len(cells))
+    )
+    # Every hour of a series is sketched once, so the sum of the hour bits is the mask
+    sketches.insert(
+        3,
+        "hours",
+        np.bincount(
+            codes, weights=np.left_shift(1, hour_index), minlength=len(cells)
+        ).astype("int32"),
+    )
+    sketches.index = cells.set_names(SKETCH_LEVELS)
+
+    return sketches
+
+
+def update_drift_sketches(
+    sketches: Optional[pd.DataFrame],
+    new_sketches: pd.DataFrame,
+    retention_days: Optional[int] = 90,
+) -> pd.DataFrame:
+    """
+    This function updates the sketches with the sketches of a new run, and the days
+    older than retention_days before the latest day are dropped.
+
+    The sketches of a day sketched by both are added together when their sketched
+    hours do not overlap, for eg. a day split between two runs. Otherwise the sketch
+    with the most sketched hours is kept, so a rerun over the same hours is not counted
+    twice. The values of the hours that are already sketched can be dropped before the
+    new sketches are built with "drop_sketched_hours", so that the update is exact.
+    """
+
+    if sketches is not None and len(sketches) > 0:
+        common_index = sketches.index.intersection(new_sketches.index)
+        previous, new = sketches.loc[common_index], new_sketches.loc[common_index]
+        previous_hours = previous["hours"].to_numpy()
+        new_hours = new["hours"].to_numpy()
+
+        is_disjoint = (previous_hours & new_hours) == 0
+        is_new_kept = count_sketched_hours(new_hours) >= count_sketched_hours(
+            previous_hours
+        )
+        merged = new.copy()
+        merged.loc[~is_new_kept] = previous.loc[~is_new_kept]
+        merged.loc[is_disjoint] = previous.loc[is_disjoint] + new.loc[is_disjoint]
+
+        new_sketches = pd.concat(
+            [
+                sketches.drop(common_index),
+                new_sketches.drop(common_index),
+                merged,
+            ]
+        )
+
+    new_sketches = new_sketches.sort_index()
+    if retention_days is not None:
+        day_index = new_sketches.index.get_level_values("day")
+        new_sketches = new_sketches[day_index > day_index.max() - retention_days]
+
+    return new_sketches
+
+
+def drop_sketched_hours(
+    sketches: Optional[pd.DataFrame], values: pd.Series, quantity: str
+) -> pd.Series:
+    """
+    This function drops the values of the hours that are already in the sketches of
+    the quantity, so a run overlapping the previous runs only sketches its new hours.
+    """
+
+    values = values.dropna()
+    if sketches is None or len(sketches) == 0:
+        return values
+
+    hours = (
+        sketches["hours"]
+        .reindex(get_sketch_cells(values=values, quantity=quantity))
+        .fillna(0)
+        .to_numpy(dtype="int64")
+    )
+    hour_index = values.index.get_level_values("datetime_dk").hour.to_numpy()
+    is_sketched = np.right_shift(hours, hour_index) & 1 == 1
+
+    return values[~is_sketched]
+
+
+def update_drift_sketches_in_bucket(
+    bucket: storage.Bucket, values: pd.Series, quantity: str
+) -> Optional[pd.DataFrame]:
+    """
+    This function sketches the values of the hours that are not sketched yet and
+    updates the drift sketches stored in the bucket, see "build_drift_sketches" and
+    "update_drift_sketches".
+    """
+
+    sketches = read_blob_from_bucket(bucket=bucket, blob_name=DRIFT_SKETCH_BLOB_NAME)
+    values = drop_sketched_hours(sketches=sketches, values=values, quantity=quantity)
+    if len(values) == 0:
+        logger.info(f'Drift sketches of "{quantity}" already contain all the hours.')
+        return sketches
+
+    sketches = update_drift_sketches(
+        sketches=sketches,
+        new_sketches=build_drift_sketches(values=values, quantity=quantity),
+    )
+    write_blob_to_bucket(bucket=bucket, blob_name=DRIFT_SKETCH_BLOB_NAME, data=sketches)
+    logger.info(f'Drift sketches of "{quantity}" are updated for {len(values)} values.')
+
+    return sketches
+
+
+def compute_drift_scores(
+    sketches: pd.DataFrame,
+    end_day: Optional[pd.Period] = None,
+    current_days: int = 7,
+    reference_days: int = 28,
+    min_count: int = 24,
+) -> pd.DataFrame:
+    """
+    This function compares the sketches of the current window, the last current_days
+    days, with the sketches of the reference window, the reference_days days before
+    it, for every quantity and series. The sketches of a window are merged by adding
+    them together.
+
+    The drift of a series is measured with the population stability index (PSI) of
+    the two histograms and the shift of the mean in standard deviations of the
+    reference window.
+
+    Parameters
+    ----------
+    sketches: pd.DataFrame
+        The sketches generated by "build_drift_sketches".
+
+    end_day: pd.Period or None, default=None
+        The last day of the current window, by default the latest sketched day of
+        every quantity.
+
+    current_days: int, default=7
+        Number of days in the current window.
+
+    reference_days: int, default=28
+        Number of days in the reference window.
+
+    min_count: int, default=24
+        Minimum number of values in both windows to score a series.
+
+    Returns
+    -------
+    pd.DataFrame
+        A dataframe indexed by quantity, municipality_num and branch containing the
+        "psi", "mean_shift", "current_count" and "reference_count" of every series.
+    """
+
+    # Age in days of every sketch, counted from the last day of its quantity as the
+    # residuals are only sketched once the ground truth arrives
+    day_ordinal = pd.Series(
+        sketches.index.get_level_values("day").asi8, index=sketches.index
+    )
+    if end_day is None:
+        end_ordinal = day_ordinal.groupby(level="quantity").transform("max")
+    else:
+        end_ordinal = end_day.ordinal
+    age = (end_ordinal - day_ordinal).to_numpy()
+
+    windows = {}
+    for name, is_window in [
+        ("current", (age >= 0) & (age < current_days)),
+        (
+            "reference",
+            (age >= current_days) & (age < current_days + reference_days),
+        ),
+    ]:
+        windows[name] = sketches[is_window].groupby(level=SERIES_LEVELS).sum()
+
+    current, reference = windows["current"].align(
+        windows["reference"], join="inner", fill_value=0
+    )
+    is_scored = (current["count"] >= min_count) & (reference["count"] >= min_count)
+    current, reference = current[is_scored], reference[is_scored]
+
+    current_prob = current[BIN_COLUMNS].to_numpy() / current[["count"]].to_numpy()
+    reference_prob = reference[BIN_COLUMNS].to_numpy() / reference[["count"]].to_numpy()
+    current_prob = np.maximum(current_prob, PSI_EPSILON)
+    reference_prob = np.maximum(reference_prob, PSI_EPSILON)
+    psi = np.sum(
+        (current_prob - reference_prob) * np.log(current_prob / reference_prob), axis=1
+    )
+
+    reference_mean = reference["sum"] / reference["count"]
+    reference_std = np.sqrt(
+        np.maximum(reference["sum_sq"] / reference["count"] - reference_mean**2, 0)
+    )
+    mean_shift = (current["sum"] / current["count"] - reference_mean).abs() / (
+        reference_std.where(reference_std > 0)
+    )
+
+    return pd.DataFrame(
+        {
+            "psi": psi,
+            "mean_shift": mean_shift,
+            "current_count": current["count"],
+            "reference_count": reference["count"],
+        },
+        index=current.index,
+    )
+
+
+def get_drift_summary(
+    drift_scores: pd.DataFrame,
+    psi_threshold: float = 0.2,
+) -> Dict[str, float]:
+    """
+    This function summarizes the drift scores of the series, for every quantity the
+    median PSI and the fraction of drifted series (PSI above psi_threshold). The drift
+    score is the largest fraction of drifted series, NaN if no series was scored.
+    """
+
+    summary = {}
+    for quantity in ["target", "residual"]:
+        if quantity in drift_scores.index.get_level_values("quantity"):
+            psi = drift_scores.xs(quantity, level="quantity")["psi"]
+            summary[f"{quantity}_median_psi"] = float(psi.median())
+            summary[f"{quantity}_drifted_fraction"] = float(
+                (psi > psi_threshold).mean()
+            )
+
+    drifted_fractions = [
+        value for key, value in summary.items() if key.endswith("drifted_fraction")
+    ]
+    summary["drift_score"] = (
+        float(max(drifted_fractions)) if len(drifted_fractions) > 0 else float("nan")
+    )
+
+    return summary
+
+
+@log_exception(logger=logger)
+@validate_call
+def run_drift_check(
+    drift_threshold: float = 0.1,
+    psi_threshold: float = 0.2,
+    current_days: int = 7,
+    reference_days: int = 28,
+) -> Dict[str, Any]:
+    """
+    This function computes the drift score of the consumption and the forecast
+    residuals from the drift sketches stored in the GCS bucket, the sketches are
+    updated by the feature pipeline and the monitoring. A drift is detected when the
+    drift score is above drift_threshold or it cannot be computed (for eg. not enough
+    sketched days), in which case the model needs to be retuned and retrained.
+
+    Parameters
+    ----------
+    drift_threshold: float, default=0.1
+        The fraction of drifted series above which a drift is detected.
+
+    psi_threshold: float, default=0.2
+        The PSI above which a series is drifted.
+
+    current_days: int, default=7
+        Number of days in the current window.
+
+    reference_days: int, default=28
+        Number of days in the reference window.
+
+    Returns
+    -------
+    Dict[str, Any]
+        A dict containing the drift summary of "get_drift_summary" and "is_drift".
+    """
+
+    bucket = get_gcs_bucket()
+    sketches = read_blob_from_bucket(bucket=bucket, blob_name=DRIFT_SKETCH_BLOB_NAME)
+    if sketches is None or len(sketches) == 0:
+        logger.info("Drift sketches do not exist, a drift is assumed.")
+        return {"drift_score": float("nan"), "is_drift": True}
+
+    drift_scores = compute_drift_scores(
+        sketches=sketches, current_days=current_days, reference_days=reference_days
+    )
+    summary = get_drift_summary(drift_scores=drift_scores, psi_threshold=psi_threshold)
+    summary["is_drift"] = bool(
+        np.isnan(summary["drift_score"]) or summary["drift_score"] > drift_threshold
+    )
+    logger.info(f"Drift check result: {summary}")
+
+    return summary
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "--drift_threshold",
+        type=float,
+        default=0.1,
+        help="Fraction of drifted series above which a drift is detected, "
+        "needs to be in float format.",
+    )
+
+    parser.add_argument(
+        "--psi_threshold",
+        type=float,
+        default=0.2,
+        help="PSI above which a series is drifted, needs to be in float format.",
+    )
+
+    parser.add_argument(
+        "--current_days",
+        type=int,
+        default=7,
+        help="Number of days in the current window, needs to be in integer format.",
+    )
+
+    parser.add_argument(
+        "--reference_days",
+        type=int,
+        default=28,
+        help="Number of days in the reference window, needs to be in integer format.",
+    )
+
+    args = parser.parse_args()
+
+    run_drift_check(
+        drift_threshold=args.drift_threshold,
+        psi_threshold=args.psi_threshold,
+        current_days=args.current_days,
+        reference_days=args.reference_days,
+    )
@@ -6,6 +6,9 @@ from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 from pydantic import validate_call
 
+from energy_consumption_forecasting.drift_monitor import (
+    update_drift_sketches_in_bucket,
+)
 from energy_consumption_forecasting.exceptions import log_exception
 from energy_consumption_forecasting.feature_pipeline import (
     data_extraction,
@@ -13,6 +16,7 @@ from energy_consumption_forecasting.feature_pipeline import (
     data_transformation,
     data_validation,
 )
+from energy_consumption_forecasting.inference_pipeline.utils import get_gcs_bucket
 from energy_consumption_forecasting.logger import get_logger
 from energy_consumption_forecasting.utils import get_env_var, save_json_data
 
@@ -40,6 +44,7 @@ def run_feature_pipeline(
     ],
     feature_group_name: str = "denmark_energy_consumption_group",
     feature_group_ver: int = 1,
+    sketch_drift: bool = True,
 ) -> Tuple[Dict[Any, Any], Path]:
     """
     This functions runs the feature pipeline process i.e. ETL - Extract, Transform and
@@ -72,6 +77,11 @@ def run_feature_pipeline(
     feature_group_ver: int, default=1
         A version number in int type to set the feature group version.
 
+    sketch_drift: bool, default=True
+        If True, the drift sketches of the consumption in the GCS bucket are updated
+        with the dataframe once it is loaded into the feature store, a failure is only
+        logged, see "drift_monitor.run_drift_check".
+
     Returns
     -------
     dict and pathlib.Path
@@ -129,6 +139,20 @@ def run_feature_pipeline(
 
     logger.info("Data loading process is successfully completed.\n")
 
+    # Updating the drift sketches of the consumption with the loaded hours, the drift
+    # monitoring is optional so a storage failure does not fail the feature pipeline
+    if sketch_drift:
+        try:
+            update_drift_sketches_in_bucket(
+                bucket=get_gcs_bucket(),
+                values=dataframe.set_index(
+                    ["municipality_num", "branch", "datetime_dk"]
+                )["consumption_kwh"],
+                quantity="target",
+            )
+        except Exception as e:
+            logger.info(f"Drift sketches of the consumption could not be updated: {e}")
+
     # Getting and cleaning the metadata and converting it into a JSON format
     feature_store_metadata = feature_store_metadata.json()
     feature_store_metadata = json.loads(
@@ -242,6 +266,12 @@ if __name__ == "__main__":
         help="Feature group name, needs to be in string format.",
     )
 
+    parser.add_argument(
+        "--no_sketch_drift",
+        action="store_true",
+        help="Skip updating the drift sketches of the consumption.",
+    )
+
     args = parser.parse_args()
 
     _, filepath = run_feature_pipeline(
@@ -252,6 +282,7 @@ if __name__ == "__main__":
         check_features_duplicates=args.check_duplicates,
         feature_group_ver=args.group_version,
         feature_group_name=args.group_name,
+        sketch_drift=not args.no_sketch_drift,
     )
 
     print(f"\nLocally saved metadata filepath: {filepath}")
@@ -0,0 +1,258 @@
+import hashlib
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from google.cloud import storage
+
+from energy_consumption_forecasting.inference_pipeline.model_cache import (
+    cache_lock,
+    read_cache_index,
+    write_cache_index,
+)
+from energy_consumption_forecasting.logger import get_logger
+from energy_consumption_forecasting.utils import get_env_var
+
+logger = get_logger(name=Path(__file__).name)
+
+# The blob cache is only used when a cache directory is provided
+BLOB_CACHE_DIR_PATH = get_env_var(key="BLOB_CACHE_DIR_PATH")
+BLOB_CACHE_MAX_BYTES = int(
+    get_env_var(key="BLOB_CACHE_MAX_BYTES", default_value="1000000000")
+)
+
+
+def get_blob_cache_key(bucket_name: str, blob_name: str) -> str:
+    """
+    This function returns the cache key of a blob, the SHA-256 of its full name.
+    """
+
+    return hashlib.sha256(f"{bucket_name}/{blob_name}".encode()).hexdigest()
+
+
+def read_blob_cache_index(cache_dirpath: Path) -> Dict[str, Any]:
+    """
+    This function reads the cache index with the hit, miss and eviction counts.
+    """
+
+    index = read_cache_index(cache_dirpath)
+    index.setdefault("stats", {"hits": 0, "misses": 0, "evictions": 0})
+
+    return index
+
+
+def get_blob_cache_stats(cache_dirpath: Path | str) -> Dict[str, int]:
+    """
+    This function returns the number of hits, misses and evictions of the blob cache.
+    """
+
+    return read_blob_cache_index(Path(cache_dirpath))["stats"]
+
+
+def evict_cached_blobs(
+    cache_dirpath: Path,
+    index: Dict[str, Any],
+    max_cache_bytes: int,
+    keep_key: str,
+):
+    """
+    This function deletes the least recently used blobs until the cache size is under
+    the limit, the blob with the keep_key is never deleted.
+    """
+
+    objects = index["objects"]
+    cache_size = sum(obj["size"] for obj in objects.values())
+
+    for key in sorted(objects, key=lambda key: objects[key]["last_access"]):
+        if cache_size <= max_cache_bytes:
+            break
+        if key == keep_key:
+            continue
+
+        obj = objects.pop(key)
+        (cache_dirpath / "objects" / obj["filename"]).unlink(missing_ok=True)
+        cache_size -= obj["size"]
+        index["stats"]["evictions"] += 1
+        logger.info(f'Blob "{obj["blob_name"]}" is evicted from the blob cache.')
+
+
+def is_cached_blob(
+    cache_dirpath: Path, index: Dict[str, Any], key: str, filename: str, size: int
+) -> bool:
+    """
+    This function checks whether the cached file of the blob key has the filename,
+    i.e. the generation of the blob, and the size of the blob.
+    """
+
+    obj = index["objects"].get(key)
+    filepath = cache_dirpath / "objects" / filename
+
+    return (
+        obj is not None
+        and obj["filename"] == filename
+        and filepath.exists()
+        and filepath.stat().st_size == size
+    )
+
+
+def update_blob_cache_index(
+    cache_dirpath: Path,
+    index: Dict[str, Any],
+    key: str,
+    blob_name: str,
+    filename: str,
+    stat: str,
+    max_cache_bytes: int,
+):
+    """
+    This function records the cached file of the blob key in the index, deleting the
+    file of its previous generation, counts the stat ("hits" or "misses"), evicts the
+    least recent blobs and writes the index. It needs to run under the cache lock.
+    """
+
+    obj = index["objects"].get(key)
+    if obj is not None and obj["filename"] != filename:
+        (cache_dirpath / "objects" / obj["filename"]).unlink(missing_ok=True)
+
+    index["objects"][key] = {
+        "blob_name": blob_name,
+        "filename": filename,
+        "size": (cache_dirpath / "objects" / filename).stat().st_size,
+        "last_access": time.time(),
+    }
+    index["stats"][stat] += 1
+    evict_cached_blobs(
+        cache_dirpath=cache_dirpath,
+        index=index,
+        max_cache_bytes=max_cache_bytes,
+        keep_key=key,
+    )
+    write_cache_index(cache_dirpath, index)
+
+
+def download_cached_blob(
+    cache_dirpath: Path, blob_obj: storage.Blob, filename: str
+) -> Path:
+    """
+    This function downloads the blob into a temporary file of the cache directory,
+    which then replaces the cached file, so a cached file is never partially written.
+    """
+
+    object_dirpath = cache_dirpath / "objects"
+    object_dirpath.mkdir(parents=True, exist_ok=True)
+
+    with tempfile.NamedTemporaryFile(
+        dir=object_dirpath, suffix=".tmp", delete=False
+    ) as file:
+        with blob_obj.open("rb") as blob_file:
+            shutil.copyfileobj(blob_file, file)
+
+    filepath = object_dirpath / filename
+    Path(file.name).replace(filepath)
+
+    return filepath
+
+
+def get_cached_blob_path(
+    bucket: storage.Bucket,
+    blob_name: str,
+    cache_dirpath: Path | str,
+    max_cache_bytes: int = BLOB_CACHE_MAX_BYTES,
+) -> Optional[Path]:
+    """
+    This function returns the local file of a blob from a read-through cache, where
+    every blob is stored with its generation number. The generation of the blob is
+    revalidated with a metadata-only request, and the blob is only downloaded when the
+    cached file has a different generation, i.e. the blob was written since it was
+    cached.
+
+    The least recently used blobs are evicted to keep the cache under
+    "max_cache_bytes", the number of hits, misses and evictions are counted in the
+    cache index and all the cache updates happen under a file lock, so that many
+    processes can share the cache. A download only holds a file lock of the blob, so
+    it does not block the reads of the other blobs.
+
+    Parameters
+    ----------
+    bucket: storage.Bucket
+        A bucket object that is generated by GCS, can be used for uploading and
+        downloading data.
+
+    blob_name: str
+        The name of the blob to be instantiated.
+
+    cache_dirpath: Path or str
+        The directory of the blob cache.
+
+    max_cache_bytes: int, default=BLOB_CACHE_MAX_BYTES
+        The maximum size of the cache in bytes, by default it takes the value from the
+        env variable with key "BLOB_CACHE_MAX_BYTES".
+
+    Returns
+    -------
+    Path or None
+        The local file containing the blob data or None if the blob does not exists.
+    """
+
+    cache_dirpath = Path(cache_dirpath)
+
+    # Metadata-only request for the generation and size of the blob
+    blob_obj = bucket.get_blob(blob_name)
+    if blob_obj is None:
+        return None
+
+    key = get_blob_cache_key(bucket_name=bucket.name, blob_name=blob_name)
+    filename = f"{key}_{blob_obj.generation}"
+
+    cache_kwargs = dict(
+        cache_dirpath=cache_dirpath,
+        key=key,
+        blob_name=blob_name,
+        filename=filename,
+        max_cache_bytes=max_cache_bytes,
+    )
+    filepath = cache_dirpath / "objects" / filename
+
+    # A hit only holds the cache lock to update the index
+    with cache_lock(cache_dirpath):
+        index = read_blob_cache_index(cache_dirpath)
+        if is_cached_blob(
+            cache_dirpath=cache_dirpath,
+            index=index,
+            key=key,
+            filename=filename,
+            size=blob_obj.size,
+        ):
+            update_blob_cache_index(index=index, stat="hits", **cache_kwargs)
+            logger.info(f'Blob "{blob_name}" is loaded from the blob cache.')
+            return filepath
+
+    # The download only holds the lock of the blob, so the reads of the other blobs are
+    # not blocked, and a concurrent read of the same blob waits and reuses the download
+    with cache_lock(cache_dirpath, lock_filename=f"locks/{key}.lock"):
+        with cache_lock(cache_dirpath):
+            index = read_blob_cache_index(cache_dirpath)
+            is_hit = is_cached_blob(
+                cache_dirpath=cache_dirpath,
+                index=index,
+                key=key,
+                filename=filename,
+                size=blob_obj.size,
+            )
+            if is_hit:
+                update_blob_cache_index(index=index, stat="hits", **cache_kwargs)
+
+        if not is_hit:
+            download_cached_blob(
+                cache_dirpath=cache_dirpath, blob_obj=blob_obj, filename=filename
+            )
+            with cache_lock(cache_dirpath):
+                update_blob_cache_index(
+                    index=read_blob_cache_index(cache_dirpath),
+                    stat="misses",
+                    **cache_kwargs,
+                )
+
+    return filepath
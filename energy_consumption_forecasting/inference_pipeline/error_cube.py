@@ -0,0 +1,185 @@
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from energy_consumption_forecasting.inference_pipeline.forecast_store import (
+    ISSUE_LEVEL,
+)
+from energy_consumption_forecasting.logger import get_logger
+from energy_consumption_forecasting.metrics import (
+    compute_metrics_from_sums,
+    compute_segment_sums,
+)
+
+logger = get_logger(name=Path(__file__).name)
+
+ERROR_CUBE_BLOB_NAME = "error_cube.parquet"
+CUBE_LEVELS = ["municipality_num", "branch", "day", "lead"]
+SUM_COLUMNS = ["count", "ape", "spe", "ae", "se", "error"]
+
+
+def build_error_cube(
+    vintages: pd.DataFrame,
+    ground_truth: pd.DataFrame,
+    target_feature: str = "consumption_kwh",
+) -> pd.DataFrame:
+    """
+    This function builds the error cube of the forecast vintages, i.e. the error sums
+    of every series, day and lead time (hours between the issue and the forecasted
+    hour). The cube stores sums and counts instead of metrics, so the cells of any
+    slice can be added together and rolled up exactly.
+
+    Parameters
+    ----------
+    vintages: pd.DataFrame
+        A dataframe indexed by issue_datetime, municipality_num, branch and datetime_dk
+        containing the forecast vintages.
+
+    ground_truth: pd.DataFrame
+        A dataframe indexed by municipality_num, branch and datetime_dk containing the
+        ground truth of the target feature.
+
+    target_feature: str, default="consumption_kwh"
+        The name of the target feature in the dataset.
+
+    Returns
+    -------
+    pd.DataFrame
+        A dataframe indexed by municipality_num, branch, day and lead containing the
+        "count", "ape", "spe", "ae", "se" and "error" sums of every cell.
+    """
+
+    aligned = (
+        vintages[[target_feature]]
+        .join(
+            ground_truth[[target_feature]],
+            on=["municipality_num", "branch", "datetime_dk"],
+            how="inner",
+            rsuffix="_true",
+        )
+        .dropna()
+    )
+
+    datetime_index = aligned.index.get_level_values("datetime_dk")
+    issue_index = aligned.index.get_level_values(ISSUE_LEVEL)
+    cells = pd.MultiIndex.from_arrays(
+        [
+            aligned.index.get_level_values("municipality_num"),
+            aligned.index.get_level_values("branch"),
+            datetime_index.asfreq("D"),
+            (datetime_index.asi8 - issue_index.asi8).astype("int16"),
+        ],
+        names=CUBE_LEVELS,
+    )
+
+    codes, cells = pd.factorize(cells, sort=True)
+    sums = compute_segment_sums(
+        y_true=aligned[f"{target_feature}_true"].to_numpy(),
+        y_pred=aligned[target_feature].to_numpy(),
+        codes=codes,
+        n_segments=len(cells),
+    )
+
+    return pd.DataFrame(sums, index=cells.set_names(CUBE_LEVELS))[SUM_COLUMNS]
+
+
+def merge_error_cubes(
+    cube: Optional[pd.DataFrame],
+    new_cube: pd.DataFrame,
+    start_day: Optional[pd.Period] = None,
+) -> pd.DataFrame:
+    """
+    This function merges the error cube of newly scored hours into the error cube,
+    the sums of the same cell are added together. With a start_day, the new_cube holds
+    the recomputed cells of every day from the start_day and they replace the cells
+    of those days in the error cube, so rescoring the same hours again gives the same
+    cube.
+    """
+
+    if cube is None or len(cube) == 0:
+        return new_cube
+
+    if start_day is not None:
+        cube = cube[cube.index.get_level_values("day") < start_day]
+
+    return pd.concat([cube, new_cube]).groupby(level=CUBE_LEVELS).sum()
+
+
+def query_error_cube(
+    cube: pd.DataFrame,
+    by: List[str] = [],
+    municipality_num: Optional[List[int]] = None,
+    branch: Optional[List[int]] = None,
+    start_day: Optional[pd.Period] = None,
+    end_day: Optional[pd.Period] = None,
+    lead: Optional[List[int]] = None,
+) -> pd.DataFrame:
+    """
+    This function rolls up a slice of the error cube into the metrics of every group,
+    for eg. by=["municipality_num"] with the last 7 days gives the metrics of every
+    municipality over the last week. The metrics are exact, as the error sums of the
+    cells are added before the metrics are computed.
+
+    Parameters
+    ----------
+    cube: pd.DataFrame
+        The error cube generated by "build_error_cube".
+
+    by: List[str], default=[]
+        The cube levels to group by, by default the whole slice is a single group.
+
+    municipality_num: List[int] or None, default=None
+        The municipality numbers of the slice, by default all of them.
+
+    branch: List[int] or None, default=None
+        The branches of the slice, by default all of them.
+
+    start_day: pd.Period or None, default=None
+        The first day of the slice (included), by default the first day of the cube.
+
+    end_day: pd.Period or None, default=None
+        The last day of the slice (included), by default the last day of the cube.
+
+    lead: List[int] or None, default=None
+        The lead times in hours of the slice, by default all of them.
+
+    Returns
+    -------
+    pd.DataFrame
+        A dataframe indexed by the group levels (a single row without levels) and
+        containing the "mape", "rmspe", "mae", "rmse", "bias" and "count" of every
+        group.
+    """
+
+    is_selected = np.ones(len(cube), dtype=bool)
+    for level, values in [
+        ("municipality_num", municipality_num),
+        ("branch", branch),
+        ("lead", lead),
+    ]:
+        if values is not None:
+            is_selected &= cube.index.get_level_values(level).isin(values)
+
+    day_index = cube.index.get_level_values("day")
+    if start_day is not None:
+        is_selected &= day_index >= start_day
+    if end_day is not None:
+        is_selected &= day_index <= end_day
+
+    selected_cube = cube[is_selected]
+    if len(by) > 0:
+        sums = selected_cube.groupby(level=by).sum()
+    else:
+        sums = selected_cube.sum().to_frame().T
+
+    result_df = pd.DataFrame(
+        compute_metrics_from_sums(
+            {column: sums[column].to_numpy() for column in SUM_COLUMNS}
+        ),
+        index=sums.index,
+    )
+    result_df["count"] = sums["count"].astype("int64").to_numpy()
+
+    return result_df
@@ -0,0 +1,132 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+from energy_consumption_forecasting.logger import get_logger
+from energy_consumption_forecasting.model_artifact import NativeForecaster
+from energy_consumption_forecasting.window_features import (
+    DATETIME_LEVEL,
+    SERIES_LEVELS,
+)
+
+logger = get_logger(name=Path(__file__).name)
+
+MANIFEST_BLOB_NAME = "forecast_manifest.parquet"
+
+
+def get_forecast_key(model: NativeForecaster, fh: int = 24) -> str:
+    """
+    This function returns a SHA-256 key of the model and the forecast horizon, a
+    forecast can only be carried forward if it was generated with the same key.
+    """
+
+    forecast_hash = hashlib.sha256(model.booster.model_to_string().encode())
+    forecast_hash.update(json.dumps(model.feature_spec, sort_keys=True).encode())
+    forecast_hash.update(f"fh:{fh}".encode())
+
+    return forecast_hash.hexdigest()
+
+
+def build_forecast_manifest(
+    y: pd.DataFrame,
+    forecast_key: str,
+    window_length: int = 72,
+    target_feature: str = "consumption_kwh",
+) -> pd.DataFrame:
+    """
+    This function builds the manifest of the forecast input of every series, containing
+    the last hour of the series and a hash of its last window of observations. The
+    forecast of a series only changes when one of them changes.
+
+    Parameters
+    ----------
+    y: pd.DataFrame
+        A dataframe indexed by municipality_num, branch and datetime_dk containing the
+        target feature.
+
+    forecast_key: str
+        The key of the model and forecast horizon generated by "get_forecast_key".
+
+    window_length: int, default=72
+        Number of past hours used by the model to forecast a series.
+
+    target_feature: str, default="consumption_kwh"
+        The name of the target feature in the dataset.
+
+    Returns
+    -------
+    pd.DataFrame
+        A dataframe indexed by municipality_num and branch with the columns
+        "last_datetime", "window_hash" and "forecast_key".
+    """
+
+    target = y[target_feature].sort_index()
+
+    # Selecting the last window of every series using the hour ordinals
+    ordinals = pd.Series(
+        target.index.get_level_values(DATETIME_LEVEL).asi8, index=target.index
+    )
+    last_ordinals = ordinals.groupby(level=SERIES_LEVELS).transform("max")
+    window = target[ordinals > last_ordinals - window_length]
+
+    # The row hashes include the datetime, so the sum changes with any value or hour
+    window_hash = (
+        pd.util.hash_pandas_object(window, index=True)
+        .groupby(level=SERIES_LEVELS)
+        .sum()
+    )
+
+    manifest = pd.DataFrame(
+        {
+            "last_datetime": target.reset_index(level=DATETIME_LEVEL)[DATETIME_LEVEL]
+            .groupby(level=SERIES_LEVELS)
+            .max(),
+            "window_hash": window_hash.astype("uint64"),
+        }
+    )
+    manifest["forecast_key"] = forecast_key
+
+    return manifest
+
+
+def get_changed_series(
+    manifest: pd.DataFrame, previous_manifest: Optional[pd.DataFrame] = None
+) -> pd.MultiIndex:
+    """
+    This function compares the forecast manifest with the manifest of the previous
+    forecast vintage and returns the series that need a new forecast, i.e. the new
+    series and the series with a different last hour, window or forecast key.
+
+    Parameters
+    ----------
+    manifest: pd.DataFrame
+        The current manifest generated by "build_forecast_manifest".
+
+    previous_manifest: pd.DataFrame or None, default=None
+        The manifest of the previous forecast vintage, all the series are changed if
+        it is None.
+
+    Returns
+    -------
+    pd.MultiIndex
+        The municipality_num and branch of the changed series.
+    """
+
+    if previous_manifest is None:
+        return manifest.index
+
+    # The series missing in the previous manifest are changed
+    is_common = manifest.index.isin(previous_manifest.index)
+    current_manifest = manifest[is_common]
+    previous_manifest = previous_manifest.reindex(current_manifest.index)
+
+    is_changed = ~is_common
+    for column in ["last_datetime", "window_hash", "forecast_key"]:
+        is_changed[is_common] |= (
+            current_manifest[column].to_numpy() != previous_manifest[column].to_numpy()
+        )
+
+    return manifest.index[is_changed]
@@ -0,0 +1,378 @@
+from pathlib import Path
+from typing import List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from google.cloud import storage
+
+from energy_consumption_forecasting.inference_pipeline.utils import (
+    read_blob_from_bucket,
+    write_blob_to_bucket,
+)
+from energy_consumption_forecasting.logger import get_logger
+
+logger = get_logger(name=Path(__file__).name)
+
+FORECAST_STORE_PREFIX = "forecast_store"
+VINTAGE_PREFIX = f"{FORECAST_STORE_PREFIX}/vintages/"
+COMPACTED_PREFIX = f"{FORECAST_STORE_PREFIX}/compacted/"
+ISSUE_LEVEL = "issue_datetime"
+ISSUE_FORMAT = "%Y%m%dT%H"
+ISSUE_MONTH_FORMAT = "%Y-%m"
+
+
+def get_vintage_blob_name(issue_datetime: pd.Period) -> str:
+    """
+    This function returns the blob name of the forecast vintage issued at the
+    issue_datetime, for eg. "forecast_store/vintages/issue_datetime=20240105T23.parquet".
+    """
+
+    return (
+        f"{VINTAGE_PREFIX}{ISSUE_LEVEL}={issue_datetime.strftime(ISSUE_FORMAT)}.parquet"
+    )
+
+
+def parse_vintage_blob_name(blob_name: str) -> pd.Period:
+    """
+    This function returns the issue datetime of a forecast vintage blob name.
+    """
+
+    issue_datetime = blob_name.split("=")[-1].removesuffix(".parquet")
+
+    return pd.Period(pd.to_datetime(issue_datetime, format=ISSUE_FORMAT), freq="H")
+
+
+def list_forecast_vintages(bucket: storage.Bucket) -> List[pd.Period]:
+    """
+    This function lists the issue datetime of the forecast vintages that are not yet
+    compacted, sorted from the oldest to the latest.
+    """
+
+    return sorted(
+        parse_vintage_blob_name(blob.name)
+        for blob in bucket.list_blobs(prefix=VINTAGE_PREFIX)
+    )
+
+
+def get_compacted_blob_name(issue_month: pd.Period) -> str:
+    """
+    This function returns the blob name of the compacted partition of the vintages
+    issued in the issue_month, for eg.
+    "forecast_store/compacted/issue_month=2024-01.parquet".
+    """
+
+    return (
+        f"{COMPACTED_PREFIX}issue_month="
+        f"{issue_month.strftime(ISSUE_MONTH_FORMAT)}.parquet"
+    )
+
+
+def list_compacted_partitions(bucket: storage.Bucket) -> List[pd.Period]:
+    """
+    This function lists the issue months of the compacted partitions, sorted from the
+    oldest to the latest.
+    """
+
+    return sorted(
+        pd.Period(blob.name.split("=")[-1].removesuffix(".parquet"), freq="M")
+        for blob in bucket.list_blobs(prefix=COMPACTED_PREFIX)
+    )
+
+
+def write_compacted_partition(
+    bucket: storage.Bucket, issue_month: pd.Period, vintages: pd.DataFrame
+):
+    """
+    This function writes the vintages of an issue month as a compacted partition with
+    a row group for every issue datetime. The issue datetime is stored as a timestamp,
+    so a reader can select the vintages with pyarrow filters and only fetch their row
+    groups.
+    """
+
+    vintages = vintages.sort_index()
+    data = vintages.set_axis(
+        vintages.index.set_levels(
+            vintages.index.levels[
+                vintages.index.names.index(ISSUE_LEVEL)
+            ].to_timestamp(),
+            level=ISSUE_LEVEL,
+        )
+    )
+    table = pa.Table.from_pandas(df=data, preserve_index=True)
+
+    # Getting the first row and number of rows of every issue datetime
+    issue_sizes = data.groupby(level=ISSUE_LEVEL, sort=False).size().to_numpy()
+    issue_starts = issue_sizes.cumsum() - issue_sizes
+
+    with bucket.blob(get_compacted_blob_name(issue_month)).open(mode="wb") as file:
+        with pq.ParquetWriter(where=file, schema=table.schema) as writer:
+            for start, size in zip(issue_starts, issue_sizes):
+                writer.write_table(table=table.slice(start, size), row_group_size=size)
+
+
+def read_compacted_partition(
+    bucket: storage.Bucket,
+    issue_month: pd.Period,
+    start_issue_datetime: Optional[pd.Period] = None,
+    end_issue_datetime: Optional[pd.Period] = None,
+) -> pd.DataFrame:
+    """
+    This function reads the vintages of a compacted partition issued between the start
+    and end issue datetime (both included), the vintages are selected with pyarrow
+    filters so only the row groups of the selected issue datetimes are fetched.
+    """
+
+    filters = []
+    if start_issue_datetime is not None:
+        filters.append((ISSUE_LEVEL, ">=", start_issue_datetime.to_timestamp()))
+    if end_issue_datetime is not None:
+        filters.append((ISSUE_LEVEL, "<=", end_issue_datetime.to_timestamp()))
+
+    with bucket.blob(get_compacted_blob_name(issue_month)).open(mode="rb") as file:
+        vintages = pd.read_parquet(path=file, filters=filters or None)
+
+    return vintages.set_axis(
+        vintages.index.set_levels(
+            vintages.index.levels[vintages.index.names.index(ISSUE_LEVEL)].to_period(
+                "H"
+            ),
+            level=ISSUE_LEVEL,
+        )
+    )
+
+
+def read_vintage_blobs(
+    bucket: storage.Bucket, issue_datetimes: List[pd.Period]
+) -> List[pd.DataFrame]:
+    """
+    This function reads the forecast vintage blobs of the issue datetimes, every
+    vintage is indexed by its issue datetime.
+    """
+
+    return [
+        pd.concat(
+            {
+                issue_datetime: read_blob_from_bucket(
+                    bucket=bucket, blob_name=get_vintage_blob_name(issue_datetime)
+                )
+            },
+            names=[ISSUE_LEVEL],
+        )
+        for issue_datetime in issue_datetimes
+    ]
+
+
+def append_forecast_vintage(
+    bucket: storage.Bucket, prediction: pd.DataFrame, issue_datetime: pd.Period
+) -> str:
+    """
+    This function appends the prediction of an inference run to the forecast store as
+    a new vintage, the write only depends on the size of the prediction. A rerun with
+    the same issue datetime replaces the vintage.
+
+    Parameters
+    ----------
+    bucket: storage.Bucket
+        A bucket object that is generated by GCS, can be used for uploading and
+        downloading data.
+
+    prediction: pd.DataFrame
+        A dataframe indexed by municipality_num, branch and datetime_dk containing the
+        forecast prediction.
+
+    issue_datetime: pd.Period
+        The hour at which the forecast was issued, i.e. the last hour of the data used
+        for the forecast.
+
+    Returns
+    -------
+    str
+        The blob name of the forecast vintage.
+    """
+
+    blob_name = get_vintage_blob_name(issue_datetime)
+    write_blob_to_bucket(bucket=bucket, blob_name=blob_name, data=prediction)
+    logger.info(f'Forecast vintage "{blob_name}" is appended to the forecast store.')
+
+    return blob_name
+
+
+def read_forecast_vintages(
+    bucket: storage.Bucket,
+    start_issue_datetime: Optional[pd.Period] = None,
+    end_issue_datetime: Optional[pd.Period] = None,
+) -> Optional[pd.DataFrame]:
+    """
+    This function reads the forecast vintages issued between the start and end issue
+    datetime (both included) from the compacted store and the newer vintages. Only the
+    compacted partitions of the issue months in the range are read, and only the row
+    groups of the selected issue datetimes are fetched from them.
+
+    Parameters
+    ----------
+    bucket: storage.Bucket
+        A bucket object that is generated by GCS, can be used for uploading and
+        downloading data.
+
+    start_issue_datetime: pd.Period or None, default=None
+        The first issue datetime to read, by default the oldest vintage.
+
+    end_issue_datetime: pd.Period or None, default=None
+        The last issue datetime to read, by default the latest vintage.
+
+    Returns
+    -------
+    pd.DataFrame or None
+        A dataframe indexed by issue_datetime, municipality_num, branch and datetime_dk
+        or None if no vintage was issued in the range.
+    """
+
+    issue_datetimes = [
+        issue_datetime
+        for issue_datetime in list_forecast_vintages(bucket)
+        if (start_issue_datetime is None or issue_datetime >= start_issue_datetime)
+        and (end_issue_datetime is None or issue_datetime <= end_issue_datetime)
+    ]
+    issue_months = [
+        issue_month
+        for issue_month in list_compacted_partitions(bucket)
+        if (
+            start_issue_datetime is None
+            or issue_month >= start_issue_datetime.asfreq("M")
+        )
+        and (
+            end_issue_datetime is None or issue_month <= end_issue_datetime.asfreq("M")
+        )
+    ]
+
+    vintages = [
+        read_compacted_partition(
+            bucket=bucket,
+            issue_month=issue_month,
+            start_issue_datetime=start_issue_datetime,
+            end_issue_datetime=end_issue_datetime,
+        )
+        for issue_month in issue_months
+    ]
+    vintages += read_vintage_blobs(bucket=bucket, issue_datetimes=issue_datetimes)
+
+    vintages = [vintage for vintage in vintages if len(vintage) > 0]
+    if len(vintages) == 0:
+        return None
+
+    # A vintage present in both the compacted store and as a blob is only kept once
+    vintages = pd.concat(vintages)
+    vintages = vintages[~vintages.index.duplicated(keep="last")]
+
+    return vintages.sort_index()
+
+
+def read_latest_forecast(
+    bucket: storage.Bucket, vintages: Optional[pd.DataFrame] = None
+) -> Optional[pd.DataFrame]:
+    """
+    This function returns the latest forecast of every series and hour across all the
+    forecast vintages, i.e. every hour is forecasted by the latest vintage containing
+    it. The index is the same as the forecast prediction.
+
+    Parameters
+    ----------
+    bucket: storage.Bucket
+        A bucket object that is generated by GCS, can be used for uploading and
+        downloading data.
+
+    vintages: pd.DataFrame or None, default=None
+        The vintages generated by "read_forecast_vintages", by default all the
+        vintages are read from the forecast store.
+
+    Returns
+    -------
+    pd.DataFrame or None
+        A dataframe indexed by municipality_num, branch and datetime_dk or None if
+        the forecast store is empty.
+    """
+
+    if vintages is None:
+        vintages = read_forecast_vintages(bucket=bucket)
+    if vintages is None:
+        return None
+
+    # Vintages are sorted by issue datetime, so the last duplicate is the latest one
+    latest_forecast = vintages.droplevel(level=ISSUE_LEVEL)
+    latest_forecast = latest_forecast[~latest_forecast.index.duplicated(keep="last")]
+
+    return latest_forecast.sort_index()
+
+
+def compact_forecast_store(
+    bucket: storage.Bucket, retention_days: Optional[int] = 365
+) -> List[pd.Period]:
+    """
+    This function compacts the forecast vintages into the compacted partitions of their
+    issue month, only the partitions receiving new vintages are rewritten. With a
+    retention, the partitions of the months ending more than retention_days before the
+    latest vintage are deleted, so the vintages are kept at least retention_days. The
+    partitions are written before the vintage blobs are deleted, so a reader never
+    misses a vintage.
+
+    Parameters
+    ----------
+    bucket: storage.Bucket
+        A bucket object that is generated by GCS, can be used for uploading and
+        downloading data.
+
+    retention_days: int or None, default=365
+        Number of days of forecast vintages to keep, None keeps all the vintages.
+
+    Returns
+    -------
+    List[pd.Period]
+        The issue months of the rewritten partitions.
+    """
+
+    issue_datetimes = list_forecast_vintages(bucket)
+    if len(issue_datetimes) == 0:
+        return []
+
+    compacted_months = list_compacted_partitions(bucket)
+    new_vintages = pd.concat(
+        read_vintage_blobs(bucket=bucket, issue_datetimes=issue_datetimes)
+    )
+    issue_months = new_vintages.index.get_level_values(ISSUE_LEVEL).asfreq("M")
+
+    # Merging the new vintages into the partition of their issue month, a rerun
+    # vintage replaces the compacted one
+    for issue_month, month_vintages in new_vintages.groupby(issue_months, sort=True):
+        if issue_month in compacted_months:
+            month_vintages = pd.concat(
+                [
+                    read_compacted_partition(bucket=bucket, issue_month=issue_month),
+                    month_vintages,
+                ]
+            )
+            month_vintages = month_vintages[
+                ~month_vintages.index.duplicated(keep="last")
+            ]
+        write_compacted_partition(
+            bucket=bucket, issue_month=issue_month, vintages=month_vintages
+        )
+
+    for issue_datetime in issue_datetimes:
+        bucket.blob(blob_name=get_vintage_blob_name(issue_datetime)).delete()
+
+    # Deleting the partitions of the months ending before the retention
+    if retention_days is not None:
+        retention_datetime = max(issue_datetimes) - retention_days * 24
+        for issue_month in compacted_months:
+            if issue_month.asfreq("H", how="end") <= retention_datetime:
+                bucket.blob(blob_name=get_compacted_blob_name(issue_month)).delete()
+                logger.info(f"Forecast vintages of {issue_month} are dropped.")
+
+    rewritten_months = sorted(set(issue_months))
+    logger.info(
+        f"{len(issue_datetimes)} forecast vintages are compacted into the partitions "
+        f"of {[str(issue_month) for issue_month in rewritten_months]}."
+    )
+
+    return rewritten_months
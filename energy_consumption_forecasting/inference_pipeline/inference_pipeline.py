@@ -1,6 +1,10 @@
 import argparse
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
 
 import joblib
 import numpy as np
@@ -11,16 +15,42 @@ from energy_consumption_forecasting.exceptions import log_exception
 from energy_consumption_forecasting.inference_pipeline.batch_data import (
     get_batch_data_from_hopsworks,
 )
+from energy_consumption_forecasting.inference_pipeline.forecast_manifest import (
+    MANIFEST_BLOB_NAME,
+    build_forecast_manifest,
+    get_changed_series,
+    get_forecast_key,
+)
+from energy_consumption_forecasting.inference_pipeline.forecast_store import (
+    append_forecast_vintage,
+    compact_forecast_store,
+    list_compacted_partitions,
+    list_forecast_vintages,
+)
+from energy_consumption_forecasting.inference_pipeline.model_cache import (
+    get_cached_model_path,
+    get_model_checksum,
+)
 from energy_consumption_forecasting.inference_pipeline.utils import (
     get_gcs_bucket,
+    get_series_blob_name,
     read_blob_from_bucket,
     write_blob_to_bucket,
+    write_blobs_to_bucket,
 )
 from energy_consumption_forecasting.logger import get_logger
+from energy_consumption_forecasting.model_artifact import (
+    NativeForecaster,
+    is_model_artifact,
+    load_model_artifact,
+)
 from energy_consumption_forecasting.utils import get_env_var
 
 logger = get_logger(name=Path(__file__).name)
 
+# Model and batch data shared with the inference worker processes
+_INFERENCE_DATA: Dict[str, Any] = {}
+
 import hopsworks
 
 
@@ -28,11 +58,14 @@ def load_model_from_hopsworks(
     project,
     model_version: int = 1,
     model_name: str = "forecast_model",
+    use_cache: bool = True,
+    bucket=None,
 ):
     """
-    This function loads the model from hopsworks model registry,
-    model is downloaded as pickle file and transformed into a
-    sktime object that can be used for forecasting.
+    This function loads the model from hopsworks model registry. If the model was
+    registered as a native model artifact (LightGBM), the artifact is verified with
+    the checksum in the model description and loaded without sktime. Otherwise the
+    model is downloaded as pickle file and transformed into a sktime object.
 
     Parameters
     ----------
@@ -45,35 +78,66 @@ def load_model_from_hopsworks(
     model_name: str, default="forecast_model"
         Model name used when saving the model in hopsworks.
 
+    use_cache: bool, default=True
+        Whether to load the model through the local model cache, which skips the
+        download and the model registry request for recently used models.
+
+    bucket: storage.Bucket or None, default=None
+        The bucket containing the model pointer blobs, the model cache revalidates
+        the model with its pointer blob instead of the model registry.
+
     Returns
     -------
     model
-        A model is returned after loading the pickle file, the model type can be a
-        sktime model or sktime forecasting pipeline which can be used for forecasting.
+        A model is returned after loading the artifact or pickle file, the model type
+        can be a "NativeForecaster", a sktime model or sktime forecasting pipeline
+        which can be used for forecasting.
     """
 
-    model_registry = project.get_model_registry()
-    model_instance = model_registry.get_model(name=model_name, version=model_version)
-    model_path = model_instance.download()
-    model_path = Path(model_path) / f"{model_name}_{model_version}.pkl"
+    if use_cache:
+        model_path = get_cached_model_path(
+            project=project,
+            model_name=model_name,
+            model_version=model_version,
+            bucket=bucket,
+        )
+        checksum = model_path.name
+    else:
+        model_registry = project.get_model_registry()
+        model_instance = model_registry.get_model(
+            name=model_name, version=model_version
+        )
+        model_path = Path(model_instance.download())
+        checksum = get_model_checksum(model_instance)
+
+    # Loading the native model artifact and verifying it with the registry checksum
+    if is_model_artifact(model_path):
+        model = load_model_artifact(artifact_dirpath=model_path, checksum=checksum)
+        return model
 
     # Loading the model pickle file object
-    model = joblib.load(model_path)
+    model = joblib.load(model_path / f"{model_name}_{model_version}.pkl")
 
     return model
 
 
-def get_batch_forecast(model, X: pd.DataFrame, fh: int = 24) -> pd.DataFrame:
+def get_batch_forecast(
+    model, X: pd.DataFrame, fh: int = 24, y: Optional[pd.DataFrame] = None
+) -> pd.DataFrame:
     """
     This functions takes the X dataframe and generates a forecast dataframe similar to
     X with the help of forecast horizon input.
     Once the data is generated it is used to make prediction from the model.
 
+    A "NativeForecaster" bypasses sktime, the last window of every series is taken
+    from y and the booster forecasts all the series at once with vectorized features.
+    The predictions are identical to the sktime forecasting pipeline.
+
     Parameters
     ----------
     model:
-        A sktime model or sktime forecasting pipeline that has been trained using the
-        fit function.
+        A sktime model, sktime forecasting pipeline or "NativeForecaster" that has
+        been trained using the fit function.
 
     X: pd.DataFrame
         A batch dataframe with input features that are provided by the feature store.
@@ -81,6 +145,11 @@ def get_batch_forecast(model, X: pd.DataFrame, fh: int = 24) -> pd.DataFrame:
     fh: int, default=24
         A period that indicates the forecast horizon while making prediction in Hours.
 
+    y: pd.DataFrame or None, default=None
+        A batch dataframe with the target feature that are provided by the feature
+        store, it is only used by a "NativeForecaster". If provided, the forecast
+        starts after the last hour of y instead of the model cutoff.
+
     Returns
     -------
     pd.Dataframe
@@ -93,6 +162,9 @@ def get_batch_forecast(model, X: pd.DataFrame, fh: int = 24) -> pd.DataFrame:
     branch = X.index.get_level_values(level=1).unique()
     last_datetime = X.index.get_level_values(level=2).max()
 
+    if isinstance(model, NativeForecaster):
+        return model.predict(fh=np.arange(fh) + 1, y=y, cutoff=last_datetime)
+
     # Forecast date range starts after the test data and ends at max forecast horizon
     start_datetime = last_datetime + 1
     end_datetime = last_datetime + fh
@@ -116,6 +188,222 @@ def get_batch_forecast(model, X: pd.DataFrame, fh: int = 24) -> pd.DataFrame:
     return prediction
 
 
+def _init_inference_worker(
+    model, y: pd.DataFrame, fh: int, cutoff: pd.Period, num_threads: int = 0
+):
+    """
+    Stores the model and the batch data in the worker process, with the fork start
+    method they are inherited from the parent process instead of being loaded again.
+    """
+
+    model.num_threads = num_threads
+    _INFERENCE_DATA.update(model=model, y=y, fh=fh, cutoff=cutoff)
+
+
+def _forecast_shard(municipality_nums: List[int]) -> pd.DataFrame:
+    """
+    Forecasts all the series of the provided municipalities using the shared model
+    and batch data, the forecast of every shard starts after the same cutoff.
+    """
+
+    return _INFERENCE_DATA["model"].predict(
+        fh=np.arange(_INFERENCE_DATA["fh"]) + 1,
+        y=_INFERENCE_DATA["y"].loc[municipality_nums],
+        cutoff=_INFERENCE_DATA["cutoff"],
+    )
+
+
+def get_sharded_batch_forecast(
+    model,
+    X: pd.DataFrame,
+    y: pd.DataFrame,
+    fh: int = 24,
+    n_jobs: int = -1,
+    cutoff: Optional[pd.Period] = None,
+) -> pd.DataFrame:
+    """
+    This function generates the batch forecast like "get_batch_forecast", where the
+    series are sharded by municipality and forecasted in parallel worker processes.
+    The model is loaded once and shared with the workers by forking the process and
+    the shard forecasts are merged back in the same format.
+
+    Only a "NativeForecaster" can forecast a subset of the series, any other model
+    forecasts all the series in a single process.
+
+    Parameters
+    ----------
+    model:
+        A sktime model, sktime forecasting pipeline or "NativeForecaster" that has
+        been trained using the fit function.
+
+    X: pd.DataFrame
+        A batch dataframe with input features that are provided by the feature store.
+
+    y: pd.DataFrame
+        A batch dataframe with the target feature that are provided by the feature
+        store.
+
+    fh: int, default=24
+        A period that indicates the forecast horizon while making prediction in Hours.
+
+    n_jobs: int, default=-1
+        Number of worker processes, -1 uses all the CPU cores and 1 forecasts all the
+        series in the current process.
+
+    cutoff: pd.Period or None, default=None
+        The last hour of the observations after which the forecast of a
+        "NativeForecaster" starts, by default the last hour of X.
+
+    Returns
+    -------
+    pd.Dataframe
+        Model generates the forecast prediction in pandas dataframe format.
+    """
+
+    if not isinstance(model, NativeForecaster):
+        return get_batch_forecast(model=model, X=X, fh=fh, y=y)
+
+    municipality_nums = X.index.get_level_values(level=0).unique().sort_values()
+    n_jobs = min(os.cpu_count() if n_jobs == -1 else n_jobs, len(municipality_nums))
+    if cutoff is None:
+        cutoff = X.index.get_level_values(level=2).max()
+
+    if n_jobs <= 1:
+        return model.predict(fh=np.arange(fh) + 1, y=y, cutoff=cutoff)
+
+    # Splitting the municipalities into a few shards per worker to balance the load
+    n_shards = min(n_jobs * 4, len(municipality_nums))
+    shards = [
+        municipality_nums[shard].tolist()
+        for shard in np.array_split(np.arange(len(municipality_nums)), n_shards)
+    ]
+    logger.info(
+        f"Forecasting {len(municipality_nums)} municipalities in {n_shards} shards "
+        f"with {n_jobs} worker processes."
+    )
+
+    # Sharing the CPU cores between the workers to avoid oversubscription
+    with ProcessPoolExecutor(
+        max_workers=n_jobs,
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=_init_inference_worker,
+        initargs=(
+            model,
+            y.sort_index(),
+            fh,
+            cutoff,
+            max(1, os.cpu_count() // n_jobs),
+        ),
+    ) as executor:
+        predictions = list(executor.map(_forecast_shard, shards))
+
+    return pd.concat(predictions)
+
+
+def get_change_driven_forecast(
+    model: NativeForecaster,
+    X: pd.DataFrame,
+    y: pd.DataFrame,
+    fh: int = 24,
+    previous_manifest: Optional[pd.DataFrame] = None,
+    previous_prediction: Optional[pd.DataFrame] = None,
+    target_feature: str = "consumption_kwh",
+    n_jobs: int = -1,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    This function only forecasts the series whose input changed since the previous
+    forecast vintage, the forecast of the other series is carried forward from the
+    previous prediction. A series is changed when its last hour, its last window of
+    observations, the model or the forecast horizon is different from the previous
+    forecast manifest.
+
+    Every changed series is forecasted from its own last hour, so a series that did
+    not receive new data is not forecasted from a window of missing values.
+
+    Parameters
+    ----------
+    model: NativeForecaster
+        The forecaster loaded from the native model artifact.
+
+    X: pd.DataFrame
+        A batch dataframe with input features that are provided by the feature store.
+
+    y: pd.DataFrame
+        A batch dataframe with the target feature that are provided by the feature
+        store.
+
+    fh: int, default=24
+        A period that indicates the forecast horizon while making prediction in Hours.
+
+    previous_manifest: pd.DataFrame or None, default=None
+        The forecast manifest of the previous forecast vintage.
+
+    previous_prediction: pd.DataFrame or None, default=None
+        The prediction of the previous forecast vintage, all the series are forecasted
+        if it is None.
+
+    target_feature: str, default="consumption_kwh"
+        The name of the target feature in the dataset.
+
+    n_jobs: int, default=-1
+        Number of worker processes forecasting the changed series sharded by
+        municipality, -1 uses all the CPU cores.
+
+    Returns
+    -------
+    Tuple[pd.DataFrame, pd.DataFrame]
+        The prediction of all the series and the forecast manifest of this vintage.
+    """
+
+    manifest = build_forecast_manifest(
+        y=y,
+        forecast_key=get_forecast_key(model=model, fh=fh),
+        window_length=model.feature_spec["window_length"],
+        target_feature=target_feature,
+    )
+
+    # Only the series present in the previous prediction can be carried forward
+    if previous_manifest is not None and previous_prediction is not None:
+        previous_series = previous_prediction.index.droplevel(level=2).unique()
+        previous_manifest = previous_manifest[
+            previous_manifest.index.isin(previous_series)
+        ]
+    else:
+        previous_manifest = None
+
+    changed_series = get_changed_series(
+        manifest=manifest, previous_manifest=previous_manifest
+    )
+    logger.info(
+        f"{len(changed_series)} out of {len(manifest)} series have changed since the "
+        "previous forecast vintage."
+    )
+
+    predictions = []
+    unchanged_series = manifest.index.difference(changed_series)
+    if len(unchanged_series) > 0:
+        predictions.append(
+            previous_prediction[
+                previous_prediction.index.droplevel(level=2).isin(unchanged_series)
+            ]
+        )
+
+    # Forecasting the changed series in groups with the same last hour
+    for last_datetime, group in manifest.loc[changed_series].groupby("last_datetime"):
+        predictions.append(
+            get_sharded_batch_forecast(
+                model=model,
+                X=X[X.index.droplevel(level=2).isin(group.index)],
+                y=y[y.index.droplevel(level=2).isin(group.index)],
+                fh=fh,
+                n_jobs=n_jobs,
+                cutoff=last_datetime,
+            )
+        )
+
+    return pd.concat(predictions).sort_index(), manifest
+
+
 def save_data_to_gcs_bucket(X: pd.DataFrame, y: pd.DataFrame, prediction: pd.DataFrame):
     """
     This function saves the data into the Google cloud storage bucket by transforming
@@ -135,78 +423,89 @@ def save_data_to_gcs_bucket(X: pd.DataFrame, y: pd.DataFrame, prediction: pd.Dat
     prediction: pd.DataFrame
         A dataframe that is generated from the model as a prediction or forecast.
         This data is saved in the bucket with the blob name as "prediction.parquet".
+
+    The target and prediction data are also saved with a row group for every series,
+    with the blob names "target_by_series.parquet" and "prediction_by_series.parquet",
+    so that a single series can be read with a byte-range request.
     """
 
     # Connecting to Google cloud storage and getting the bucket object
     bucket = get_gcs_bucket()
 
     # Transforming and uploading the input, target and prediction dataframe
-    # into parquet data in the GCS bucket
-    for data, blob_name in zip(
-        [X, y, prediction], ["input.parquet", "target.parquet", "prediction.parquet"]
-    ):
-        logger.info(f'Uploading blob data "{blob_name}" in the GCS bucket.')
-        write_blob_to_bucket(
-            bucket=bucket,
-            blob_name=blob_name,
-            data=data,
-        )
-        logger.info(f'Blob Data "{blob_name}" is successfully uploaded to GCS bucket.')
+    # into parquet data in the GCS bucket concurrently
+    blobs = {"input.parquet": X, "target.parquet": y, "prediction.parquet": prediction}
+    series_blob_names = [
+        get_series_blob_name(blob_name)
+        for blob_name in ["target.parquet", "prediction.parquet"]
+    ]
+    blobs.update(zip(series_blob_names, [y, prediction]))
+
+    logger.info(f"Uploading blob data {list(blobs)} in the GCS bucket.")
+    write_blobs_to_bucket(
+        bucket=bucket, blobs=blobs, series_blob_names=series_blob_names
+    )
+    logger.info(f"Blob data {list(blobs)} is successfully uploaded to GCS bucket.")
 
 
-def save_prediction_data_for_caching(prediction: pd.DataFrame):
+def save_prediction_data_for_caching(
+    prediction: pd.DataFrame,
+    issue_datetime: pd.Period,
+    compact_every: int = 7,
+    retention_days: Optional[int] = 365,
+):
     """
-    This function creates or updates the cached prediction dataframe with the newly
-    generated prediction and then saves the dataframe in the Google cloud storage(GCS)
-    as a parquet file called "cached_prediction.parquet".
+    This function appends the newly generated prediction to the append-only forecast
+    store in the Google cloud storage(GCS) as a vintage keyed by the issue datetime,
+    so the write only depends on the size of the prediction and the older vintages are
+    kept. The vintages are compacted into a single blob every compact_every runs, the
+    latest forecast of every hour is read with "forecast_store.read_latest_forecast".
 
     Parameters
     ----------
     prediction: pd.DataFrame
         Newly generated forecast prediction by the model.
-    """
-
-    # Getting the GCS bucket object to download the cached prediction data
-    bucket = get_gcs_bucket()
-    cached_prediction = read_blob_from_bucket(
-        bucket=bucket, blob_name="cached_prediction.parquet"
-    )
 
-    # Checking if cached prediction data exist
-    cached_prediction_exist = cached_prediction is not None
-    if cached_prediction_exist:
-        # Merging current prediction and cached prediction
-        merged_prediction = prediction.merge(
-            right=cached_prediction,
-            how="outer",
-            left_index=True,
-            right_index=True,
-            suffixes=("_new", "_cached"),
-        )
+    issue_datetime: pd.Period
+        The hour at which the forecast was issued, i.e. the last hour of the data used
+        for the forecast.
 
-        # Filtering the new and cached prediction into different dataframe
-        new_prediction = merged_prediction.filter(regex="_new")
-        new_prediction.columns = new_prediction.columns.str.replace(pat="_new", repl="")
-        cached_pred = merged_prediction.filter(regex="_cached")
-        cached_pred.columns = cached_pred.columns.str.replace(pat="_cached", repl="")
+    compact_every: int, default=7
+        Number of vintages after which the forecast store is compacted.
 
-        # Updating the NaN values in the new prediction with cached prediction data
-        new_prediction.update(cached_pred)
-        prediction = new_prediction
+    retention_days: int or None, default=365
+        Number of days of forecast vintages kept by the compaction, None keeps all
+        the vintages.
+    """
 
-    # Cleaning the prediction dataframe and uploading it to the GCS bucket
-    prediction = prediction.dropna(subset=["consumption_kwh"])
+    bucket = get_gcs_bucket()
+    issue_datetimes = list_forecast_vintages(bucket)
 
-    write_blob_to_bucket(
+    # Moving the cached prediction of the previous layout into the forecast store
+    if len(issue_datetimes) == 0 and len(list_compacted_partitions(bucket)) == 0:
+        cached_prediction = read_blob_from_bucket(
+            bucket=bucket, blob_name="cached_prediction.parquet"
+        )
+        if cached_prediction is not None and len(cached_prediction) > 0:
+            legacy_issue_datetime = (
+                cached_prediction.index.get_level_values(level="datetime_dk").min() - 1
+            )
+            append_forecast_vintage(
+                bucket=bucket,
+                prediction=cached_prediction,
+                issue_datetime=legacy_issue_datetime,
+            )
+            issue_datetimes.append(legacy_issue_datetime)
+
+    append_forecast_vintage(
         bucket=bucket,
-        blob_name="cached_prediction.parquet",
-        data=prediction,
-    )
-    logger.info(
-        'Cached prediction "cached_prediction.parquet" has been successfully '
-        "updated with the new forecast predictions"
+        prediction=prediction.dropna(subset=["consumption_kwh"]),
+        issue_datetime=issue_datetime,
     )
 
+    if len(set(issue_datetimes) | {issue_datetime}) >= compact_every:
+        compact_forecast_store(bucket=bucket, retention_days=retention_days)
+
 
 @log_exception(logger=logger)
 @validate_call
@@ -219,6 +518,8 @@ def run_inference_pipeline(
     feature_view_name: str = "denmark_energy_consumption_view",
     model_version: int = 1,
     model_name: str = "forecast_model",
+    n_jobs: int = -1,
+    change_driven: bool = True,
 ):
     """
     This function will perform the batch inference pipeline from getting the data
@@ -254,6 +555,15 @@ def run_inference_pipeline(
 
     model_name: str, default="forecast_model"
         Model name used when saving the model in hopsworks.
+
+    n_jobs: int, default=-1
+        Number of worker processes forecasting the series sharded by municipality,
+        -1 uses all the CPU cores.
+
+    change_driven: bool, default=True
+        Whether to only forecast the series whose data changed since the previous
+        forecast vintage and carry forward the forecast of the other series, it is
+        only supported by a native model artifact.
     """
 
     # Connecting to the hopsworks feature store using the project API
@@ -290,12 +600,38 @@ def run_inference_pipeline(
         project=project,
         model_version=model_version,
         model_name=model_name,
+        bucket=get_gcs_bucket(),
     )
     logger.info("Model is successfully loaded from the model registry.")
 
     # Performing forecast prediction using the data and model
     logger.info("Performing forecast prediction using the data and model.")
-    prediction = get_batch_forecast(model=model, X=X, fh=fh)
+    manifest = None
+    if change_driven and isinstance(model, NativeForecaster):
+        bucket = get_gcs_bucket()
+        previous_manifest = read_blob_from_bucket(
+            bucket=bucket, blob_name=MANIFEST_BLOB_NAME
+        )
+        previous_prediction = None
+        if previous_manifest is not None:
+            previous_prediction = read_blob_from_bucket(
+                bucket=bucket, blob_name="prediction.parquet"
+            )
+
+        prediction, manifest = get_change_driven_forecast(
+            model=model,
+            X=X,
+            y=y,
+            fh=fh,
+            previous_manifest=previous_manifest,
+            previous_prediction=previous_prediction,
+            target_feature=target_feature,
+            n_jobs=n_jobs,
+        )
+    else:
+        prediction = get_sharded_batch_forecast(
+            model=model, X=X, y=y, fh=fh, n_jobs=n_jobs
+        )
     pred_start_datetime = prediction.index.get_level_values(level="datetime_dk").min()
     pred_end_datetime = prediction.index.get_level_values(level="datetime_dk").max()
     logger.info(
@@ -312,10 +648,20 @@ def run_inference_pipeline(
     )
     logger.info("All the dataframe were successfully uploaded in the GCS bucket.")
 
-    # Saving the newly generated prediction by updating the cached_prediction dataframe
-    logger.info("Merging new prediction with cached prediction")
-    save_prediction_data_for_caching(prediction=prediction)
-    logger.info("Cached prediction was successfully updated with the new prediction")
+    # Saving the manifest after the prediction, so it always describes a saved forecast
+    if manifest is not None:
+        write_blob_to_bucket(
+            bucket=get_gcs_bucket(), blob_name=MANIFEST_BLOB_NAME, data=manifest
+        )
+        logger.info(f'Forecast manifest "{MANIFEST_BLOB_NAME}" has been updated.')
+
+    # Appending the newly generated prediction to the forecast store
+    logger.info("Appending new prediction to the forecast store.")
+    save_prediction_data_for_caching(
+        prediction=prediction,
+        issue_datetime=y.index.get_level_values(level="datetime_dk").max(),
+    )
+    logger.info("Forecast store was successfully updated with the new prediction")
 
 
 if __name__ == "__main__":
@@ -382,6 +728,21 @@ if __name__ == "__main__":
         "needs to be in integer format.",
     )
 
+    parser.add_argument(
+        "--n_jobs",
+        type=int,
+        default=-1,
+        help="Number of worker processes forecasting the series sharded by "
+        "municipality, -1 uses all the CPU cores.",
+    )
+
+    parser.add_argument(
+        "--no_change_driven",
+        action="store_true",
+        help="Forecast all the series instead of only the series whose data changed "
+        "since the previous forecast vintage.",
+    )
+
     args = parser.parse_args()
 
     run_inference_pipeline(
@@ -393,4 +754,6 @@ if __name__ == "__main__":
         feature_view_name=args.views_name,
         model_version=args.model_ver,
         model_name=args.model_name,
+        n_jobs=args.n_jobs,
+        change_driven=not args.no_change_driven,
     )
@@ -0,0 +1,410 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from energy_consumption_forecasting.logger import get_logger
+from energy_consumption_forecasting.model_artifact import (
+    compute_artifact_checksum,
+    compute_file_checksum,
+    is_model_artifact,
+)
+from energy_consumption_forecasting.utils import get_env_var
+
+logger = get_logger(name=Path(__file__).name)
+ROOT_DIRPATH = Path(get_env_var(key="PROJECT_ROOT_DIR_PATH", default_value="."))
+CACHE_DIRPATH = Path(
+    get_env_var(
+        key="MODEL_CACHE_DIR_PATH",
+        default_value=str(ROOT_DIRPATH / "data" / "cache" / "models"),
+    )
+)
+MAX_CACHE_BYTES = int(
+    get_env_var(key="MODEL_CACHE_MAX_BYTES", default_value="2000000000")
+)
+
+# Seconds after which a cached model reference is revalidated, with the model pointer
+# blob published by the training pipeline or else with the model registry
+REVALIDATE_AFTER = int(
+    get_env_var(key="MODEL_CACHE_REVALIDATE_AFTER", default_value="300")
+)
+
+INDEX_FILENAME = "index.json"
+LOCK_FILENAME = ".lock"
+MODEL_POINTER_PREFIX = "model_pointers"
+
+
+def get_model_checksum(model_instance) -> Optional[str]:
+    """
+    This function returns the model artifact checksum that was saved in the model
+    description by the training pipeline, None if the description has no checksum.
+    """
+
+    try:
+        return json.loads(model_instance.description).get("artifact_checksum")
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def compute_model_dir_checksum(model_dirpath: Path) -> str:
+    """
+    This function computes the SHA-256 checksum of a downloaded model directory. The
+    native model artifact uses the same checksum as the model registry, any other
+    model (for eg. a pickle file) uses the checksum of all the files in the directory.
+    A single model file has the checksum of a directory containing only this file.
+    """
+
+    model_dirpath = Path(model_dirpath)
+    if is_model_artifact(model_dirpath):
+        return compute_artifact_checksum(model_dirpath)
+
+    if model_dirpath.is_file():
+        filepaths, model_dirpath = [model_dirpath], model_dirpath.parent
+    else:
+        filepaths = sorted(path for path in model_dirpath.rglob("*") if path.is_file())
+
+    dir_hash = hashlib.sha256()
+    for filepath in filepaths:
+        relative_path = filepath.relative_to(model_dirpath).as_posix()
+        dir_hash.update(f"{relative_path}:{compute_file_checksum(filepath)}\n".encode())
+
+    return dir_hash.hexdigest()
+
+
+def get_model_pointer_blob_name(model_name: str, model_version: int) -> str:
+    """
+    This function returns the name of the pointer blob of a model name and version.
+    """
+
+    return f"{MODEL_POINTER_PREFIX}/{model_name}_{model_version}.json"
+
+
+def publish_model_pointer(bucket, model_name: str, model_version: int, checksum: str):
+    """
+    This function publishes the checksum of a registered model in its pointer blob,
+    it is called by the training pipeline after registering the model. The model
+    cache checks the generation of the pointer blob, a metadata-only request, instead
+    of requesting the model registry, and the checksum is also published for the models
+    registered without a checksum in their description (for eg. a pickle file).
+    """
+
+    blob_obj = bucket.blob(get_model_pointer_blob_name(model_name, model_version))
+    with blob_obj.open("wb") as file:
+        file.write(json.dumps({"checksum": checksum}).encode())
+
+
+def read_model_pointer(
+    bucket, model_name: str, model_version: int, ref: Optional[Dict[str, Any]] = None
+) -> Tuple[Optional[str], Optional[int]]:
+    """
+    This function returns the checksum and generation of the pointer blob of a model.
+    The pointer blob is only downloaded when its generation differs from the
+    generation of the cached reference, and (None, None) is returned when the model
+    has no pointer blob.
+    """
+
+    blob_obj = bucket.get_blob(get_model_pointer_blob_name(model_name, model_version))
+    if blob_obj is None:
+        return None, None
+
+    if ref is not None and ref.get("pointer_generation") == blob_obj.generation:
+        return ref["checksum"], blob_obj.generation
+
+    return json.loads(blob_obj.download_as_bytes())["checksum"], blob_obj.generation
+
+
+def get_dir_size(dirpath: Path) -> int:
+    """
+    This function returns the total size of all the files in the directory in bytes.
+    """
+
+    return sum(
+        path.stat().st_size for path in Path(dirpath).rglob("*") if path.is_file()
+    )
+
+
+@contextmanager
+def cache_lock(cache_dirpath: Path, lock_filename: str = LOCK_FILENAME):
+    """
+    This function creates a context manager that holds an exclusive file lock on the
+    cache directory, the lock is shared by all the processes using the same cache. A
+    different lock_filename locks a single key of the cache instead of the directory.
+    """
+
+    lock_filepath = cache_dirpath / lock_filename
+    lock_filepath.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_filepath, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_cache_index(cache_dirpath: Path) -> Dict[str, Any]:
+    """
+    This function reads the cache index, containing the cached objects by checksum and
+    the model references by model name and version.
+    """
+
+    index_filepath = cache_dirpath / INDEX_FILENAME
+    if not index_filepath.exists():
+        return {"objects": {}, "refs": {}}
+
+    with open(index_filepath) as file:
+        return json.load(file)
+
+
+def write_cache_index(cache_dirpath: Path, index: Dict[str, Any]):
+    """
+    This function writes the cache index atomically, the index is written to a temporary
+    file which then replaces the index file.
+    """
+
+    with tempfile.NamedTemporaryFile(
+        mode="w", dir=cache_dirpath, suffix=".tmp", delete=False
+    ) as file:
+        json.dump(index, file, indent=4)
+    os.replace(file.name, cache_dirpath / INDEX_FILENAME)
+
+
+def evict_cache_objects(
+    cache_dirpath: Path,
+    index: Dict[str, Any],
+    max_cache_bytes: int,
+    keep_checksum: str,
+):
+    """
+    This function deletes the least recently used objects until the cache size is under
+    the limit, the object with the keep_checksum is never deleted.
+    """
+
+    objects = index["objects"]
+    cache_size = sum(obj["size"] for obj in objects.values())
+
+    for checksum in sorted(objects, key=lambda key: objects[key]["last_access"]):
+        if cache_size <= max_cache_bytes:
+            break
+        if checksum == keep_checksum:
+            continue
+
+        shutil.rmtree(cache_dirpath / "objects" / checksum, ignore_errors=True)
+        cache_size -= objects.pop(checksum)["size"]
+        index["refs"] = {
+            key: ref
+            for key, ref in index["refs"].items()
+            if ref["checksum"] != checksum
+        }
+        logger.info(f'Model object "{checksum}" is evicted from the model cache.')
+
+
+def get_cache_object(cache_dirpath: Path, checksum: Optional[str]) -> Optional[Path]:
+    """
+    This function returns the cached object directory with the checksum after verifying
+    its files, a corrupted object is deleted and None is returned if there is no valid
+    cached object.
+    """
+
+    if checksum is None:
+        return None
+
+    object_dirpath = cache_dirpath / "objects" / checksum
+    if not object_dirpath.exists():
+        return None
+
+    if compute_model_dir_checksum(object_dirpath) != checksum:
+        logger.info(
+            f'Model object "{checksum}" is corrupted and deleted from the cache.'
+        )
+        shutil.rmtree(object_dirpath, ignore_errors=True)
+        return None
+
+    return object_dirpath
+
+
+def download_cache_object(
+    cache_dirpath: Path, model_instance, checksum: Optional[str] = None
+) -> Path:
+    """
+    This function downloads the model files from the model registry, verifies them with
+    the registry checksum and moves them into the cache directory named by the checksum
+    of the downloaded files.
+    """
+
+    logger.info(
+        f'Downloading model "{model_instance.name}_{model_instance.version}" '
+        "from the model registry."
+    )
+    download_dirpath = Path(model_instance.download())
+    download_checksum = compute_model_dir_checksum(download_dirpath)
+
+    if checksum is not None and download_checksum != checksum:
+        shutil.rmtree(download_dirpath, ignore_errors=True)
+        raise Exception(
+            f'Downloaded model "{model_instance.name}_{model_instance.version}" does '
+            f'not match the registry checksum "{checksum}".'
+        )
+
+    object_dirpath = cache_dirpath / "objects" / download_checksum
+    if object_dirpath.exists():
+        shutil.rmtree(download_dirpath, ignore_errors=True)
+    else:
+        object_dirpath.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(download_dirpath, object_dirpath)
+
+    return object_dirpath
+
+
+def get_cached_model_path(
+    project,
+    model_name: str = "forecast_model",
+    model_version: int = 1,
+    cache_dirpath: Path = CACHE_DIRPATH,
+    max_cache_bytes: int = MAX_CACHE_BYTES,
+    revalidate_after: int = REVALIDATE_AFTER,
+    bucket=None,
+) -> Path:
+    """
+    This function returns the local directory of the model files from a content
+    addressed cache, where every model is stored by its checksum. A model reference
+    (name and version) that was validated within "revalidate_after" seconds is used
+    without any request. Otherwise the checksum is revalidated with the pointer blob
+    of the model in the bucket, a metadata-only request while the model is unchanged,
+    or with the model registry if the model has no pointer blob. The model is only
+    downloaded if no cached object has the same checksum, a model without any
+    published checksum is always downloaded when it is revalidated.
+
+    The cached files are verified with the checksum before use, the least recently used
+    models are evicted to keep the cache under "max_cache_bytes" and all the cache
+    updates happen under a file lock, so that many processes can share the cache. A
+    download only holds a file lock of the model reference, so it does not block the
+    loads of the other models.
+
+    Parameters
+    ----------
+    project
+        A project object generated by hopsworks when login into a specific project,
+        it is only used when the model needs to be revalidated or downloaded.
+
+    model_name: str, default="forecast_model"
+        Model name used when saving the model in hopsworks.
+
+    model_version: int, default=1
+        Model version used when saving the model in hopsworks.
+
+    cache_dirpath: Path, default=CACHE_DIRPATH
+        The directory of the model cache, by default it takes the value from the env
+        variable with key "MODEL_CACHE_DIR_PATH".
+
+    max_cache_bytes: int, default=MAX_CACHE_BYTES
+        The maximum size of the cache in bytes, by default it takes the value from the
+        env variable with key "MODEL_CACHE_MAX_BYTES".
+
+    revalidate_after: int, default=REVALIDATE_AFTER
+        Number of seconds after which a model reference is revalidated with the model
+        registry, by default it takes the value from the env variable with key
+        "MODEL_CACHE_REVALIDATE_AFTER". With 0 the reference is revalidated on every
+        load.
+
+    bucket: storage.Bucket or None, default=None
+        The bucket containing the model pointer blobs published by the training
+        pipeline, without a bucket the references are revalidated with the model
+        registry.
+
+    Returns
+    -------
+    Path
+        The local directory containing the model files.
+    """
+
+    cache_dirpath = Path(cache_dirpath)
+    ref_key = f"{model_name}_{model_version}"
+    requested_at = time.time()
+
+    # Reading the reference only holds the cache lock, the registry request and the
+    # verification of the files happen outside of it
+    with cache_lock(cache_dirpath):
+        ref = read_cache_index(cache_dirpath)["refs"].get(ref_key)
+
+    # Using a recently validated reference without any request, otherwise revalidating
+    # it with the pointer blob and only requesting the registry without a pointer
+    model_instance, checksum, pointer_generation = None, None, None
+    if ref is not None and requested_at - ref["validated_at"] < revalidate_after:
+        checksum, validated_at = ref["checksum"], ref["validated_at"]
+        pointer_generation = ref.get("pointer_generation")
+    else:
+        validated_at = requested_at
+        if bucket is not None:
+            checksum, pointer_generation = read_model_pointer(
+                bucket=bucket,
+                model_name=model_name,
+                model_version=model_version,
+                ref=ref,
+            )
+        if checksum is None:
+            model_instance = project.get_model_registry().get_model(
+                name=model_name, version=model_version
+            )
+            checksum = get_model_checksum(model_instance)
+
+    # The verification and download only hold the lock of the model reference, so the
+    # loads of the other models are not blocked, and a concurrent load of the same
+    # model waits and reuses the reference validated meanwhile
+    with cache_lock(cache_dirpath, lock_filename=f"locks/{ref_key}.lock"):
+        if checksum is None:
+            with cache_lock(cache_dirpath):
+                ref = read_cache_index(cache_dirpath)["refs"].get(ref_key)
+            if ref is not None and ref["validated_at"] >= requested_at:
+                checksum, validated_at = ref["checksum"], ref["validated_at"]
+                pointer_generation = ref.get("pointer_generation")
+
+        object_dirpath = get_cache_object(
+            cache_dirpath=cache_dirpath, checksum=checksum
+        )
+        if object_dirpath is None:
+            if model_instance is None:
+                model_instance = project.get_model_registry().get_model(
+                    name=model_name, version=model_version
+                )
+            object_dirpath = download_cache_object(
+                cache_dirpath=cache_dirpath,
+                model_instance=model_instance,
+                checksum=checksum,
+            )
+            checksum, validated_at = object_dirpath.name, time.time()
+        else:
+            logger.info(f'Model "{ref_key}" is loaded from the model cache.')
+
+        # Updating the reference and access time, and evicting the least recent
+        # objects, the objects deleted as corrupted are removed from the index
+        with cache_lock(cache_dirpath):
+            index = read_cache_index(cache_dirpath)
+            index["objects"] = {
+                key: obj
+                for key, obj in index["objects"].items()
+                if (cache_dirpath / "objects" / key).exists()
+            }
+            index["refs"][ref_key] = {
+                "checksum": checksum,
+                "validated_at": validated_at,
+                "pointer_generation": pointer_generation,
+            }
+            index["objects"][checksum] = {
+                "size": get_dir_size(object_dirpath),
+                "last_access": time.time(),
+            }
+            evict_cache_objects(
+                cache_dirpath=cache_dirpath,
+                index=index,
+                max_cache_bytes=max_cache_bytes,
+                keep_checksum=checksum,
+            )
+            write_cache_index(cache_dirpath, index)
+
+    return object_dirpath
@@ -1,24 +1,34 @@
 import argparse
 from pathlib import Path
+from typing import Optional
 
-import numpy as np
 import pandas as pd
+from google.cloud import storage
 from pydantic import validate_call
-from sktime.performance_metrics.forecasting import (
-    mean_absolute_percentage_error,
-    mean_squared_percentage_error,
-)
 
+from energy_consumption_forecasting.drift_monitor import (
+    update_drift_sketches_in_bucket,
+)
 from energy_consumption_forecasting.exceptions import log_exception
 from energy_consumption_forecasting.inference_pipeline.batch_data import (
     get_batch_data_from_hopsworks,
 )
+from energy_consumption_forecasting.inference_pipeline.error_cube import (
+    ERROR_CUBE_BLOB_NAME,
+    build_error_cube,
+    merge_error_cubes,
+)
+from energy_consumption_forecasting.inference_pipeline.forecast_store import (
+    read_forecast_vintages,
+    read_latest_forecast,
+)
 from energy_consumption_forecasting.inference_pipeline.utils import (
     get_gcs_bucket,
     read_blob_from_bucket,
     write_blob_to_bucket,
 )
 from energy_consumption_forecasting.logger import get_logger
+from energy_consumption_forecasting.metrics import compute_segment_metrics
 from energy_consumption_forecasting.utils import get_env_var
 
 logger = get_logger(name=Path(__file__).name)
@@ -26,21 +36,121 @@ logger = get_logger(name=Path(__file__).name)
 import hopsworks
 
 
+METRICS_BLOB_NAME = "performance_metrics.parquet"
+GROUND_TRUTH_BLOB_NAME = "ground_truth.parquet"
+CACHED_PREDICTION_BLOB_NAME = "cached_prediction.parquet"
+
+
+def get_scoring_watermark(metrics: Optional[pd.DataFrame]) -> Optional[pd.Period]:
+    """
+    This function returns the watermark of the monitoring, i.e. the last hour scored
+    in the performance metrics, None if no hour was scored yet.
+    """
+
+    if metrics is None or len(metrics) == 0:
+        return None
+
+    return metrics.index.max()
+
+
+def update_cached_prediction(
+    bucket: storage.Bucket,
+    vintages: Optional[pd.DataFrame],
+    watermark: Optional[pd.Period] = None,
+) -> Optional[pd.DataFrame]:
+    """
+    This function returns the latest forecast of every hour in the forecast store.
+    With a watermark, only the vintages that can forecast an hour after the watermark
+    are needed and the hours up to the watermark are kept from the previous cached
+    prediction, as no new vintage forecasts a scored hour.
+
+    Parameters
+    ----------
+    bucket: storage.Bucket
+        A bucket object that is generated by GCS, can be used for uploading and
+        downloading data.
+
+    vintages: pd.DataFrame or None
+        The forecast vintages generated by "read_forecast_vintages", all the vintages
+        without a watermark or the vintages issued from fh hours before the watermark.
+
+    watermark: pd.Period or None, default=None
+        The last scored hour generated by "get_scoring_watermark".
+
+    Returns
+    -------
+    pd.DataFrame or None
+        A dataframe indexed by municipality_num, branch and datetime_dk containing the
+        latest forecast, or None if the forecast store is empty.
+    """
+
+    if watermark is None:
+        return read_latest_forecast(bucket=bucket, vintages=vintages)
+
+    previous_prediction = read_blob_from_bucket(
+        bucket=bucket, blob_name=CACHED_PREDICTION_BLOB_NAME
+    )
+    if previous_prediction is None:
+        return read_latest_forecast(bucket=bucket)
+    if vintages is None:
+        return previous_prediction
+
+    latest_forecast = read_latest_forecast(bucket=bucket, vintages=vintages)
+    is_scored = previous_prediction.index.get_level_values("datetime_dk") <= watermark
+    is_new = latest_forecast.index.get_level_values("datetime_dk") > watermark
+
+    return pd.concat(
+        [previous_prediction[is_scored], latest_forecast[is_new]]
+    ).sort_index()
+
+
+def append_performance_metrics(
+    metrics: Optional[pd.DataFrame], new_metrics: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    This function appends the metrics of the newly scored hours to the performance
+    metrics, a rescored hour replaces the previous metrics of the hour.
+    """
+
+    if metrics is None:
+        return new_metrics
+
+    metrics = pd.concat([metrics, new_metrics])
+
+    return metrics[~metrics.index.duplicated(keep="last")].sort_index()
+
+
 @log_exception(logger=logger)
 @validate_call
 def compute_performance_metrics(
     feature_view_ver: int = 1,
     feature_view_name: str = "denmark_energy_consumption_view",
     target_feature: str = "consumption_kwh",
+    incremental: bool = True,
+    fh: int = 24,
+    rescore_hours: int = 48,
 ) -> None:
     """
-    This function computes performance metrics like MAPE and RMSPE using the
-    predicted dataset and ground truth dataset, the metric result will be based on the
-    datetime feature.
-
-    Prediction dataset is downloaded from GCS bucket named cached_prediction, this is
-    generated during the inference pipeline and ground truth is download from
-    hopsworks feature store.
+    This function computes performance metrics like MAPE, RMSPE, MAE, RMSE and bias
+    using the predicted dataset and ground truth dataset, the metric result will be
+    based on the datetime feature.
+
+    Prediction dataset is the latest forecast of every hour in the forecast store of
+    the GCS bucket, this is generated during the inference pipeline and ground truth is
+    download from hopsworks feature store. The latest forecast is also saved as
+    "cached_prediction.parquet" for the application.
+
+    The error sums of every series, day and lead time are kept in the error cube
+    "error_cube.parquet", which can be rolled up with "query_error_cube".
+
+    In the incremental mode, the last hour of the performance metrics is a watermark:
+    the ground truth is only downloaded for the hours after the watermark and the
+    rescore_hours hours before it (from the first hour of their day), and only those
+    hours are scored. The rescored hours
+    replace their previous metrics and ground truth, and the error cube cells of the
+    days touching them are recomputed, so a ground truth that arrives late is scored by
+    a later run. So the cost of a run is proportional to the new data instead of the
+    whole prediction span.
 
     Parameters
     ----------
@@ -52,15 +162,48 @@ def compute_performance_metrics(
 
     target_feature: str, default="consumption_kwh"
         The name of the target feature in the dataset.
+
+    incremental: bool, default=True
+        Whether to only score the hours after the watermark, otherwise all the hours of
+        the cached prediction are scored again.
+
+    fh: int, default=24
+        The forecasting horizon of the inference pipeline in hours, it is used to
+        select the forecast vintages after the watermark.
+
+    rescore_hours: int, default=48
+        Number of hours before the watermark that are scored again in the incremental
+        mode, the ground truth arriving later than that is never scored.
     """
 
     # Getting the bucket object from GCS and reading the cached prediction data
-    logger.info("Connecting to the GCS bucket and reading the cached prediction data.")
+    logger.info("Connecting to the GCS bucket and reading the forecast store data.")
     bucket = get_gcs_bucket()
     logger.info("Connection to the GCS bucket is established.")
-    cached_prediction = read_blob_from_bucket(
+
+    previous_metrics, watermark = None, None
+    if incremental:
+        previous_metrics = read_blob_from_bucket(
+            bucket=bucket, blob_name=METRICS_BLOB_NAME
+        )
+        watermark = get_scoring_watermark(previous_metrics)
+        logger.info(f'Monitoring watermark, the last scored hour: "{watermark}".')
+
+    # The hours after the rescore start are scored, the hours of the lookback window
+    # are scored again for the late ground truth. The error cube cells of the days
+    # touching the rescored hours are recomputed from the first hour of the day.
+    rescore_start, cube_start = None, None
+    if watermark is not None:
+        rescore_start = watermark - rescore_hours
+        cube_start = rescore_start.asfreq("D").asfreq("H", how="start")
+
+    # A vintage issued at an hour only forecasts the next fh hours
+    vintages = read_forecast_vintages(
         bucket=bucket,
-        blob_name="cached_prediction.parquet",
+        start_issue_datetime=None if cube_start is None else cube_start - fh,
+    )
+    cached_prediction = update_cached_prediction(
+        bucket=bucket, vintages=vintages, watermark=rescore_start
     )
 
     if cached_prediction is None or len(cached_prediction) == 0:
@@ -71,9 +214,22 @@ def compute_performance_metrics(
         return None
 
     logger.info("Successfully loaded cached prediction data.")
+    write_blob_to_bucket(
+        bucket=bucket, blob_name=CACHED_PREDICTION_BLOB_NAME, data=cached_prediction
+    )
+
+    # Selecting the prediction hours that are not yet scored or are rescored
+    unscored_prediction = cached_prediction
+    if rescore_start is not None:
+        unscored_prediction = cached_prediction[
+            cached_prediction.index.get_level_values("datetime_dk") > rescore_start
+        ]
+    if len(unscored_prediction) == 0:
+        logger.info("All the prediction hours are scored, exiting the process.")
+        return None
 
     # Connecting to hopsworks feature store and getting data with
-    # similar date range of the prediction
+    # similar date range of the unscored prediction
     project = hopsworks.login(
         project=get_env_var(key="FEATURE_STORE_PROJECT_NAME"),
         api_key_value=get_env_var(key="FEATURE_STORE_API_KEY"),
@@ -84,19 +240,25 @@ def compute_performance_metrics(
         f'Project URL: "{project.get_url()}"'
     )
 
-    pred_start_datetime = cached_prediction.index.get_level_values(
+    pred_start_datetime = unscored_prediction.index.get_level_values(
         level="datetime_dk"
     ).min()
-    pred_end_datetime = cached_prediction.index.get_level_values(
+    pred_end_datetime = unscored_prediction.index.get_level_values(
         level="datetime_dk"
     ).max()
+
+    # The ground truth of the recomputed days of the error cube is also downloaded
+    truth_start_datetime = pred_start_datetime
+    if cube_start is not None:
+        truth_start_datetime = min(cube_start, pred_start_datetime)
+
     logger.info(
         "Getting data from hopsworks feature store between "
-        f'"{pred_start_datetime}" and "{pred_end_datetime}".'
+        f'"{truth_start_datetime}" and "{pred_end_datetime}".'
     )
     _, ground_truth = get_batch_data_from_hopsworks(
         feature_store=feature_store,
-        start_datetime=pred_start_datetime.to_timestamp(),
+        start_datetime=truth_start_datetime.to_timestamp(),
         # Adding 1 hour for less then condition in end_datetime
         end_datetime=(pred_end_datetime + 1).to_timestamp(),
         feature_view_ver=feature_view_ver,
@@ -124,74 +286,106 @@ def compute_performance_metrics(
 
     logger.info("Successfully loaded ground truth data.")
 
-    # Merging both the dataframe for computing
+    # Aligning the prediction and ground truth with an index join and computing the
+    # metrics of every hour in a single pass
     logger.info("Computing performance metrics.")
-    cached_prediction = cached_prediction.rename(
-        columns={"consumption_kwh": "consumption_kwh_pred"}
-    )
-    ground_truth = ground_truth.rename(
-        columns={"consumption_kwh": "consumption_kwh_gt"}
+    metric_result = compute_segment_metrics(
+        y_true=ground_truth,
+        y_pred=unscored_prediction,
+        segment_levels=["datetime_dk"],
+        target_feature=target_feature,
     )
-    cached_prediction["consumption_kwh_gt"] = np.nan
-    cached_prediction.update(ground_truth)
-
-    # Computing MAPE and RMSPE performance metric between prediction and ground truth
-    cached_prediction = cached_prediction.dropna(subset=["consumption_kwh_gt"])
-    if len(cached_prediction) == 0:
+    if len(metric_result) == 0:
         logger.info(
             "Ground truth data does not exist or data is missing, "
             "exiting the process."
         )
         return None
 
-    mape = (
-        cached_prediction.groupby("datetime_dk")
-        .apply(
-            lambda data: mean_absolute_percentage_error(
-                y_true=data["consumption_kwh_gt"],
-                y_pred=data["consumption_kwh_pred"],
-                symmetric=False,
-            )
-        )
-        .rename("mape")
-        .to_frame()
+    logger.info(
+        f"Performance metrics of MAPE, RMSPE, MAE, RMSE and bias computed for "
+        f"{len(metric_result)} hours."
     )
 
-    rmspe = (
-        cached_prediction.groupby("datetime_dk")
-        .apply(
-            lambda data: mean_squared_percentage_error(
-                y_true=data["consumption_kwh_gt"],
-                y_pred=data["consumption_kwh_pred"],
-                square_root=True,
+    # Forecast residuals of the newly scored hours for the drift sketches
+    residuals = (
+        unscored_prediction[target_feature].sub(ground_truth[target_feature]).dropna()
+    )
+
+    # Building the error cube of every series, day and lead time of the scored days,
+    # from all the vintages forecasting them, the error cube is not updated when no
+    # vintage can forecast those hours
+    error_cube = None
+    if vintages is not None and cube_start is not None:
+        vintages = vintages[
+            vintages.index.get_level_values("datetime_dk") >= cube_start
+        ]
+    if vintages is not None:
+        error_cube = build_error_cube(
+            vintages=vintages, ground_truth=ground_truth, target_feature=target_feature
+        )
+    else:
+        logger.info("No forecast vintage of the scored hours, the error cube is kept.")
+
+    # Appending the metrics, error cube and ground truth of the newly scored hours,
+    # the rescored hours replace their previous metrics, error cube days and ground
+    # truth
+    metric_result = append_performance_metrics(
+        metrics=previous_metrics, new_metrics=metric_result
+    )
+    if cube_start is not None:
+        if error_cube is not None:
+            error_cube = merge_error_cubes(
+                cube=read_blob_from_bucket(
+                    bucket=bucket, blob_name=ERROR_CUBE_BLOB_NAME
+                ),
+                new_cube=error_cube,
+                start_day=cube_start.asfreq("D"),
             )
+
+        previous_ground_truth = read_blob_from_bucket(
+            bucket=bucket, blob_name=GROUND_TRUTH_BLOB_NAME
         )
-        .rename("rmspe")
-        .to_frame()
+        if previous_ground_truth is not None:
+            ground_truth = pd.concat(
+                [
+                    previous_ground_truth[
+                        previous_ground_truth.index.get_level_values("datetime_dk")
+                        < truth_start_datetime
+                    ],
+                    ground_truth,
+                ]
+            ).sort_index()
+
+    # The blobs are written one by one, the metrics holding the watermark are written
+    # last so a failed run is scored again by the next run, and the error cube days
+    # and ground truth of the scored hours are replaced instead of added
+    logger.info("Saving ground truth dataframe in GCS bucket.")
+    write_blob_to_bucket(
+        bucket=bucket, blob_name=GROUND_TRUTH_BLOB_NAME, data=ground_truth
     )
+    logger.info('Ground truth file "ground_truth.parquet" saved in GCS bucket.')
 
-    metric_result = pd.merge(left=mape, right=rmspe, on="datetime_dk")
-    logger.info("Performance metrics of MAPE and RMSPE successfully computed.")
+    # Saving the error cube dataframe in the GCS bucket as a parquet file
+    if error_cube is not None:
+        logger.info("Saving error cube dataframe in GCS bucket.")
+        write_blob_to_bucket(
+            bucket=bucket, blob_name=ERROR_CUBE_BLOB_NAME, data=error_cube
+        )
+        logger.info(f'Error cube file "{ERROR_CUBE_BLOB_NAME}" saved in GCS bucket.')
+
+    # Updating the drift sketches of the forecast residuals in the GCS bucket
+    update_drift_sketches_in_bucket(
+        bucket=bucket, values=residuals, quantity="residual"
+    )
 
     # Saving the metrics dataframe in the GCS bucket as a parquet file
     logger.info("Saving performance metrics dataframe in GCS bucket.")
-    write_blob_to_bucket(
-        bucket=bucket, blob_name="performance_metrics.parquet", data=metric_result
-    )
+    write_blob_to_bucket(bucket=bucket, blob_name=METRICS_BLOB_NAME, data=metric_result)
     logger.info(
         'Performance metrics file "performance_metrics.parquet" saved in GCS bucket.'
     )
 
-    # Saving the ground truth dataframe in the GCS bucket as a parquet file
-    logger.info("Saving ground truth dataframe in GCS bucket.")
-    ground_truth = ground_truth.rename(
-        columns={"consumption_kwh_gt": "consumption_kwh"}
-    )
-    write_blob_to_bucket(
-        bucket=bucket, blob_name="ground_truth.parquet", data=ground_truth
-    )
-    logger.info('Ground truth file "ground_truth.parquet" saved in GCS bucket.')
-
 
 if __name__ == "__main__":
 
@@ -219,10 +413,36 @@ if __name__ == "__main__":
         help="Name of target feature, needs to be in string format.",
     )
 
+    parser.add_argument(
+        "--fh",
+        type=int,
+        default=24,
+        help="Forecasting horizon of the inference pipeline in hours, "
+        "needs to be in integer format.",
+    )
+
+    parser.add_argument(
+        "--no_incremental",
+        action="store_true",
+        help="Score all the hours of the cached prediction instead of only the hours "
+        "after the last scored hour.",
+    )
+
+    parser.add_argument(
+        "--rescore_hours",
+        type=int,
+        default=48,
+        help="Number of hours before the last scored hour that are scored again for "
+        "the late ground truth, needs to be in integer format.",
+    )
+
     args = parser.parse_args()
 
     compute_performance_metrics(
         feature_view_ver=args.views_ver,
         feature_view_name=args.views_name,
         target_feature=args.target_feature,
+        incremental=not args.no_incremental,
+        fh=args.fh,
+        rescore_hours=args.rescore_hours,
     )
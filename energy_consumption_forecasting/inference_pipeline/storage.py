@@ -0,0 +1,159 @@
+import io
+import os
+import uuid
+from typing import BinaryIO, List, Optional
+
+import fsspec
+from fsspec.implementations.local import LocalFileSystem
+from fsspec.utils import tokenize
+
+# This module only depends on fsspec, it is shared with the API (app/backend) which
+# reads the blobs written by the pipelines
+
+
+def get_generation(info: dict) -> int:
+    """
+    This function returns the generation number of an object from its fsspec info, the
+    generation changes every time the object is written. GCS provides the generation
+    number, for the other filesystems it is derived from the object metadata.
+    """
+
+    if info.get("generation") is not None:
+        return int(info["generation"])
+
+    return int(tokenize(info)[:15], 16)
+
+
+class AtomicLocalFile(io.FileIO):
+    """
+    This class writes a local file in a temporary file next to it, the temporary file
+    replaces the file when it is closed. A reader never sees a partially written file,
+    the same as a finalized GCS object.
+    """
+
+    def __init__(self, path: str):
+        self.target_path = path
+        self.temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        super().__init__(self.temp_path, mode="wb")
+
+    def close(self):
+        if not self.closed:
+            super().close()
+            os.replace(self.temp_path, self.target_path)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # A failed write leaves the previous file untouched
+        if exc_type is not None and not self.closed:
+            super().close()
+            os.remove(self.temp_path)
+        else:
+            self.close()
+
+
+class FsspecBlob:
+    """
+    This class is an object of a "FsspecBucket", it provides the methods of the GCS
+    "storage.Blob" that are used by the pipelines. The "generation" and "size" are
+    None until the blob is reloaded.
+    """
+
+    def __init__(self, bucket: "FsspecBucket", name: str):
+        self.bucket = bucket
+        self.name = name
+        self.generation = None
+        self.size = None
+
+    @property
+    def path(self) -> str:
+        return f"{self.bucket.root}/{self.name}"
+
+    def exists(self) -> bool:
+        return self.bucket.fs.exists(self.path)
+
+    def reload(self):
+        info = self.bucket.fs.info(self.path)
+        self.size = info["size"]
+        self.generation = get_generation(info)
+
+    def open(self, mode: str = "rb") -> BinaryIO:
+        if "w" not in mode:
+            return self.bucket.fs.open(self.path, mode=mode)
+
+        self.bucket.fs.makedirs(self.path.rsplit("/", 1)[0], exist_ok=True)
+        if isinstance(self.bucket.fs, LocalFileSystem):
+            return AtomicLocalFile(path=self.path)
+
+        return self.bucket.fs.open(self.path, mode=mode)
+
+    def upload_from_file(
+        self,
+        file_obj: BinaryIO,
+        size: Optional[int] = None,
+        content_type: Optional[str] = None,
+    ):
+        with self.open(mode="wb") as file:
+            file.write(file_obj.read(size) if size is not None else file_obj.read())
+
+    def download_as_bytes(
+        self, start: Optional[int] = None, end: Optional[int] = None
+    ) -> bytes:
+        # The end byte is included, the same as the GCS byte-range download
+        return self.bucket.fs.cat_file(
+            self.path, start=start, end=None if end is None else end + 1
+        )
+
+    def delete(self):
+        self.bucket.fs.rm_file(self.path)
+
+
+class FsspecBucket:
+    """
+    This class is a bucket stored in any fsspec filesystem, for eg. a local directory
+    or the in-memory filesystem. It provides the methods of the GCS "storage.Bucket"
+    that are used by the pipelines, so the pipelines can run without cloud credentials.
+
+    Parameters
+    ----------
+    storage_url: str
+        The URL of the bucket, for eg. "file:///data/bucket" or "memory://bucket".
+
+    **storage_options
+        Options passed to the fsspec filesystem.
+    """
+
+    def __init__(self, storage_url: str, **storage_options):
+        self.fs, self.root = fsspec.core.url_to_fs(storage_url, **storage_options)
+        self.root = self.root.rstrip("/")
+        self.name = storage_url
+
+    def blob(self, blob_name: str, chunk_size: Optional[int] = None) -> FsspecBlob:
+        return FsspecBlob(bucket=self, name=blob_name)
+
+    def get_blob(self, blob_name: str) -> Optional[FsspecBlob]:
+        """
+        This method returns the blob with its generation and size, None is returned
+        if the blob does not exists.
+        """
+
+        blob = self.blob(blob_name=blob_name)
+        try:
+            blob.reload()
+        except FileNotFoundError:
+            return None
+
+        return blob
+
+    def list_blobs(self, prefix: Optional[str] = None) -> List[FsspecBlob]:
+        # Only the directory of the prefix is searched
+        prefix = prefix or ""
+        search_path = "/".join([self.root, *prefix.split("/")[:-1]])
+        if not self.fs.exists(search_path):
+            return []
+
+        blob_names = [path[len(self.root) + 1 :] for path in self.fs.find(search_path)]
+
+        return [
+            self.blob(blob_name=blob_name)
+            for blob_name in sorted(blob_names)
+            if blob_name.startswith(prefix) and not blob_name.endswith(".tmp")
+        ]
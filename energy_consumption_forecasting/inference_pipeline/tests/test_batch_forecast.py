@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from energy_consumption_forecasting.inference_pipeline.inference_pipeline import (
+    get_batch_forecast,
+    get_change_driven_forecast,
+    get_sharded_batch_forecast,
+)
+from energy_consumption_forecasting.model_artifact import (
+    load_model_artifact,
+    save_model_artifact,
+)
+from energy_consumption_forecasting.training_pipeline.model_builder import (
+    build_lightgbm_model,
+)
+
+
+# Creating a dummy hierarchical batch dataset and a fitted LightGBM forecasting pipeline
+@pytest.fixture
+def get_dataset():
+    datetime_range = pd.period_range("2024-01-01 00:00", periods=24 * 8, freq="H")
+    index = pd.MultiIndex.from_product(
+        [[101, 147, 151], [1, 2], datetime_range],
+        names=["municipality_num", "branch", "datetime_dk"],
+    )
+    rng = np.random.default_rng(seed=42)
+    hours = index.get_level_values("datetime_dk").hour.to_numpy()
+    consumption = (
+        100 + 20 * np.sin(2 * np.pi * hours / 24) + rng.normal(size=len(hours))
+    )
+    y = pd.DataFrame({"consumption_kwh": consumption}, index=index)
+    X = pd.DataFrame(index=index)
+
+    model = build_lightgbm_model(
+        summarize_period=[24, 48, 72],
+        model_params={"n_estimators": 20, "n_jobs": 1, "verbose": -1},
+    )
+    model.fit(y=y, X=X)
+    return model, X, y
+
+
+def test_native_batch_forecast(get_dataset, tmp_path):
+    """
+    In this test the batch forecast of the native forecaster, using the last window of
+    the batch data, is identical to the batch forecast of the sktime pipeline.
+    """
+
+    model, X, y = get_dataset
+    save_model_artifact(model=model, artifact_dirpath=tmp_path)
+    forecaster = load_model_artifact(artifact_dirpath=tmp_path)
+
+    pd.testing.assert_frame_equal(
+        get_batch_forecast(model=forecaster, X=X, fh=24, y=y),
+        get_batch_forecast(model=model, X=X, fh=24),
+    )
+
+
+def test_sharded_batch_forecast(get_dataset, tmp_path):
+    """
+    In this test the batch forecast sharded by municipality over worker processes is
+    identical to the batch forecast of all the series in a single process.
+    """
+
+    model, X, y = get_dataset
+    save_model_artifact(model=model, artifact_dirpath=tmp_path)
+    forecaster = load_model_artifact(artifact_dirpath=tmp_path)
+
+    pd.testing.assert_frame_equal(
+        get_sharded_batch_forecast(model=forecaster, X=X, y=y, fh=24, n_jobs=2),
+        get_batch_forecast(model=forecaster, X=X, fh=24, y=y),
+    )
+
+
+def test_change_driven_forecast(get_dataset, tmp_path):
+    """
+    In this test only the series that received new data are forecasted again, and
+    the forecast of the other series is carried forward from the previous vintage.
+    """
+
+    model, X, y = get_dataset
+    save_model_artifact(model=model, artifact_dirpath=tmp_path)
+    forecaster = load_model_artifact(artifact_dirpath=tmp_path)
+
+    previous_prediction, previous_manifest = get_change_driven_forecast(
+        model=forecaster, X=X, y=y, fh=24, n_jobs=1
+    )
+    pd.testing.assert_frame_equal(
+        previous_prediction, get_batch_forecast(model=forecaster, X=X, fh=24, y=y)
+    )
+
+    # The manifest is read back from a parquet file like from the GCS bucket
+    previous_manifest.to_parquet(tmp_path / "manifest.parquet")
+    previous_manifest = pd.read_parquet(tmp_path / "manifest.parquet")
+
+    # Adding a day of new data only for the first series
+    new_datetime = pd.period_range(
+        start=y.index.get_level_values("datetime_dk").max() + 1, periods=24, freq="H"
+    )
+    new_index = pd.MultiIndex.from_product(
+        [[101], [1], new_datetime], names=y.index.names
+    )
+    y_new = pd.concat(
+        [y, pd.DataFrame({"consumption_kwh": 100.0}, index=new_index)]
+    ).sort_index()
+    X_new = pd.DataFrame(index=y_new.index)
+
+    prediction, manifest = get_change_driven_forecast(
+        model=forecaster,
+        X=X_new,
+        y=y_new,
+        fh=24,
+        previous_manifest=previous_manifest,
+        previous_prediction=previous_prediction,
+        n_jobs=1,
+    )
+
+    is_changed = prediction.index.droplevel(level=2).isin([(101, 1)])
+    is_previous = previous_prediction.index.droplevel(level=2).isin([(101, 1)])
+    pd.testing.assert_frame_equal(
+        prediction[~is_changed], previous_prediction[~is_previous]
+    )
+    pd.testing.assert_frame_equal(
+        prediction[is_changed],
+        forecaster.predict(
+            fh=24, y=y_new[y_new.index.droplevel(level=2).isin([(101, 1)])]
+        ),
+    )
+    assert (manifest["last_datetime"] > previous_manifest["last_datetime"]).sum() == 1
@@ -0,0 +1,152 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from energy_consumption_forecasting.inference_pipeline import blob_cache
+from energy_consumption_forecasting.inference_pipeline.blob_cache import (
+    get_blob_cache_stats,
+    get_cached_blob_path,
+)
+from energy_consumption_forecasting.inference_pipeline.model_cache import (
+    read_cache_index,
+)
+from energy_consumption_forecasting.inference_pipeline.utils import (
+    get_gcs_bucket,
+    read_blob_from_bucket,
+    write_blob_to_bucket,
+)
+
+
+@pytest.fixture
+def get_bucket(tmp_path):
+    return get_gcs_bucket(storage_url=f"file://{tmp_path}/bucket")
+
+
+@pytest.fixture
+def get_data():
+    index = pd.MultiIndex.from_product(
+        [
+            [101, 147],
+            [1, 2],
+            pd.period_range(start="2024-01-01 00:00", periods=24, freq="H"),
+        ],
+        names=["municipality_num", "branch", "datetime_dk"],
+    )
+    return pd.DataFrame({"consumption_kwh": np.arange(len(index), dtype=float)}, index)
+
+
+def test_blob_cache_hit(get_bucket, get_data, tmp_path):
+    """
+    In this test a repeated read of a blob is served from the cache, and a rewritten
+    blob is downloaded again because its generation changed.
+    """
+
+    cache_dirpath = tmp_path / "cache"
+    assert (
+        read_blob_from_bucket(
+            bucket=get_bucket, blob_name="target.parquet", cache_dirpath=cache_dirpath
+        )
+        is None
+    )
+
+    write_blob_to_bucket(bucket=get_bucket, blob_name="target.parquet", data=get_data)
+    for _ in range(2):
+        data = read_blob_from_bucket(
+            bucket=get_bucket, blob_name="target.parquet", cache_dirpath=cache_dirpath
+        )
+        pd.testing.assert_frame_equal(data, get_data)
+    assert get_blob_cache_stats(cache_dirpath) == {
+        "hits": 1,
+        "misses": 1,
+        "evictions": 0,
+    }
+
+    write_blob_to_bucket(
+        bucket=get_bucket, blob_name="target.parquet", data=get_data.iloc[:10]
+    )
+    data = read_blob_from_bucket(
+        bucket=get_bucket, blob_name="target.parquet", cache_dirpath=cache_dirpath
+    )
+    pd.testing.assert_frame_equal(data, get_data.iloc[:10])
+    assert get_blob_cache_stats(cache_dirpath)["misses"] == 2
+
+    # Only the latest generation of the blob is kept in the cache
+    assert len(list((cache_dirpath / "objects").iterdir())) == 1
+
+
+def test_blob_cache_eviction(get_bucket, get_data, tmp_path):
+    """
+    In this test the least recently used blob is evicted when the cache is larger
+    than the limit.
+    """
+
+    cache_dirpath = tmp_path / "cache"
+    for blob_name in ["target.parquet", "prediction.parquet"]:
+        write_blob_to_bucket(bucket=get_bucket, blob_name=blob_name, data=get_data)
+
+    first_path = get_cached_blob_path(
+        bucket=get_bucket, blob_name="target.parquet", cache_dirpath=cache_dirpath
+    )
+    second_path = get_cached_blob_path(
+        bucket=get_bucket,
+        blob_name="prediction.parquet",
+        cache_dirpath=cache_dirpath,
+        max_cache_bytes=first_path.stat().st_size,
+    )
+
+    index = read_cache_index(cache_dirpath)
+    assert not first_path.exists() and second_path.exists()
+    assert [obj["blob_name"] for obj in index["objects"].values()] == [
+        "prediction.parquet"
+    ]
+    assert get_blob_cache_stats(cache_dirpath)["evictions"] == 1
+
+
+def test_blob_cache_download_lock(get_bucket, get_data, tmp_path, monkeypatch):
+    """
+    In this test a slow download of a blob does not block the read of another blob,
+    and the concurrent reads of the same blob share a single download.
+    """
+
+    cache_dirpath = tmp_path / "cache"
+    for blob_name in ["target.parquet", "prediction.parquet"]:
+        write_blob_to_bucket(bucket=get_bucket, blob_name=blob_name, data=get_data)
+
+    is_released = threading.Event()
+    download_cached_blob = blob_cache.download_cached_blob
+
+    def slow_download_cached_blob(blob_obj, **kwargs):
+        if blob_obj.name == "target.parquet":
+            assert is_released.wait(timeout=10)
+        return download_cached_blob(blob_obj=blob_obj, **kwargs)
+
+    monkeypatch.setattr(blob_cache, "download_cached_blob", slow_download_cached_blob)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [
+            executor.submit(
+                get_cached_blob_path,
+                bucket=get_bucket,
+                blob_name="target.parquet",
+                cache_dirpath=cache_dirpath,
+            )
+            for _ in range(2)
+        ]
+        assert get_cached_blob_path(
+            bucket=get_bucket,
+            blob_name="prediction.parquet",
+            cache_dirpath=cache_dirpath,
+        ).exists()
+        assert not any(future.done() for future in futures)
+
+        is_released.set()
+        assert futures[0].result() == futures[1].result()
+
+    assert get_blob_cache_stats(cache_dirpath) == {
+        "hits": 1,
+        "misses": 2,
+        "evictions": 0,
+    }
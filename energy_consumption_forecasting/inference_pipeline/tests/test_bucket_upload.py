@@ -0,0 +1,81 @@
+import io
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from energy_consumption_forecasting.inference_pipeline.utils import (
+    read_series_parquet,
+    write_blobs_to_bucket,
+)
+
+
+# Creating a dummy GCS bucket that records the uploads and their threads
+class DummyBlob:
+    def __init__(self, bucket, name, chunk_size):
+        self.bucket = bucket
+        self.name = name
+        self.chunk_size = chunk_size
+
+    def upload_from_file(self, file_obj, size, content_type):
+        self.bucket.objects[self.name] = file_obj.read(size)
+        self.bucket.uploads[self.name] = (self.chunk_size, threading.get_ident())
+
+
+class DummyBucket:
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}
+
+    def blob(self, blob_name, chunk_size=None):
+        return DummyBlob(bucket=self, name=blob_name, chunk_size=chunk_size)
+
+
+@pytest.fixture
+def get_dataset():
+    index = pd.MultiIndex.from_product(
+        [
+            [101, 147],
+            [1, 2],
+            pd.period_range("2024-01-01 00:00", periods=24 * 30, freq="H"),
+        ],
+        names=["municipality_num", "branch", "datetime_dk"],
+    )
+    rng = np.random.default_rng(seed=42)
+    return pd.DataFrame({"consumption_kwh": rng.random(len(index))}, index=index)
+
+
+def test_write_blobs_to_bucket(get_dataset):
+    """
+    In this test the blobs are uploaded from the upload threads, only the blobs
+    larger than the chunk size use a chunked upload and every blob is readable.
+    """
+
+    bucket = DummyBucket()
+    write_blobs_to_bucket(
+        bucket=bucket,
+        blobs={
+            "small.parquet": get_dataset.head(10),
+            "target.parquet": get_dataset,
+            "target_by_series.parquet": get_dataset,
+        },
+        series_blob_names=["target_by_series.parquet"],
+        chunk_size=256 * 1024 // 16,
+    )
+
+    assert bucket.uploads["small.parquet"][0] is None
+    assert bucket.uploads["target.parquet"][0] == 256 * 1024 // 16
+    assert threading.get_ident() not in {
+        thread_id for _, thread_id in bucket.uploads.values()
+    }
+
+    pd.testing.assert_frame_equal(
+        pd.read_parquet(io.BytesIO(bucket.objects["target.parquet"])), get_dataset
+    )
+    series = read_series_parquet(
+        file=io.BytesIO(bucket.objects["target_by_series.parquet"]),
+        municipality_num=147,
+        branch=1,
+    )
+    assert len(series) == 24 * 30
@@ -0,0 +1,174 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from energy_consumption_forecasting.drift_monitor import (
+    BIN_COLUMNS,
+    DRIFT_SKETCH_BLOB_NAME,
+    build_drift_sketches,
+    compute_drift_scores,
+    get_drift_summary,
+    update_drift_sketches,
+    update_drift_sketches_in_bucket,
+)
+from energy_consumption_forecasting.inference_pipeline.utils import (
+    get_gcs_bucket,
+    read_blob_from_bucket,
+)
+
+
+@pytest.fixture
+def get_bucket(tmp_path):
+    return get_gcs_bucket(storage_url=f"file://{tmp_path}/bucket")
+
+
+# Creating a dummy consumption of 35 days, the consumption of the series 147 is
+# doubled in the last 7 days
+@pytest.fixture
+def get_consumption():
+    rng = np.random.default_rng(seed=42)
+    index = pd.MultiIndex.from_product(
+        [
+            [101, 147],
+            [1, 2],
+            pd.date_range(start="2024-01-01 00:00", periods=35 * 24, freq="h"),
+        ],
+        names=["municipality_num", "branch", "datetime_dk"],
+    )
+    consumption = pd.Series(
+        rng.lognormal(mean=6, sigma=0.3, size=len(index)),
+        index=index,
+        name="consumption_kwh",
+    )
+    is_drifted = (index.get_level_values("municipality_num") == 147) & (
+        index.get_level_values("datetime_dk") >= pd.Timestamp("2024-01-29")
+    )
+    consumption[is_drifted] *= 2
+
+    return consumption
+
+
+def test_drift_sketches_merge(get_consumption):
+    """
+    In this test the sketches built in two runs are the same as the sketches built in
+    a single run, a rerun over the same hours is not counted twice, and the merged
+    moments match the moments of the raw values.
+    """
+
+    consumption = get_consumption
+    sketches = build_drift_sketches(values=consumption, quantity="target")
+    assert len(sketches) == 4 * 35
+    assert (sketches[BIN_COLUMNS].sum(axis=1) == sketches["count"]).all()
+
+    datetime_index = consumption.index.get_level_values("datetime_dk")
+    split_datetime = pd.Timestamp("2024-01-20 12:00")
+    merged_sketches = None
+    for values in [
+        consumption[datetime_index < split_datetime],
+        consumption[datetime_index >= pd.Timestamp("2024-01-20")],
+        consumption[datetime_index >= pd.Timestamp("2024-01-20")],
+    ]:
+        merged_sketches = update_drift_sketches(
+            sketches=merged_sketches,
+            new_sketches=build_drift_sketches(values=values, quantity="target"),
+            retention_days=None,
+        )
+    pd.testing.assert_frame_equal(merged_sketches, sketches)
+
+    series_sketch = sketches.xs((147, 1), level=["municipality_num", "branch"]).sum()
+    series_values = consumption.xs((147, 1), level=["municipality_num", "branch"])
+    assert series_sketch["count"] == len(series_values)
+    assert np.isclose(series_sketch["sum"], series_values.sum())
+    assert np.isclose(series_sketch["sum_sq"], (series_values**2).sum())
+
+    pruned_sketches = update_drift_sketches(
+        sketches=None, new_sketches=sketches, retention_days=7
+    )
+    assert pruned_sketches.index.get_level_values("day").nunique() == 7
+
+
+def test_drift_sketches_partial_days(get_consumption, get_bucket):
+    """
+    In this test a day sketched in two partial runs, split in the middle of the day, is
+    the same as the day sketched in a single run, and a run overlapping the sketched
+    hours only adds its new hours.
+    """
+
+    consumption = get_consumption
+    sketches = build_drift_sketches(values=consumption, quantity="target")
+    assert (sketches["hours"] == 2**24 - 1).all()
+
+    datetime_index = consumption.index.get_level_values("datetime_dk")
+    split_datetime = pd.Timestamp("2024-01-20 12:00")
+    merged_sketches = update_drift_sketches(
+        sketches=build_drift_sketches(
+            values=consumption[datetime_index < split_datetime], quantity="target"
+        ),
+        new_sketches=build_drift_sketches(
+            values=consumption[datetime_index >= split_datetime], quantity="target"
+        ),
+        retention_days=None,
+    )
+    pd.testing.assert_frame_equal(merged_sketches, sketches)
+
+    # The runs of the bucket overlap from 06:00 to 12:00 and the last run is repeated
+    for start_datetime, end_datetime in [
+        (None, split_datetime),
+        (pd.Timestamp("2024-01-20 06:00"), None),
+        (pd.Timestamp("2024-01-20 06:00"), None),
+    ]:
+        is_run = np.full(len(consumption), True)
+        if start_datetime is not None:
+            is_run &= datetime_index >= start_datetime
+        if end_datetime is not None:
+            is_run &= datetime_index < end_datetime
+        bucket_sketches = update_drift_sketches_in_bucket(
+            bucket=get_bucket, values=consumption[is_run], quantity="target"
+        )
+    pd.testing.assert_frame_equal(bucket_sketches, sketches)
+
+
+def test_drift_scores(get_consumption, get_bucket):
+    """
+    In this test only the series with a shifted consumption are drifted, and the
+    sketches of the consumption and residuals are stored together in the bucket.
+    """
+
+    consumption = get_consumption
+    update_drift_sketches_in_bucket(
+        bucket=get_bucket, values=consumption, quantity="target"
+    )
+
+    # The residuals are sketched a day later than the consumption
+    residuals = (consumption - consumption.groupby(level=[0, 1]).transform("mean"))[
+        consumption.index.get_level_values("datetime_dk") < pd.Timestamp("2024-02-04")
+    ]
+    sketches = update_drift_sketches_in_bucket(
+        bucket=get_bucket, values=residuals, quantity="residual"
+    )
+    pd.testing.assert_frame_equal(
+        read_blob_from_bucket(bucket=get_bucket, blob_name=DRIFT_SKETCH_BLOB_NAME),
+        sketches,
+    )
+
+    drift_scores = compute_drift_scores(sketches=sketches)
+    target_scores = drift_scores.xs("target", level="quantity")
+    is_drifted = target_scores["psi"] > 0.2
+    assert list(is_drifted[is_drifted].index.get_level_values("municipality_num")) == [
+        147,
+        147,
+    ]
+    assert (target_scores.loc[147, "mean_shift"] > 1).all()
+    assert (target_scores["current_count"] == 7 * 24).all()
+    assert (target_scores["reference_count"] == 28 * 24).all()
+
+    summary = get_drift_summary(drift_scores=drift_scores)
+    assert summary["target_drifted_fraction"] == 0.5
+    assert summary["drift_score"] >= 0.5
+
+    # Not enough days to compare, no series is scored
+    assert np.isnan(
+        get_drift_summary(
+            drift_scores=compute_drift_scores(sketches=sketches, reference_days=0)
+        )["drift_score"]
+    )
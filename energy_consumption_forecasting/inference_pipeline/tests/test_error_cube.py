@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from energy_consumption_forecasting.inference_pipeline.error_cube import (
+    build_error_cube,
+    merge_error_cubes,
+    query_error_cube,
+)
+from energy_consumption_forecasting.metrics import compute_segment_metrics
+
+
+# Creating dummy vintages forecasting 48 hours every day, so every hour is
+# forecasted with two lead times
+@pytest.fixture
+def get_vintages():
+    rng = np.random.default_rng(seed=42)
+    vintages = {}
+    for day in range(4):
+        issue_datetime = pd.Period("2024-01-01 23:00", freq="H") + 24 * day
+        index = pd.MultiIndex.from_product(
+            [
+                [101, 147],
+                [1, 2],
+                pd.period_range(start=issue_datetime + 1, periods=48, freq="H"),
+            ],
+            names=["municipality_num", "branch", "datetime_dk"],
+        )
+        vintages[issue_datetime] = pd.DataFrame(
+            {"consumption_kwh": rng.uniform(low=1, high=100, size=len(index))}, index
+        )
+    vintages = pd.concat(vintages, names=["issue_datetime"])
+
+    ground_truth = vintages.droplevel("issue_datetime")
+    ground_truth = ground_truth[~ground_truth.index.duplicated()].sort_index()
+    ground_truth = ground_truth.assign(
+        consumption_kwh=rng.uniform(low=1, high=100, size=len(ground_truth))
+    )
+
+    return vintages, ground_truth
+
+
+def test_error_cube_rollup(get_vintages):
+    """
+    In this test the metrics rolled up from the error cube are the same as the metrics
+    computed from the raw vintages, and a cube merged from two partitions is the same
+    as the cube of all the vintages.
+    """
+
+    vintages, ground_truth = get_vintages
+    cube = build_error_cube(vintages=vintages, ground_truth=ground_truth)
+
+    datetime_index = vintages.index.get_level_values("datetime_dk")
+    split_datetime = pd.Period("2024-01-04 00:00", freq="H")
+    merged_cube = merge_error_cubes(
+        cube=build_error_cube(
+            vintages=vintages[datetime_index < split_datetime],
+            ground_truth=ground_truth,
+        ),
+        new_cube=build_error_cube(
+            vintages=vintages[datetime_index >= split_datetime],
+            ground_truth=ground_truth,
+        ),
+    )
+    pd.testing.assert_frame_equal(merged_cube, cube)
+
+    # Metrics of every municipality over the last two days
+    result_df = query_error_cube(
+        cube=cube,
+        by=["municipality_num"],
+        start_day=pd.Period("2024-01-04", freq="D"),
+        end_day=pd.Period("2024-01-05", freq="D"),
+    )
+    is_selected = (datetime_index >= pd.Period("2024-01-04 00:00", freq="H")) & (
+        datetime_index <= pd.Period("2024-01-05 23:00", freq="H")
+    )
+    expected_df = compute_segment_metrics(
+        y_true=ground_truth,
+        y_pred=vintages[is_selected],
+        segment_levels=["municipality_num"],
+    )
+    pd.testing.assert_frame_equal(result_df, expected_df)
+
+    # Metrics of the first day ahead against the second day ahead
+    result_df = query_error_cube(cube=cube, by=["lead"], lead=list(range(1, 49)))
+    assert list(result_df.index) == list(range(1, 49))
+    assert result_df["count"].sum() == len(vintages)
+
+    result_df = query_error_cube(cube=cube, municipality_num=[147], branch=[2])
+    assert len(result_df) == 1
+    assert result_df["count"].iloc[0] == len(vintages) / 4
+
+
+def test_error_cube_rescore(get_vintages):
+    """
+    In this test the cells of the days with hours rescored with a late ground truth
+    are recomputed and replace the previous cells, so the merged cube is the same as
+    the cube of the complete ground truth, also when it is merged twice.
+    """
+
+    vintages, ground_truth = get_vintages
+    cube = build_error_cube(vintages=vintages, ground_truth=ground_truth)
+
+    # The ground truth of the series 147 arrives late for the last day
+    datetime_index = ground_truth.index.get_level_values("datetime_dk")
+    rescore_start = pd.Period("2024-01-04 23:00", freq="H")
+    is_late = (ground_truth.index.get_level_values("municipality_num") == 147) & (
+        datetime_index > rescore_start
+    )
+    partial_cube = build_error_cube(
+        vintages=vintages, ground_truth=ground_truth[~is_late]
+    )
+    assert partial_cube["count"].sum() < cube["count"].sum()
+
+    start_day = rescore_start.asfreq("D")
+    is_rescored = vintages.index.get_level_values("datetime_dk").asfreq("D") >= (
+        start_day
+    )
+    new_cube = build_error_cube(
+        vintages=vintages[is_rescored], ground_truth=ground_truth
+    )
+    merged_cube = merge_error_cubes(
+        cube=partial_cube, new_cube=new_cube, start_day=start_day
+    )
+    pd.testing.assert_frame_equal(merged_cube, cube)
+
+    merged_cube = merge_error_cubes(
+        cube=merged_cube, new_cube=new_cube, start_day=start_day
+    )
+    pd.testing.assert_frame_equal(merged_cube, cube)
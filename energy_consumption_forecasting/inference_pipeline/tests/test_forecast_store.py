@@ -0,0 +1,157 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from energy_consumption_forecasting.inference_pipeline.forecast_store import (
+    append_forecast_vintage,
+    compact_forecast_store,
+    get_compacted_blob_name,
+    list_forecast_vintages,
+    read_forecast_vintages,
+    read_latest_forecast,
+)
+
+
+# Creating a dummy in-memory GCS bucket
+class DummyBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+
+    def exists(self):
+        return self.name in self.bucket.objects
+
+    def delete(self):
+        del self.bucket.objects[self.name]
+
+    def open(self, mode="rb"):
+        if mode == "rb":
+            return io.BytesIO(self.bucket.objects[self.name])
+
+        blob = self
+
+        class BlobWriter(io.BytesIO):
+            def close(self):
+                blob.bucket.objects[blob.name] = self.getvalue()
+                super().close()
+
+        return BlobWriter()
+
+
+class DummyBucket:
+    def __init__(self):
+        self.objects = {}
+
+    def blob(self, blob_name):
+        return DummyBlob(bucket=self, name=blob_name)
+
+    def list_blobs(self, prefix=""):
+        return [
+            self.blob(name) for name in sorted(self.objects) if name.startswith(prefix)
+        ]
+
+
+def build_prediction(issue_datetime: pd.Period, value: float) -> pd.DataFrame:
+    index = pd.MultiIndex.from_product(
+        [
+            [101, 147],
+            [1, 2],
+            pd.period_range(start=issue_datetime + 1, periods=24, freq="H"),
+        ],
+        names=["municipality_num", "branch", "datetime_dk"],
+    )
+    return pd.DataFrame({"consumption_kwh": np.full(len(index), value)}, index=index)
+
+
+@pytest.fixture
+def get_bucket():
+    bucket = DummyBucket()
+    first_issue_datetime = pd.Period("2024-01-01 23:00", freq="H")
+    for day in range(3):
+        append_forecast_vintage(
+            bucket=bucket,
+            prediction=build_prediction(
+                issue_datetime=first_issue_datetime + 12 * day, value=day
+            ),
+            issue_datetime=first_issue_datetime + 12 * day,
+        )
+    return bucket
+
+
+def test_forecast_store_vintages(get_bucket):
+    """
+    In this test every vintage is kept in the forecast store, and the latest forecast
+    of an hour comes from the latest vintage containing the hour.
+    """
+
+    issue_datetimes = list_forecast_vintages(get_bucket)
+    assert len(issue_datetimes) == 3
+
+    vintages = read_forecast_vintages(
+        bucket=get_bucket, start_issue_datetime=issue_datetimes[1]
+    )
+    assert vintages.index.get_level_values("issue_datetime").nunique() == 2
+
+    latest_forecast = read_latest_forecast(bucket=get_bucket)
+    assert len(latest_forecast) == 4 * (24 + 12 + 12)
+    assert (
+        latest_forecast.groupby("datetime_dk").first().consumption_kwh.values
+        == [0] * 12 + [1] * 12 + [2] * 24
+    ).all()
+
+
+def test_forecast_store_compaction(get_bucket):
+    """
+    In this test the compaction merges the vintages into the partition of their issue
+    month without changing the forecast store, a compaction only rewrites the partition
+    receiving new vintages, and the retention drops the partitions of the oldest
+    months.
+    """
+
+    vintages = read_forecast_vintages(bucket=get_bucket)
+    issue_datetimes = list_forecast_vintages(get_bucket)
+    assert compact_forecast_store(bucket=get_bucket, retention_days=None) == [
+        pd.Period("2024-01", freq="M")
+    ]
+
+    january_blob_name = get_compacted_blob_name(pd.Period("2024-01", freq="M"))
+    assert list(get_bucket.objects) == [january_blob_name]
+    pd.testing.assert_frame_equal(read_forecast_vintages(bucket=get_bucket), vintages)
+
+    # Only the row groups of the selected issue datetimes are read
+    vintages = read_forecast_vintages(
+        bucket=get_bucket, start_issue_datetime=issue_datetimes[1]
+    )
+    assert list(vintages.index.get_level_values("issue_datetime").unique()) == (
+        issue_datetimes[1:]
+    )
+
+    # A vintage of a new month is compacted without rewriting the previous month
+    january_data = get_bucket.objects[january_blob_name]
+    issue_datetime = pd.Period("2024-02-01 23:00", freq="H")
+    append_forecast_vintage(
+        bucket=get_bucket,
+        prediction=build_prediction(issue_datetime=issue_datetime, value=3),
+        issue_datetime=issue_datetime,
+    )
+    assert compact_forecast_store(bucket=get_bucket) == [pd.Period("2024-02", freq="M")]
+    assert get_bucket.objects[january_blob_name] is january_data
+    assert read_forecast_vintages(
+        bucket=get_bucket, start_issue_datetime=issue_datetime
+    ).index.get_level_values("issue_datetime").unique().tolist() == [issue_datetime]
+
+    issue_datetime = pd.Period("2024-03-05 23:00", freq="H")
+    append_forecast_vintage(
+        bucket=get_bucket,
+        prediction=build_prediction(issue_datetime=issue_datetime, value=4),
+        issue_datetime=issue_datetime,
+    )
+    compact_forecast_store(bucket=get_bucket, retention_days=30)
+    assert list(get_bucket.objects) == [
+        get_compacted_blob_name(pd.Period("2024-02", freq="M")),
+        get_compacted_blob_name(pd.Period("2024-03", freq="M")),
+    ]
+    vintages = read_forecast_vintages(bucket=get_bucket)
+    assert vintages.index.get_level_values("issue_datetime").nunique() == 2
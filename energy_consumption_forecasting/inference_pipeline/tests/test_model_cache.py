@@ -0,0 +1,272 @@
+import json
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from energy_consumption_forecasting.inference_pipeline import model_cache
+from energy_consumption_forecasting.inference_pipeline.model_cache import (
+    compute_model_dir_checksum,
+    get_cached_model_path,
+    publish_model_pointer,
+    read_cache_index,
+)
+from energy_consumption_forecasting.inference_pipeline.utils import get_gcs_bucket
+
+
+# Creating a dummy model registry that counts the requests and downloads
+class DummyModel:
+    def __init__(self, registry, name, version):
+        self.registry = registry
+        self.name = name
+        self.version = version
+        self.description = json.dumps(
+            {"artifact_checksum": registry.checksums.get((name, version))}
+        )
+
+    def download(self):
+        self.registry.n_downloads += 1
+        download_dirpath = Path(tempfile.mkdtemp()) / str(self.version)
+        download_dirpath.mkdir()
+        (download_dirpath / f"{self.name}_{self.version}.pkl").write_bytes(
+            self.registry.files[(self.name, self.version)]
+        )
+        return str(download_dirpath)
+
+
+class DummyProject:
+    def __init__(self):
+        self.files = {}
+        self.checksums = {}
+        self.n_requests = 0
+        self.n_downloads = 0
+
+    def get_model_registry(self):
+        return self
+
+    def get_model(self, name, version):
+        self.n_requests += 1
+        return DummyModel(registry=self, name=name, version=version)
+
+
+@pytest.fixture
+def get_project():
+    project = DummyProject()
+    for version in [1, 2]:
+        project.files[("forecast_model", version)] = bytes(1000 * version)
+    return project
+
+
+def test_model_cache_hit(get_project, tmp_path):
+    """
+    In this test a repeated load of a model skips the download and the registry request,
+    and an expired reference is revalidated with a single registry request.
+    """
+
+    model_path = get_cached_model_path(
+        project=get_project, cache_dirpath=tmp_path, revalidate_after=3600
+    )
+    assert (model_path / "forecast_model_1.pkl").exists()
+    assert model_path.name == compute_model_dir_checksum(model_path)
+
+    assert (
+        get_cached_model_path(
+            project=get_project, cache_dirpath=tmp_path, revalidate_after=3600
+        )
+        == model_path
+    )
+    assert get_project.n_requests == 1 and get_project.n_downloads == 1
+
+    get_cached_model_path(
+        project=get_project, cache_dirpath=tmp_path, revalidate_after=0
+    )
+    assert get_project.n_requests == 2 and get_project.n_downloads == 2
+
+    # A corrupted cached file is detected and the model is downloaded again
+    (model_path / "forecast_model_1.pkl").write_bytes(b"corrupted")
+    model_path = get_cached_model_path(
+        project=get_project, cache_dirpath=tmp_path, revalidate_after=3600
+    )
+    assert (model_path / "forecast_model_1.pkl").read_bytes() == bytes(1000)
+    assert get_project.n_downloads == 3
+
+
+def test_model_cache_registry_checksum(get_project, tmp_path):
+    """
+    In this test a model with a registry checksum is not downloaded again when it is
+    revalidated, and a download that does not match the checksum fails.
+    """
+
+    model_path = get_cached_model_path(project=get_project, cache_dirpath=tmp_path)
+    get_project.checksums[("forecast_model", 1)] = model_path.name
+
+    get_cached_model_path(
+        project=get_project, cache_dirpath=tmp_path, revalidate_after=0
+    )
+    assert get_project.n_requests == 2 and get_project.n_downloads == 1
+
+    get_project.checksums[("forecast_model", 2)] = "0" * 64
+    with pytest.raises(Exception) as exe_info:
+        get_cached_model_path(
+            project=get_project, model_version=2, cache_dirpath=tmp_path
+        )
+
+    assert "does not match the registry checksum" in str(exe_info.value)
+
+
+def test_model_cache_registered_again(get_project, tmp_path):
+    """
+    In this test a model registered again under the same name and version is used on
+    the next load, while an unchanged model is not downloaded again.
+    """
+
+    model_path = get_cached_model_path(
+        project=get_project, cache_dirpath=tmp_path, revalidate_after=0
+    )
+    get_project.checksums[("forecast_model", 1)] = model_path.name
+    assert (
+        get_cached_model_path(
+            project=get_project, cache_dirpath=tmp_path, revalidate_after=0
+        )
+        == model_path
+    )
+    assert get_project.n_requests == 2 and get_project.n_downloads == 1
+
+    # Registering new model files with their checksum under the same version
+    new_dirpath = tmp_path / "registered"
+    new_dirpath.mkdir()
+    (new_dirpath / "forecast_model_1.pkl").write_bytes(b"retrained")
+    get_project.files[("forecast_model", 1)] = b"retrained"
+    get_project.checksums[("forecast_model", 1)] = compute_model_dir_checksum(
+        new_dirpath
+    )
+
+    new_model_path = get_cached_model_path(
+        project=get_project, cache_dirpath=tmp_path, revalidate_after=0
+    )
+    assert new_model_path != model_path
+    assert (new_model_path / "forecast_model_1.pkl").read_bytes() == b"retrained"
+    assert get_project.n_requests == 3 and get_project.n_downloads == 2
+
+
+def test_model_cache_pointer(get_project, tmp_path):
+    """
+    In this test a model without a registry checksum is revalidated with its pointer
+    blob without any registry request or download, and a model published again is
+    downloaded on the next load.
+    """
+
+    bucket = get_gcs_bucket(storage_url=f"file://{tmp_path}/bucket")
+    cache_dirpath = tmp_path / "cache"
+
+    model_filepath = tmp_path / "model" / "forecast_model_1.pkl"
+    model_filepath.parent.mkdir()
+    model_filepath.write_bytes(get_project.files[("forecast_model", 1)])
+    publish_model_pointer(
+        bucket=bucket,
+        model_name="forecast_model",
+        model_version=1,
+        checksum=compute_model_dir_checksum(model_filepath),
+    )
+
+    model_path = get_cached_model_path(
+        project=get_project, cache_dirpath=cache_dirpath, bucket=bucket
+    )
+    assert model_path.name == compute_model_dir_checksum(model_filepath)
+    for _ in range(2):
+        assert (
+            get_cached_model_path(
+                project=get_project,
+                cache_dirpath=cache_dirpath,
+                revalidate_after=0,
+                bucket=bucket,
+            )
+            == model_path
+        )
+    assert get_project.n_requests == 1 and get_project.n_downloads == 1
+
+    # Training and publishing a new model under the same version
+    model_filepath.write_bytes(b"retrained")
+    get_project.files[("forecast_model", 1)] = b"retrained"
+    publish_model_pointer(
+        bucket=bucket,
+        model_name="forecast_model",
+        model_version=1,
+        checksum=compute_model_dir_checksum(model_filepath),
+    )
+
+    new_model_path = get_cached_model_path(
+        project=get_project,
+        cache_dirpath=cache_dirpath,
+        revalidate_after=0,
+        bucket=bucket,
+    )
+    assert (new_model_path / "forecast_model_1.pkl").read_bytes() == b"retrained"
+    assert get_project.n_requests == 2 and get_project.n_downloads == 2
+
+
+def test_model_cache_eviction(get_project, tmp_path):
+    """
+    In this test the least recently used model is evicted when the cache is larger
+    than the limit.
+    """
+
+    first_path = get_cached_model_path(
+        project=get_project, model_version=1, cache_dirpath=tmp_path
+    )
+    second_path = get_cached_model_path(
+        project=get_project,
+        model_version=2,
+        cache_dirpath=tmp_path,
+        max_cache_bytes=2500,
+    )
+
+    index = read_cache_index(tmp_path)
+    assert not first_path.exists() and second_path.exists()
+    assert list(index["objects"]) == [second_path.name]
+    assert list(index["refs"]) == ["forecast_model_2"]
+
+
+def test_model_cache_download_lock(get_project, tmp_path, monkeypatch):
+    """
+    In this test a slow download of a model does not block the load of another model,
+    and the concurrent loads of the same model share a single download.
+    """
+
+    is_released = threading.Event()
+    download_cache_object = model_cache.download_cache_object
+
+    def slow_download_cache_object(model_instance, **kwargs):
+        if model_instance.version == 1:
+            assert is_released.wait(timeout=10)
+        return download_cache_object(model_instance=model_instance, **kwargs)
+
+    monkeypatch.setattr(
+        model_cache, "download_cache_object", slow_download_cache_object
+    )
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [
+            executor.submit(
+                get_cached_model_path,
+                project=get_project,
+                model_version=1,
+                cache_dirpath=tmp_path,
+            )
+            for _ in range(2)
+        ]
+        assert get_cached_model_path(
+            project=get_project, model_version=2, cache_dirpath=tmp_path
+        ).exists()
+        assert not any(future.done() for future in futures)
+
+        is_released.set()
+        assert futures[0].result() == futures[1].result()
+
+    assert get_project.n_downloads == 2
+    assert list(read_cache_index(tmp_path)["refs"]) == [
+        "forecast_model_2",
+        "forecast_model_1",
+    ]
@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from energy_consumption_forecasting.inference_pipeline.forecast_store import (
+    append_forecast_vintage,
+    compact_forecast_store,
+    read_forecast_vintages,
+    read_latest_forecast,
+)
+from energy_consumption_forecasting.inference_pipeline.monitor_performance import (
+    CACHED_PREDICTION_BLOB_NAME,
+    append_performance_metrics,
+    get_scoring_watermark,
+    update_cached_prediction,
+)
+from energy_consumption_forecasting.inference_pipeline.utils import (
+    get_gcs_bucket,
+    write_blob_to_bucket,
+)
+
+
+@pytest.fixture
+def get_bucket(tmp_path):
+    return get_gcs_bucket(storage_url=f"file://{tmp_path}/bucket")
+
+
+def build_prediction(issue_datetime: pd.Period, value: float) -> pd.DataFrame:
+    index = pd.MultiIndex.from_product(
+        [
+            [101, 147],
+            [1, 2],
+            pd.period_range(start=issue_datetime + 1, periods=24, freq="H"),
+        ],
+        names=["municipality_num", "branch", "datetime_dk"],
+    )
+    return pd.DataFrame({"consumption_kwh": np.full(len(index), value)}, index)
+
+
+def test_update_cached_prediction(get_bucket):
+    """
+    In this test the cached prediction updated after the watermark, from the recent
+    vintages only, is the same as the latest forecast of the whole forecast store.
+    """
+
+    issue_datetime = pd.Period("2024-01-01 23:00", freq="H")
+    for day in range(3):
+        append_forecast_vintage(
+            bucket=get_bucket,
+            prediction=build_prediction(issue_datetime + 24 * day, value=day),
+            issue_datetime=issue_datetime + 24 * day,
+        )
+    compact_forecast_store(bucket=get_bucket)
+
+    cached_prediction = update_cached_prediction(
+        bucket=get_bucket, vintages=read_forecast_vintages(bucket=get_bucket)
+    )
+    write_blob_to_bucket(
+        bucket=get_bucket,
+        blob_name=CACHED_PREDICTION_BLOB_NAME,
+        data=cached_prediction,
+    )
+
+    # The first two days are scored before the next vintages arrive
+    watermark = issue_datetime + 48
+    for day in range(3, 5):
+        append_forecast_vintage(
+            bucket=get_bucket,
+            prediction=build_prediction(issue_datetime + 24 * day, value=day),
+            issue_datetime=issue_datetime + 24 * day,
+        )
+
+    vintages = read_forecast_vintages(
+        bucket=get_bucket, start_issue_datetime=watermark - 24
+    )
+    cached_prediction = update_cached_prediction(
+        bucket=get_bucket, vintages=vintages, watermark=watermark
+    )
+    pd.testing.assert_frame_equal(
+        cached_prediction, read_latest_forecast(bucket=get_bucket)
+    )
+
+
+def test_append_performance_metrics():
+    """
+    In this test the metrics of the new hours are appended after the watermark, and a
+    rescored hour replaces its previous metrics.
+    """
+
+    assert get_scoring_watermark(None) is None
+
+    datetime_index = pd.period_range(
+        start="2024-01-02 00:00", periods=48, freq="H", name="datetime_dk"
+    )
+    metrics = pd.DataFrame({"mape": 0.1}, index=datetime_index[:24])
+    new_metrics = pd.DataFrame({"mape": 0.2}, index=datetime_index[23:])
+
+    metrics = append_performance_metrics(metrics=metrics, new_metrics=new_metrics)
+    assert get_scoring_watermark(metrics) == datetime_index[-1]
+    assert len(metrics) == 48
+    assert metrics.loc[datetime_index[23], "mape"] == 0.2
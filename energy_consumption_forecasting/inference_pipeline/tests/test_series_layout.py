@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from energy_consumption_forecasting.inference_pipeline.utils import (
+    read_series_parquet,
+    write_series_parquet,
+)
+
+
+# Creating a dummy hierarchical dataset in a random row order
+@pytest.fixture
+def get_dataset():
+    datetime_range = pd.period_range("2024-01-01 00:00", periods=48, freq="H")
+    index = pd.MultiIndex.from_product(
+        [[101, 147, 151], [1, 2, 3], datetime_range],
+        names=["municipality_num", "branch", "datetime_dk"],
+    )
+    rng = np.random.default_rng(seed=42)
+    data = pd.DataFrame({"consumption_kwh": rng.random(len(index))}, index=index)
+    return data.sample(frac=1, random_state=42)
+
+
+def test_series_parquet_layout(get_dataset, tmp_path):
+    """
+    In this test every series is written in its own sorted row group, and a single
+    series read from the footer statistics matches the series in the dataset.
+    """
+
+    filepath = tmp_path / "target_by_series.parquet"
+    with open(filepath, "wb") as file:
+        write_series_parquet(data=get_dataset, file=file)
+
+    metadata = pq.ParquetFile(filepath).metadata
+    assert metadata.num_row_groups == 9
+    assert metadata.row_group(0).sorting_columns is not None
+
+    with open(filepath, "rb") as file:
+        series = read_series_parquet(file=file, municipality_num=147, branch=2)
+
+    expected_series = get_dataset.sort_index()
+    expected_series = expected_series[
+        expected_series.index.droplevel(level=2).isin([(147, 2)])
+    ]
+    pd.testing.assert_frame_equal(series, expected_series)
+
+    with open(filepath, "rb") as file:
+        assert read_series_parquet(file=file, municipality_num=999, branch=1) is None
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from energy_consumption_forecasting.inference_pipeline.forecast_store import (
+    append_forecast_vintage,
+    list_forecast_vintages,
+    read_latest_forecast,
+)
+from energy_consumption_forecasting.inference_pipeline.utils import (
+    get_gcs_bucket,
+    read_blob_from_bucket,
+    read_series_from_bucket,
+    write_blob_to_bucket,
+    write_blobs_to_bucket,
+)
+
+
+@pytest.fixture(params=["local", "memory"])
+def get_bucket(request, tmp_path):
+    if request.param == "local":
+        yield get_gcs_bucket(storage_url=f"file://{tmp_path}/bucket")
+    else:
+        bucket = get_gcs_bucket(storage_url=f"memory://{tmp_path.name}")
+        yield bucket
+        bucket.fs.rm(bucket.root, recursive=True)
+
+
+@pytest.fixture
+def get_data():
+    index = pd.MultiIndex.from_product(
+        [
+            [101, 147],
+            [1, 2],
+            pd.period_range(start="2024-01-01 00:00", periods=24, freq="H"),
+        ],
+        names=["municipality_num", "branch", "datetime_dk"],
+    )
+    return pd.DataFrame({"consumption_kwh": np.arange(len(index), dtype=float)}, index)
+
+
+def test_storage_read_write(get_bucket, get_data):
+    """
+    In this test the blobs are written, listed and read back from the local and
+    in-memory storage, and the generation of a blob changes when it is rewritten.
+    """
+
+    assert read_blob_from_bucket(bucket=get_bucket, blob_name="target.parquet") is None
+    assert get_bucket.get_blob(blob_name="target.parquet") is None
+
+    write_blob_to_bucket(bucket=get_bucket, blob_name="target.parquet", data=get_data)
+    write_blobs_to_bucket(
+        bucket=get_bucket,
+        blobs={
+            "prediction.parquet": get_data,
+            "prediction_by_series.parquet": get_data,
+        },
+        series_blob_names=["prediction_by_series.parquet"],
+    )
+
+    assert [blob.name for blob in get_bucket.list_blobs()] == [
+        "prediction.parquet",
+        "prediction_by_series.parquet",
+        "target.parquet",
+    ]
+    pd.testing.assert_frame_equal(
+        read_blob_from_bucket(bucket=get_bucket, blob_name="target.parquet"), get_data
+    )
+    series = read_series_from_bucket(
+        bucket=get_bucket,
+        blob_name="prediction_by_series.parquet",
+        municipality_num=147,
+        branch=1,
+    )
+    is_series = get_data.index.droplevel(2).isin([(147, 1)])
+    pd.testing.assert_frame_equal(series, get_data[is_series])
+
+    # Range reads return the parquet magic bytes at the start and the end of the blob
+    blob = get_bucket.get_blob(blob_name="target.parquet")
+    assert blob.download_as_bytes(start=0, end=3) == b"PAR1"
+    assert blob.download_as_bytes(start=blob.size - 4) == b"PAR1"
+
+    write_blob_to_bucket(
+        bucket=get_bucket, blob_name="target.parquet", data=get_data.iloc[:10]
+    )
+    assert get_bucket.get_blob(blob_name="target.parquet").generation != (
+        blob.generation
+    )
+
+
+def test_storage_failed_write(tmp_path, get_data):
+    """
+    In this test a failed write in the local storage leaves the previous blob untouched
+    and no temporary file behind.
+    """
+
+    bucket = get_gcs_bucket(storage_url=f"file://{tmp_path}")
+    write_blob_to_bucket(bucket=bucket, blob_name="target.parquet", data=get_data)
+
+    with pytest.raises(ValueError):
+        with bucket.blob(blob_name="target.parquet").open(mode="wb") as file:
+            file.write(b"partial")
+            raise ValueError("Write failed.")
+
+    pd.testing.assert_frame_equal(
+        read_blob_from_bucket(bucket=bucket, blob_name="target.parquet"), get_data
+    )
+    assert [path.name for path in tmp_path.iterdir()] == ["target.parquet"]
+
+
+def test_storage_forecast_store(get_bucket, get_data):
+    """
+    In this test the forecast store lists the vintages from the prefix of the blobs.
+    """
+
+    for hour, value in [(23, 1.0), (47, 2.0)]:
+        append_forecast_vintage(
+            bucket=get_bucket,
+            prediction=get_data.assign(consumption_kwh=value),
+            issue_datetime=pd.Period("2024-01-01 00:00", freq="H") + hour,
+        )
+    write_blob_to_bucket(bucket=get_bucket, blob_name="target.parquet", data=get_data)
+
+    assert len(list_forecast_vintages(get_bucket)) == 2
+    assert (read_latest_forecast(bucket=get_bucket).consumption_kwh == 2.0).all()
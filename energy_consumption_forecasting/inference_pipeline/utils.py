@@ -1,8 +1,18 @@
-from typing import Optional
+import io
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Optional
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from google.cloud import storage
 
+from energy_consumption_forecasting.inference_pipeline.blob_cache import (
+    BLOB_CACHE_DIR_PATH,
+    get_cached_blob_path,
+)
+from energy_consumption_forecasting.inference_pipeline.storage import FsspecBucket
 from energy_consumption_forecasting.utils import get_env_var
 
 # Google cloud platform environment variables for project, bucket and service account
@@ -12,16 +22,34 @@ GCS_SERVICE_ACCOUNT_JSON_PATH = get_env_var(
     key="GOOGLE_CLOUD_SERVICE_ACCOUNT_JSON_PATH"
 )
 
+# Storage URL of the pipeline data, for eg. "file:///data/bucket" or "memory://bucket",
+# by default the data is stored in the Google cloud storage(GCS) bucket
+STORAGE_URL = get_env_var(key="STORAGE_URL")
+
+# Chunk size of the resumable uploads, it needs to be a multiple of 256 KiB
+UPLOAD_CHUNK_SIZE = int(
+    get_env_var(
+        key="GOOGLE_CLOUD_UPLOAD_CHUNK_SIZE", default_value=str(8 * 1024 * 1024)
+    )
+)
+
+SERIES_KEYS = ["municipality_num", "branch"]
+
 
 def get_gcs_bucket(
     project: str = GCS_PROJECT,
     bucket_name: str = GCS_BUCKET_NAME,
     json_credentials_path: str = GCS_SERVICE_ACCOUNT_JSON_PATH,
-) -> storage.Bucket:
+    storage_url: Optional[str] = STORAGE_URL,
+) -> storage.Bucket | FsspecBucket:
     """
     This function gets the Google cloud storage(GCS) bucket from GCP, using this bucket
     object you can upload and download data from the Google cloud storage.
 
+    When a storage URL other than GCS is provided, for eg. "file:///data/bucket" or
+    "memory://bucket", a "FsspecBucket" with the same methods is returned instead, so
+    the pipelines can run on a single machine without cloud credentials.
+
     Parameters
     ----------
     project: str
@@ -38,11 +66,21 @@ def get_gcs_bucket(
         in GCS, by default uses the environment variable called
         GCS_SERVICE_ACCOUNT_JSON_PATH.
 
+    storage_url: str or None, default=STORAGE_URL
+        The URL of the bucket, by default uses the environment variable called
+        STORAGE_URL. A "gs://" URL or None connects to the GCS bucket.
+
     Returns
     -------
-    storage.Bucket
+    storage.Bucket or FsspecBucket
         A bucket object received from Google cloud storage to upload and download data.
     """
+    if storage_url is not None and not storage_url.startswith("gs://"):
+        return FsspecBucket(storage_url=storage_url)
+
+    if storage_url is not None:
+        bucket_name = storage_url.removeprefix("gs://").strip("/")
+
     client = storage.Client.from_service_account_json(
         json_credentials_path=json_credentials_path, project=project
     )
@@ -77,13 +115,19 @@ def write_blob_to_bucket(bucket: storage.Bucket, blob_name: str, data: pd.DataFr
 
 
 def read_blob_from_bucket(
-    bucket: storage.Bucket, blob_name: str
+    bucket: storage.Bucket,
+    blob_name: str,
+    cache_dirpath: Optional[Path | str] = BLOB_CACHE_DIR_PATH,
 ) -> Optional[pd.DataFrame]:
     """
     This function gets the binary large object(blob) from the Google cloud storage(GCS)
     bucket. Using the blob object, the binary data is transformed back to pandas
     dataframe.
 
+    With a cache directory the blob is read through the local blob cache, the blob is
+    only downloaded when it was written since it was cached and the cached file is read
+    memory-mapped, see "get_cached_blob_path".
+
     Parameters
     ----------
     bucket: storage.Bucket
@@ -93,12 +137,25 @@ def read_blob_from_bucket(
     blob_name: str
         The name of the blob to be instantiated.
 
+    cache_dirpath: Path or str or None, default=BLOB_CACHE_DIR_PATH
+        The directory of the blob cache, by default it takes the value from the env
+        variable with key "BLOB_CACHE_DIR_PATH". None reads the blob without the cache.
+
     Returns
     -------
     pd.DataFrame or None
         A dataframe containing the data within the blob or None if the blob does not
         exists.
     """
+    if cache_dirpath is not None:
+        filepath = get_cached_blob_path(
+            bucket=bucket, blob_name=blob_name, cache_dirpath=cache_dirpath
+        )
+        if filepath is None:
+            return None
+
+        return pd.read_parquet(path=filepath, memory_map=True)
+
     blob_obj = bucket.blob(blob_name=blob_name)
 
     if not blob_obj.exists():
@@ -106,3 +163,264 @@ def read_blob_from_bucket(
 
     with blob_obj.open("rb") as file:
         return pd.read_parquet(path=file)
+
+
+def get_series_blob_name(blob_name: str) -> str:
+    """
+    This function returns the blob name of the per series layout of a blob, for eg.
+    "target.parquet" is published as "target_by_series.parquet".
+    """
+
+    return blob_name.replace(".parquet", "_by_series.parquet")
+
+
+def write_series_parquet(data: pd.DataFrame, file: BinaryIO):
+    """
+    This function writes the hierarchical dataframe as parquet data with a row group
+    for every (municipality_num, branch) series. The rows are sorted by the index, and
+    the row group statistics of the key columns let a reader find a series from the
+    parquet footer and fetch only its row group with a byte-range read.
+
+    Parameters
+    ----------
+    data: pd.DataFrame
+        A dataframe indexed by municipality_num, branch and datetime_dk.
+
+    file: BinaryIO
+        A binary file object where the parquet data is written.
+    """
+
+    data = data.sort_index()
+    table = pa.Table.from_pandas(df=data, preserve_index=True)
+    sorting_columns = [
+        pq.SortingColumn(column_index=table.schema.get_field_index(name))
+        for name in data.index.names
+    ]
+
+    # Getting the first row and number of rows of every series
+    series_sizes = data.groupby(level=SERIES_KEYS, sort=False).size().to_numpy()
+    series_starts = series_sizes.cumsum() - series_sizes
+
+    with pq.ParquetWriter(
+        where=file,
+        schema=table.schema,
+        write_statistics=SERIES_KEYS,
+        sorting_columns=sorting_columns,
+    ) as writer:
+        for start, size in zip(series_starts, series_sizes):
+            writer.write_table(table=table.slice(start, size), row_group_size=size)
+
+
+def find_series_row_group(
+    metadata: pq.FileMetaData, municipality_num: int, branch: int
+) -> Optional[int]:
+    """
+    This function finds the row group of a series using the row group statistics
+    in the parquet footer, None is returned if the series is not present.
+    """
+
+    key_indices = [metadata.schema.names.index(name) for name in SERIES_KEYS]
+    for row_group in range(metadata.num_row_groups):
+        row_group_metadata = metadata.row_group(row_group)
+        statistics = [
+            row_group_metadata.column(index).statistics for index in key_indices
+        ]
+        if all(
+            stat.min == value == stat.max
+            for stat, value in zip(statistics, [municipality_num, branch])
+        ):
+            return row_group
+
+    return None
+
+
+def read_series_parquet(
+    file: BinaryIO, municipality_num: int, branch: int
+) -> Optional[pd.DataFrame]:
+    """
+    This function reads a single series from parquet data written by
+    "write_series_parquet", only the footer and the row group of the series are read
+    from the file. None is returned if the series is not present.
+    """
+
+    parquet_file = pq.ParquetFile(source=file)
+    row_group = find_series_row_group(
+        metadata=parquet_file.metadata, municipality_num=municipality_num, branch=branch
+    )
+    if row_group is None:
+        return None
+
+    return parquet_file.read_row_group(i=row_group).to_pandas()
+
+
+def write_series_blob_to_bucket(
+    bucket: storage.Bucket, blob_name: str, data: pd.DataFrame
+):
+    """
+    This function uploads the dataframe to the Google cloud storage(GCS) bucket in
+    the per series layout generated by "write_series_parquet".
+
+    Parameters
+    ----------
+    bucket: storage.Bucket
+        A bucket object that is generated by GCS, can be used for uploading and
+        downloading data.
+
+    blob_name: str
+        The name of the blob to be instantiated.
+
+    data: pd.DataFrame
+        A dataframe indexed by municipality_num, branch and datetime_dk.
+    """
+    blob_obj = bucket.blob(blob_name=blob_name)
+
+    with blob_obj.open(mode="wb") as file:
+        write_series_parquet(data=data, file=file)
+
+
+def read_series_from_bucket(
+    bucket: storage.Bucket, blob_name: str, municipality_num: int, branch: int
+) -> Optional[pd.DataFrame]:
+    """
+    This function reads a single series from a blob written by
+    "write_series_blob_to_bucket", the blob is read with byte-range requests for the
+    parquet footer and the row group of the series instead of a full download.
+
+    Parameters
+    ----------
+    bucket: storage.Bucket
+        A bucket object that is generated by GCS, can be used for uploading and
+        downloading data.
+
+    blob_name: str
+        The name of the blob to be instantiated.
+
+    municipality_num: int
+        The municipality number of the series.
+
+    branch: int
+        The branch of the series.
+
+    Returns
+    -------
+    pd.DataFrame or None
+        A dataframe containing the series or None if the blob or the series does not
+        exists.
+    """
+    blob_obj = bucket.blob(blob_name=blob_name)
+
+    if not blob_obj.exists():
+        return None
+
+    with blob_obj.open("rb") as file:
+        return read_series_parquet(
+            file=file, municipality_num=municipality_num, branch=branch
+        )
+
+
+def upload_blob_data(
+    bucket: storage.Bucket,
+    blob_name: str,
+    data: pd.DataFrame,
+    series_layout: bool = False,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> str:
+    """
+    This function encodes the dataframe as parquet data in memory and uploads it to
+    the Google cloud storage(GCS) bucket. Data larger than the chunk size is uploaded
+    with a resumable upload in chunks, smaller data with a single request. A GCS object
+    is only visible once the upload is finalized, so a reader never sees a partially
+    uploaded blob.
+
+    Parameters
+    ----------
+    bucket: storage.Bucket
+        A bucket object that is generated by GCS, can be used for uploading and
+        downloading data.
+
+    blob_name: str
+        The name of the blob to be instantiated.
+
+    data: pd.DataFrame
+        The data that needs to be stored in the GCS.
+
+    series_layout: bool, default=False
+        Whether to encode the data in the per series layout of "write_series_parquet".
+
+    chunk_size: int, default=UPLOAD_CHUNK_SIZE
+        Size of the resumable upload chunks in bytes, by default it takes the value from
+        the env variable with key "GOOGLE_CLOUD_UPLOAD_CHUNK_SIZE".
+
+    Returns
+    -------
+    str
+        The name of the uploaded blob.
+    """
+
+    buffer = io.BytesIO()
+    if series_layout:
+        write_series_parquet(data=data, file=buffer)
+    else:
+        data.to_parquet(path=buffer)
+    size = buffer.tell()
+    buffer.seek(0)
+
+    blob_obj = bucket.blob(
+        blob_name=blob_name, chunk_size=chunk_size if size > chunk_size else None
+    )
+    blob_obj.upload_from_file(
+        file_obj=buffer, size=size, content_type="application/octet-stream"
+    )
+
+    return blob_name
+
+
+def write_blobs_to_bucket(
+    bucket: storage.Bucket,
+    blobs: Dict[str, pd.DataFrame],
+    series_blob_names: Iterable[str] = (),
+    max_workers: Optional[int] = None,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+):
+    """
+    This function uploads many dataframes to the Google cloud storage(GCS) bucket
+    concurrently in a thread pool, see "upload_blob_data". The parquet encoding of a
+    dataframe overlaps with the upload of the others, so the upload takes about as
+    long as the largest dataframe instead of the sum of all of them.
+
+    Parameters
+    ----------
+    bucket: storage.Bucket
+        A bucket object that is generated by GCS, can be used for uploading and
+        downloading data.
+
+    blobs: Dict[str, pd.DataFrame]
+        The dataframes that need to be stored in the GCS by blob name.
+
+    series_blob_names: Iterable[str], default=()
+        The blob names that are encoded in the per series layout.
+
+    max_workers: int or None, default=None
+        Number of upload threads, by default a thread for every blob.
+
+    chunk_size: int, default=UPLOAD_CHUNK_SIZE
+        Size of the resumable upload chunks in bytes.
+    """
+
+    series_blob_names = set(series_blob_names)
+    with ThreadPoolExecutor(max_workers=max_workers or len(blobs)) as executor:
+        futures = [
+            executor.submit(
+                upload_blob_data,
+                bucket=bucket,
+                blob_name=blob_name,
+                data=data,
+                series_layout=blob_name in series_blob_names,
+                chunk_size=chunk_size,
+            )
+            for blob_name, data in blobs.items()
+        ]
+
+        # Raising the first upload error after all the uploads are completed
+        for future in futures:
+            future.result()
@@ -0,0 +1,222 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Smallest denominator of the percentage errors, same as the sktime metrics
+EPSILON = np.finfo(np.float64).eps
+
+
+def compute_segment_sums(
+    y_true: np.ndarray,
+    y_pred: np.ndarray,
+    codes: np.ndarray,
+    n_segments: int,
+) -> Dict[str, np.ndarray]:
+    """
+    This function reduces the errors of all the segments (for eg. series) in a single
+    vectorized pass. The values are assigned to a segment by their integer code and
+    for every segment the number of values and the sum of the absolute percentage,
+    squared percentage, absolute, squared and signed (prediction minus actual) errors
+    are returned.
+
+    The sums can be added together to merge the segments or partitions of the data,
+    and are converted into the metrics by "compute_metrics_from_sums".
+
+    Parameters
+    ----------
+    y_true: np.ndarray
+        A 1D array of the actual values.
+
+    y_pred: np.ndarray
+        A 1D array of the predicted values aligned with y_true.
+
+    codes: np.ndarray
+        A 1D integer array of the segment code of every value, between 0 and
+        n_segments - 1.
+
+    n_segments: int
+        The number of segments.
+
+    Returns
+    -------
+    Dict[str, np.ndarray]
+        A dict containing an array of length n_segments for "count", "ape", "spe",
+        "ae", "se" and "error".
+    """
+
+    y_true = np.asarray(y_true, dtype="float64")
+    y_pred = np.asarray(y_pred, dtype="float64")
+
+    error = y_pred - y_true
+    abs_error = np.abs(error)
+    ape = abs_error / np.maximum(np.abs(y_true), EPSILON)
+
+    return {
+        "count": np.bincount(codes, minlength=n_segments).astype("float64"),
+        "ape": np.bincount(codes, weights=ape, minlength=n_segments),
+        "spe": np.bincount(codes, weights=ape**2, minlength=n_segments),
+        "ae": np.bincount(codes, weights=abs_error, minlength=n_segments),
+        "se": np.bincount(codes, weights=abs_error**2, minlength=n_segments),
+        "error": np.bincount(codes, weights=error, minlength=n_segments),
+    }
+
+
+def compute_metrics_from_sums(sums: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    This function converts the segment sums of "compute_segment_sums" into the MAPE,
+    RMSPE, MAE, RMSE and bias (mean of prediction minus actual) metrics of every
+    segment.
+    """
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return {
+            "mape": sums["ape"] / sums["count"],
+            "rmspe": np.sqrt(sums["spe"] / sums["count"]),
+            "mae": sums["ae"] / sums["count"],
+            "rmse": np.sqrt(sums["se"] / sums["count"]),
+            "bias": sums["error"] / sums["count"],
+        }
+
+
+def average_segment_metrics(sums: Dict[str, np.ndarray]) -> Dict[str, float]:
+    """
+    This function averages the metrics of all the segments with an equal weight, like
+    the sktime metrics on hierarchical data. The squared metrics are averaged before
+    taking the square root, i.e. RMSPE is the root of the average MSPE.
+    """
+
+    metrics = compute_metrics_from_sums(sums)
+
+    return {
+        "mape": float(np.mean(metrics["mape"])),
+        "rmspe": float(np.sqrt(np.mean(metrics["rmspe"] ** 2))),
+        "mae": float(np.mean(metrics["mae"])),
+        "rmse": float(np.sqrt(np.mean(metrics["rmse"] ** 2))),
+        "bias": float(np.mean(metrics["bias"])),
+    }
+
+
+def compute_grouped_metrics(
+    y_true: pd.DataFrame,
+    y_pred: pd.DataFrame,
+    group_levels: List[str] = ["municipality_num", "branch"],
+    target_feature: str = "consumption_kwh",
+) -> Tuple[Dict[str, float], pd.DataFrame]:
+    """
+    This function computes the performance metrics for every group (for eg. every
+    municipality_num and branch series) and the overall metrics in a single
+    vectorized pass over the aligned actual and prediction data.
+
+    Parameters
+    ----------
+    y_true: pd.DataFrame
+        A dataframe with a multi-index containing the group levels and the actual
+        values of the target feature.
+
+    y_pred: pd.DataFrame
+        A dataframe with the same index as y_true containing the predicted values of
+        the target feature.
+
+    group_levels: List[str], default=["municipality_num", "branch"]
+        The index levels that identify a group.
+
+    target_feature: str, default="consumption_kwh"
+        The name of the target feature in the dataset.
+
+    Returns
+    -------
+    Tuple[Dict[str, float], pd.DataFrame]
+        A dict containing the overall metrics, the average of the group metrics, and a
+        dataframe containing the group levels and the metrics of every group.
+    """
+
+    y_pred = y_pred[target_feature].reindex(y_true.index)
+    if y_pred.isna().any():
+        raise Exception("y_true and y_pred data are not aligned.")
+
+    codes, groups = pd.factorize(
+        y_true.index.droplevel(
+            [level for level in y_true.index.names if level not in group_levels]
+        ),
+        sort=True,
+    )
+    sums = compute_segment_sums(
+        y_true=y_true[target_feature].to_numpy(),
+        y_pred=y_pred.to_numpy(),
+        codes=codes,
+        n_segments=len(groups),
+    )
+
+    grouped_result_df = pd.DataFrame(
+        compute_metrics_from_sums(sums),
+        index=groups.set_names(group_levels),
+    ).reset_index()
+
+    return average_segment_metrics(sums), grouped_result_df
+
+
+def compute_segment_metrics(
+    y_true: pd.DataFrame,
+    y_pred: pd.DataFrame,
+    segment_levels: List[str] = ["datetime_dk"],
+    target_feature: str = "consumption_kwh",
+) -> pd.DataFrame:
+    """
+    This function computes the performance metrics of every segment (for eg. every
+    hour across all the series) in a single vectorized pass. The prediction and the
+    actual values are aligned with an index join, only the predictions with an actual
+    value are scored.
+
+    Every segment is scored over its values as a single series, so the metrics are the
+    same as the sktime metrics computed on the values of every segment.
+
+    Parameters
+    ----------
+    y_true: pd.DataFrame
+        A dataframe with a multi-index containing the segment levels and the actual
+        values of the target feature.
+
+    y_pred: pd.DataFrame
+        A dataframe with the same index levels as y_true containing the predicted
+        values of the target feature.
+
+    segment_levels: List[str], default=["datetime_dk"]
+        The index levels that identify a segment.
+
+    target_feature: str, default="consumption_kwh"
+        The name of the target feature in the dataset.
+
+    Returns
+    -------
+    pd.DataFrame
+        A dataframe indexed by the segment levels containing the "mape", "rmspe",
+        "mae", "rmse", "bias" and "count" of every segment, empty if no prediction has
+        an actual value.
+    """
+
+    aligned = (
+        y_pred[[target_feature]]
+        .join(y_true[[target_feature]], how="inner", lsuffix="_pred", rsuffix="_true")
+        .dropna()
+    )
+
+    codes, segments = pd.factorize(
+        aligned.index.droplevel(
+            [level for level in aligned.index.names if level not in segment_levels]
+        ),
+        sort=True,
+    )
+    sums = compute_segment_sums(
+        y_true=aligned[f"{target_feature}_true"].to_numpy(),
+        y_pred=aligned[f"{target_feature}_pred"].to_numpy(),
+        codes=codes,
+        n_segments=len(segments),
+    )
+
+    segment_result_df = pd.DataFrame(
+        compute_metrics_from_sums(sums), index=segments.set_names(segment_levels)
+    )
+    segment_result_df["count"] = sums["count"].astype("int64")
+
+    return segment_result_df
@@ -0,0 +1,423 @@
+import hashlib
+import json
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+
+from energy_consumption_forecasting.window_features import (
+    DATETIME_LEVEL,
+    SERIES_LEVELS,
+    build_feature_spec,
+    build_series_panel,
+    get_last_window,
+    recursive_forecast,
+)
+
+ARTIFACT_FORMAT_VERSION = 1
+BOOSTER_FILENAME = "booster.txt"
+SPEC_FILENAME = "model_spec.json"
+WINDOW_FILENAME = "last_window.npy"
+
+
+def compute_file_checksum(filepath: Path) -> str:
+    """
+    This function computes the SHA-256 checksum of a file in chunks.
+    """
+
+    file_hash = hashlib.sha256()
+    with open(filepath, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            file_hash.update(chunk)
+
+    return file_hash.hexdigest()
+
+
+def compute_artifact_checksum(artifact_dirpath: Path) -> str:
+    """
+    This function computes a single SHA-256 checksum of the native model artifact,
+    from the checksums of all the artifact files.
+    """
+
+    artifact_hash = hashlib.sha256()
+    for filename in [BOOSTER_FILENAME, SPEC_FILENAME, WINDOW_FILENAME]:
+        file_checksum = compute_file_checksum(Path(artifact_dirpath) / filename)
+        artifact_hash.update(f"{filename}:{file_checksum}\n".encode())
+
+    return artifact_hash.hexdigest()
+
+
+class NativeForecaster:
+    """
+    A LightGBM recursive forecaster that reproduces the predictions of the sktime
+    forecasting pipeline built by "model_builder.build_lightgbm_model", without
+    importing sktime. It holds the LightGBM booster, the feature specification and
+    the last window of observations of every series.
+
+    Parameters
+    ----------
+    booster: lightgbm.Booster
+        The trained LightGBM booster.
+
+    feature_spec: Dict[str, Any]
+        The feature specification generated by "window_features.build_feature_spec".
+
+    series_index: pd.MultiIndex
+        The municipality_num and branch of every series, in the order of the rows of
+        last_window.
+
+    last_window: np.ndarray
+        A 2D array of the last "window_length" observations of every series.
+
+    cutoff: pd.Period
+        The last hour of the observations in last_window.
+
+    metadata: Dict[str, Any] or None, default=None
+        The metadata saved along with the model artifact.
+
+    Attributes
+    ----------
+    num_threads: int
+        Number of threads used by the booster while predicting, 0 uses the OpenMP
+        default. It can be lowered when many forecasters predict in parallel processes.
+    """
+
+    def __init__(
+        self,
+        booster: lgb.Booster,
+        feature_spec: Dict[str, Any],
+        series_index: pd.MultiIndex,
+        last_window: np.ndarray,
+        cutoff: pd.Period,
+        metadata: Optional[Dict[str, Any]] = None,
+    ):
+        self.booster = booster
+        self.feature_spec = feature_spec
+        self.feature_names = booster.feature_name()
+        self.series_index = series_index
+        self.last_window = last_window
+        self.cutoff = cutoff
+        self.metadata = metadata or {}
+        self.num_threads = 0
+
+    def predict(
+        self,
+        fh: int | List[int] | np.ndarray,
+        X: Optional[pd.DataFrame] = None,
+        y: Optional[pd.DataFrame] = None,
+        cutoff: Optional[pd.Period] = None,
+    ) -> pd.DataFrame:
+        """
+        This function performs a recursive forecast for all the series, in the same
+        format as the prediction of the sktime forecasting pipeline.
+
+        Parameters
+        ----------
+        fh: int or List[int] or np.ndarray
+            The forecast horizon in hours after the cutoff, either the number of hours
+            or the relative steps like "np.arange(fh) + 1".
+
+        X: pd.DataFrame or None, default=None
+            Accepted for compatibility with the sktime "predict" function, the model
+            does not use any exogenous features.
+
+        y: pd.DataFrame or None, default=None
+            A dataframe indexed by municipality_num, branch and datetime_dk containing
+            the recent observations of the target feature. If provided, the forecast
+            starts after the last hour of y instead of the stored cutoff.
+
+        cutoff: pd.Period or None, default=None
+            The last hour of the observations in y after which the forecast starts,
+            by default the last hour of y. Series without observations up to the
+            cutoff have missing values in their window. It is ignored if y is None.
+
+        Returns
+        -------
+        pd.DataFrame
+            The prediction indexed by municipality_num, branch and datetime_dk.
+        """
+
+        steps = np.arange(fh) + 1 if np.isscalar(fh) else np.asarray(fh, dtype=int)
+        series_index, last_window, cutoff = (
+            self.series_index,
+            self.last_window,
+            self.cutoff,
+        )
+        if y is not None:
+            # Only the last window of every series is needed for the forecast
+            window_length = self.feature_spec["window_length"]
+            datetime_index = y.index.get_level_values(DATETIME_LEVEL)
+            cutoff = datetime_index.max() if cutoff is None else cutoff
+            y = y[
+                (datetime_index > cutoff - window_length) & (datetime_index <= cutoff)
+            ]
+            panel = build_series_panel(
+                y=y, target_feature=self.feature_spec["target_feature"]
+            ).reindex(
+                pd.period_range(end=cutoff, periods=window_length, freq="H").rename(
+                    DATETIME_LEVEL
+                )
+            )
+            series_index = panel.columns
+            last_window = get_last_window(panel=panel, feature_spec=self.feature_spec)
+
+        prediction = recursive_forecast(
+            predict=partial(self.booster.predict, num_threads=self.num_threads),
+            last_window=last_window,
+            start_datetime=cutoff + 1,
+            fh=int(steps.max()),
+            feature_spec=self.feature_spec,
+            feature_names=self.feature_names,
+        )[:, steps - 1]
+
+        forecast_datetime = pd.PeriodIndex([cutoff + step for step in steps])
+        index = pd.MultiIndex.from_arrays(
+            [
+                np.repeat(series_index.get_level_values(level), len(steps))
+                for level in SERIES_LEVELS
+            ]
+            + [np.tile(forecast_datetime, len(series_index))],
+            names=SERIES_LEVELS + [DATETIME_LEVEL],
+        )
+
+        return pd.DataFrame(
+            {self.feature_spec["target_feature"]: prediction.ravel()}, index=index
+        )
+
+    def update(
+        self,
+        y: pd.DataFrame,
+        X: Optional[pd.DataFrame] = None,
+        update_params: bool = False,
+    ):
+        """
+        This function adds the observations of y after the cutoff to the last window
+        and moves the cutoff to the last hour of y, the booster is not updated.
+        Like the sktime "update" function, X and update_params are only accepted for
+        compatibility.
+        """
+
+        panel = build_series_panel(
+            y=y, target_feature=self.feature_spec["target_feature"]
+        )
+        panel = panel.loc[self.cutoff + 1 :].reindex(columns=self.series_index)
+        if len(panel) == 0:
+            return self
+
+        if panel.index.min() != self.cutoff + 1:
+            raise Exception(
+                f'Observations need to start right after the cutoff "{self.cutoff}", '
+                f'but they start at "{panel.index.min()}".'
+            )
+
+        window_length = self.feature_spec["window_length"]
+        self.last_window = np.concatenate(
+            [self.last_window, panel.to_numpy(dtype="float64").T], axis=1
+        )[:, -window_length:]
+        self.cutoff = panel.index.max()
+
+        return self
+
+
+def build_native_forecaster(
+    booster: lgb.Booster,
+    feature_spec: Dict[str, Any],
+    y: pd.DataFrame,
+    metadata: Optional[Dict[str, Any]] = None,
+) -> NativeForecaster:
+    """
+    This function builds a forecaster from a LightGBM booster and the observations of
+    the target feature, the forecast starts after the last hour of y.
+
+    Parameters
+    ----------
+    booster: lightgbm.Booster
+        The trained LightGBM booster.
+
+    feature_spec: Dict[str, Any]
+        The feature specification generated by "window_features.build_feature_spec".
+
+    y: pd.DataFrame
+        A dataframe indexed by municipality_num, branch and datetime_dk containing the
+        observations of the target feature.
+
+    metadata: Dict[str, Any] or None, default=None
+        A JSON serializable dict saved along with the model artifact, for eg. the
+        training cutoff of the booster.
+
+    Returns
+    -------
+    NativeForecaster
+        A forecaster that can be used like the sktime forecasting pipeline.
+    """
+
+    panel = build_series_panel(y=y, target_feature=feature_spec["target_feature"])
+
+    return NativeForecaster(
+        booster=booster,
+        feature_spec=feature_spec,
+        series_index=panel.columns,
+        last_window=get_last_window(panel=panel, feature_spec=feature_spec),
+        cutoff=panel.index.max(),
+        metadata=metadata,
+    )
+
+
+def save_native_artifact(forecaster: NativeForecaster, artifact_dirpath: Path) -> str:
+    """
+    This function saves a forecaster as a compact native artifact. The artifact
+    contains the LightGBM booster in the native text format, a JSON model specification
+    and the last window of observations of every series as a numpy file.
+
+    Parameters
+    ----------
+    forecaster: NativeForecaster
+        The forecaster that needs to be saved.
+
+    artifact_dirpath: Path
+        The directory where the artifact files are saved.
+
+    Returns
+    -------
+    str
+        The SHA-256 checksum of the artifact.
+    """
+
+    artifact_dirpath = Path(artifact_dirpath)
+    artifact_dirpath.mkdir(parents=True, exist_ok=True)
+
+    forecaster.booster.save_model(artifact_dirpath / BOOSTER_FILENAME)
+    np.save(artifact_dirpath / WINDOW_FILENAME, forecaster.last_window)
+
+    model_spec = {
+        "format_version": ARTIFACT_FORMAT_VERSION,
+        "feature_spec": forecaster.feature_spec,
+        "series": forecaster.series_index.tolist(),
+        "cutoff": str(forecaster.cutoff),
+        "freq": "H",
+        "metadata": forecaster.metadata,
+        "checksums": {
+            filename: compute_file_checksum(artifact_dirpath / filename)
+            for filename in [BOOSTER_FILENAME, WINDOW_FILENAME]
+        },
+    }
+    with open(artifact_dirpath / SPEC_FILENAME, "w") as file:
+        json.dump(model_spec, file, indent=4)
+
+    return compute_artifact_checksum(artifact_dirpath)
+
+
+def save_model_artifact(
+    model,
+    artifact_dirpath: Path,
+    summarize_period: List[int] = [24, 48, 72],
+    target_feature: str = "consumption_kwh",
+    metadata: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    This function saves a fitted sktime LightGBM forecasting pipeline as a compact
+    native artifact, see "save_native_artifact".
+
+    Parameters
+    ----------
+    model
+        A fitted sktime forecasting pipeline built by
+        "model_builder.build_lightgbm_model".
+
+    artifact_dirpath: Path
+        The directory where the artifact files are saved.
+
+    summarize_period: List[int], default=[24, 48, 72]
+        The period at which the window summarizer transformer was applied.
+
+    target_feature: str, default="consumption_kwh"
+        The name of the target feature in the dataset.
+
+    metadata: Dict[str, Any] or None, default=None
+        A JSON serializable dict saved along with the model specification.
+
+    Returns
+    -------
+    str
+        The SHA-256 checksum of the artifact.
+    """
+
+    forecaster = build_native_forecaster(
+        booster=model.steps_[-1][-1].estimator_.booster_,
+        feature_spec=build_feature_spec(
+            summarize_period=summarize_period, target_feature=target_feature
+        ),
+        y=model._y,
+        metadata=metadata,
+    )
+
+    return save_native_artifact(
+        forecaster=forecaster, artifact_dirpath=artifact_dirpath
+    )
+
+
+def is_model_artifact(artifact_dirpath: Path) -> bool:
+    """
+    This function checks whether the directory contains a native model artifact.
+    """
+
+    return all(
+        (Path(artifact_dirpath) / filename).exists()
+        for filename in [BOOSTER_FILENAME, SPEC_FILENAME, WINDOW_FILENAME]
+    )
+
+
+def load_model_artifact(
+    artifact_dirpath: Path, checksum: Optional[str] = None
+) -> NativeForecaster:
+    """
+    This function loads the native model artifact saved by "save_model_artifact" and
+    returns a forecaster, the file checksums are verified while loading.
+
+    Parameters
+    ----------
+    artifact_dirpath: Path
+        The directory containing the artifact files.
+
+    checksum: str or None, default=None
+        The expected SHA-256 checksum of the artifact, for eg. from the model registry.
+
+    Returns
+    -------
+    NativeForecaster
+        A forecaster that can be used like the sktime forecasting pipeline.
+    """
+
+    artifact_dirpath = Path(artifact_dirpath)
+    with open(artifact_dirpath / SPEC_FILENAME) as file:
+        model_spec = json.load(file)
+
+    if model_spec["format_version"] != ARTIFACT_FORMAT_VERSION:
+        raise Exception(
+            f'Model artifact format version "{model_spec["format_version"]}" is not '
+            f'supported, expected version "{ARTIFACT_FORMAT_VERSION}".'
+        )
+
+    for filename, file_checksum in model_spec["checksums"].items():
+        if compute_file_checksum(artifact_dirpath / filename) != file_checksum:
+            raise Exception(f'Model artifact file "{filename}" failed the checksum.')
+
+    if checksum is not None and compute_artifact_checksum(artifact_dirpath) != checksum:
+        raise Exception(
+            f'Model artifact "{artifact_dirpath}" does not match the checksum '
+            f'"{checksum}".'
+        )
+
+    return NativeForecaster(
+        booster=lgb.Booster(model_file=str(artifact_dirpath / BOOSTER_FILENAME)),
+        feature_spec=model_spec["feature_spec"],
+        series_index=pd.MultiIndex.from_tuples(
+            [tuple(series) for series in model_spec["series"]], names=SERIES_LEVELS
+        ),
+        last_window=np.load(artifact_dirpath / WINDOW_FILENAME),
+        cutoff=pd.Period(model_spec["cutoff"], freq=model_spec["freq"]),
+        metadata=model_spec.get("metadata", {}),
+    )
@@ -0,0 +1,527 @@
+import argparse
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Literal, Optional
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+from pydantic import validate_call
+
+import wandb
+from energy_consumption_forecasting.exceptions import log_exception
+from energy_consumption_forecasting.logger import get_logger
+from energy_consumption_forecasting.training_pipeline.data_preprocessing import (
+    load_prepared_dataset_from_feature_store,
+)
+from energy_consumption_forecasting.training_pipeline.utils import init_wandb_run
+from energy_consumption_forecasting.utils import get_env_var
+from energy_consumption_forecasting.window_features import (
+    build_feature_matrix,
+    build_feature_spec,
+    build_series_panel,
+    get_last_window,
+    recursive_forecast,
+)
+
+logger = get_logger(name=Path(__file__).name)
+ROOT_DIRPATH = Path(get_env_var(key="PROJECT_ROOT_DIR_PATH", default_value="."))
+DATA_DIRPATH = ROOT_DIRPATH / "data" / "assets" / "backtesting"
+
+# Data shared with the backtesting worker processes, it is set once per worker
+_BACKTEST_DATA: Dict[str, Any] = {}
+
+
+def generate_cutoffs(
+    datetime_index: pd.PeriodIndex,
+    fh: int = 24,
+    n_folds: int = 7,
+    step: int = 24,
+) -> List[pd.Period]:
+    """
+    This function generates the backtesting cutoffs, i.e. the last hour of the training
+    data of every fold. The last cutoff leaves a full forecast horizon of data for
+    evaluation and the earlier cutoffs are moved back in time by the step size.
+
+    Parameters
+    ----------
+    datetime_index: pd.PeriodIndex
+        The hourly datetime index of the dataset.
+
+    fh: int, default=24
+        A period that indicates the forecast horizon while making prediction in Hours.
+
+    n_folds: int, default=7
+        Number of cutoffs to generate.
+
+    step: int, default=24
+        Number of hours between two consecutive cutoffs.
+
+    Returns
+    -------
+    List[pd.Period]
+        A list of cutoffs sorted from the oldest to the latest.
+    """
+
+    last_cutoff = datetime_index.max() - fh
+
+    return [last_cutoff - step * i for i in reversed(range(n_folds))]
+
+
+def _init_backtest_worker(
+    feature_matrix: pd.DataFrame,
+    target: pd.Series,
+    panel: pd.DataFrame,
+    feature_spec: Dict[str, Any],
+    model_params: Dict[str, Any],
+):
+    """
+    Stores the shared backtesting data in the worker process, with the fork start
+    method the data is inherited from the parent process instead of being copied.
+    """
+
+    _BACKTEST_DATA.update(
+        feature_matrix=feature_matrix,
+        target=target,
+        panel=panel,
+        datetime=feature_matrix.index.get_level_values("datetime_dk"),
+        feature_spec=feature_spec,
+        model_params=model_params,
+    )
+
+
+def _evaluate_cutoff(
+    cutoff: pd.Period,
+    fh: int,
+    window_type: Literal["expanding", "sliding"],
+    window_hours: Optional[int],
+) -> pd.DataFrame:
+    """
+    Trains the model on the rows of the shared feature matrix up to the cutoff and
+    forecasts the next fh hours for all the series, returns the errors in long format.
+    """
+
+    feature_matrix = _BACKTEST_DATA["feature_matrix"]
+    target = _BACKTEST_DATA["target"]
+    panel = _BACKTEST_DATA["panel"]
+    datetime = _BACKTEST_DATA["datetime"]
+    feature_spec = _BACKTEST_DATA["feature_spec"]
+
+    # Slicing the training rows of this fold from the precomputed feature matrix,
+    # the features of a row only use the observations before the row
+    train_mask = datetime <= cutoff
+    if window_type == "sliding":
+        train_mask &= datetime > cutoff - window_hours
+
+    model = lgb.LGBMRegressor(**_BACKTEST_DATA["model_params"])
+    model.fit(feature_matrix[train_mask].to_numpy(), target[train_mask].to_numpy())
+
+    prediction = recursive_forecast(
+        predict=model.predict,
+        last_window=get_last_window(
+            panel=panel, feature_spec=feature_spec, cutoff=cutoff
+        ),
+        start_datetime=cutoff + 1,
+        fh=fh,
+        feature_spec=feature_spec,
+    )
+
+    forecast_datetime = pd.period_range(start=cutoff + 1, periods=fh, freq="H")
+    actual = panel.reindex(forecast_datetime).to_numpy().T
+
+    error_df = pd.DataFrame(
+        {
+            "municipality_num": np.repeat(
+                panel.columns.get_level_values("municipality_num"), fh
+            ),
+            "branch": np.repeat(panel.columns.get_level_values("branch"), fh),
+            "lead": np.tile(np.arange(1, fh + 1), len(panel.columns)),
+            "datetime_dk": np.tile(forecast_datetime, len(panel.columns)),
+            "actual": actual.ravel(),
+            "prediction": prediction.ravel(),
+        }
+    )
+    error_df.insert(loc=0, column="cutoff", value=cutoff)
+    error_df["error"] = error_df["prediction"] - error_df["actual"]
+    error_df["ape"] = np.abs(error_df["error"]) / np.maximum(
+        np.abs(error_df["actual"]), np.finfo(np.float64).eps
+    )
+
+    return error_df
+
+
+def run_backtest(
+    y: pd.DataFrame,
+    cutoffs: List[pd.Period],
+    fh: int = 24,
+    summarize_period: List[int] = [24, 48, 72],
+    model_params: Optional[Dict[str, Any]] = None,
+    window_type: Literal["expanding", "sliding"] = "expanding",
+    window_hours: Optional[int] = None,
+    n_jobs: int = -1,
+    target_feature: str = "consumption_kwh",
+) -> pd.DataFrame:
+    """
+    This function evaluates the LightGBM forecasting model over many cutoffs with
+    a rolling origin. The feature matrix is computed once for the full dataset and
+    sliced for every cutoff, and the cutoffs are evaluated in parallel processes.
+
+    Parameters
+    ----------
+    y: pd.DataFrame
+        A dataframe indexed by municipality_num, branch and datetime_dk containing the
+        target feature.
+
+    cutoffs: List[pd.Period]
+        The last hour of the training data for every fold, see "generate_cutoffs".
+
+    fh: int, default=24
+        A period that indicates the forecast horizon while making prediction in Hours.
+
+    summarize_period: List[int], default=[24, 48, 72]
+        The period at which the window features are computed, see
+        "model_builder.build_lightgbm_model".
+
+    model_params: Dict[str, Any] or None, default=None
+        A dict containing the hyperparameters of the LightGBM model.
+        If None is provided then model is build with default parameters.
+
+    window_type: Literal["expanding", "sliding"], default="expanding"
+        Whether every fold trains on all the data before the cutoff ("expanding") or
+        only on the last window_hours before the cutoff ("sliding").
+
+    window_hours: int or None, default=None
+        The number of training hours for the sliding window, required if window_type
+        is "sliding".
+
+    n_jobs: int, default=-1
+        Number of worker processes, -1 uses all the CPU cores and 1 runs the folds
+        sequentially in the current process.
+
+    target_feature: str, default="consumption_kwh"
+        The name of the target feature in the dataset.
+
+    Returns
+    -------
+    pd.DataFrame
+        The error cube indexed by cutoff, municipality_num, branch and lead containing
+        the actual, prediction, error and absolute percentage error (ape) values.
+    """
+
+    if window_type == "sliding" and window_hours is None:
+        raise Exception('Argument window_hours is required for "sliding" window_type.')
+
+    feature_spec = build_feature_spec(
+        summarize_period=summarize_period, target_feature=target_feature
+    )
+    model_params = dict(model_params or {})
+
+    # Computing the features only once for all the folds
+    feature_matrix, target = build_feature_matrix(y=y, feature_spec=feature_spec)
+    panel = build_series_panel(y=y, target_feature=target_feature)
+    logger.info(
+        f"Feature matrix of shape {feature_matrix.shape} is built for "
+        f"{len(cutoffs)} backtesting cutoffs."
+    )
+
+    n_jobs = min(os.cpu_count() if n_jobs == -1 else n_jobs, len(cutoffs))
+    fold_args = [(cutoff, fh, window_type, window_hours) for cutoff in cutoffs]
+    init_args = (feature_matrix, target, panel, feature_spec, model_params)
+
+    if n_jobs <= 1:
+        _init_backtest_worker(*init_args)
+        results = [_evaluate_cutoff(*args) for args in fold_args]
+        _BACKTEST_DATA.clear()
+    else:
+        # Sharing the CPU cores between the workers to avoid oversubscription
+        model_params.setdefault("n_jobs", max(1, os.cpu_count() // n_jobs))
+        with ProcessPoolExecutor(
+            max_workers=n_jobs,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_backtest_worker,
+            initargs=init_args,
+        ) as executor:
+            results = list(executor.map(_evaluate_cutoff, *zip(*fold_args)))
+
+    error_cube = pd.concat(results, ignore_index=True).set_index(
+        ["cutoff", "municipality_num", "branch", "lead"]
+    )
+
+    return error_cube.sort_index()
+
+
+def summarize_backtest(error_cube: pd.DataFrame) -> pd.DataFrame:
+    """
+    This function summarizes the backtesting error cube into the MAPE and RMSPE of
+    every cutoff and of all the cutoffs together (cutoff "all").
+    """
+
+    percentage_error_df = pd.DataFrame(
+        {"ape": error_cube["ape"], "spe": error_cube["ape"] ** 2},
+        index=error_cube.index,
+    )
+    grouped = percentage_error_df.groupby(level="cutoff")
+
+    summary_df = pd.DataFrame(
+        {"mape": grouped["ape"].mean(), "rmspe": np.sqrt(grouped["spe"].mean())}
+    )
+    summary_df.index = summary_df.index.astype(str)
+    summary_df.loc["all"] = [
+        percentage_error_df["ape"].mean(),
+        np.sqrt(percentage_error_df["spe"].mean()),
+    ]
+
+    return summary_df
+
+
+@log_exception(logger=logger)
+@validate_call
+def run_backtesting_pipeline(
+    fh: int = 24,
+    summarize_period: List[int] = [24, 48, 72],
+    feature_view_name: str = "denmark_energy_consumption_view",
+    feature_view_ver: int = 1,
+    training_dataset_ver: int = 1,
+    target_feature: str = "consumption_kwh",
+    n_folds: int = 7,
+    step: int = 24,
+    window_type: Literal["expanding", "sliding"] = "expanding",
+    window_hours: Optional[int] = None,
+    n_jobs: int = -1,
+    model_name: str = "forecast_model",
+    model_params_or_path: Optional[str | Path | Dict[str, Any]] = None,
+) -> pd.DataFrame:
+    """
+    This function runs the backtesting pipeline, the training dataset is loaded from
+    the feature store and the LightGBM model is evaluated over many cutoffs. The error
+    cube is saved locally as a parquet file and the summary is logged in WandB.
+
+    Parameters
+    ----------
+    fh: int, default=24
+        A period that indicates the forecast horizon while making prediction in Hours.
+
+    summarize_period: List[int], default=[24, 48, 72]
+        The period at which the window features are computed.
+
+    feature_view_name: str, default="denmark_energy_consumption_view"
+        The name of the feature view in the hopsworks feature store.
+
+    feature_view_ver: int, default=1
+        The feature view version that needs to be loaded.
+
+    training_dataset_ver: int, default=1
+        The training dataset version within the feature view that needs to be downloaded.
+
+    target_feature: str, default="consumption_kwh"
+        The name of the target feature in the dataset.
+
+    n_folds: int, default=7
+        Number of backtesting cutoffs.
+
+    step: int, default=24
+        Number of hours between two consecutive cutoffs.
+
+    window_type: Literal["expanding", "sliding"], default="expanding"
+        Training window type of every fold.
+
+    window_hours: int or None, default=None
+        The number of training hours for the sliding window.
+
+    n_jobs: int, default=-1
+        Number of worker processes, -1 uses all the CPU cores.
+
+    model_name: str, default="forecast_model"
+        Name of the model, used to name the saved error cube and WandB run.
+
+    model_params_or_path: str or Path or dict or None, default=None
+        A json file path or dict containing model parameters of LightGBM model.
+        If it contains the key "summarize_period", then that value is used instead
+        of the summarize_period argument.
+
+    Returns
+    -------
+    pd.DataFrame
+        The summary of the backtesting errors for every cutoff.
+    """
+
+    y_train, y_test, _, _ = load_prepared_dataset_from_feature_store(
+        feature_view_name=feature_view_name,
+        feature_view_ver=feature_view_ver,
+        training_dataset_ver=training_dataset_ver,
+        target_feature=target_feature,
+        forecasting_horizon=fh,
+    )
+    y = pd.concat([y_train, y_test]).sort_index()
+
+    if type(model_params_or_path) == str or type(model_params_or_path) == Path:
+        with open(Path(model_params_or_path)) as file:
+            model_params_or_path = json.load(file)
+    model_params = dict(model_params_or_path or {})
+    summarize_period = model_params.pop("summarize_period", summarize_period)
+
+    cutoffs = generate_cutoffs(
+        datetime_index=y.index.get_level_values("datetime_dk"),
+        fh=fh,
+        n_folds=n_folds,
+        step=step,
+    )
+    logger.info(f"Backtesting the model from cutoff {cutoffs[0]} to {cutoffs[-1]}.")
+
+    with init_wandb_run(
+        run_name=f"{model_name}_backtest",
+        add_timestamp_to_run_name=True,
+        job_type="model_backtesting",
+        group="model",
+    ) as run:
+
+        error_cube = run_backtest(
+            y=y,
+            cutoffs=cutoffs,
+            fh=fh,
+            summarize_period=summarize_period,
+            model_params=model_params,
+            window_type=window_type,
+            window_hours=window_hours,
+            n_jobs=n_jobs,
+            target_feature=target_feature,
+        )
+        summary_df = summarize_backtest(error_cube=error_cube)
+        logger.info(f"Backtesting summary:\n{summary_df}")
+
+        # Saving the error cube locally and logging the summary in WandB
+        DATA_DIRPATH.mkdir(parents=True, exist_ok=True)
+        error_cube_filepath = DATA_DIRPATH / f"{model_name}_error_cube.parquet"
+        error_cube.reset_index().astype({"cutoff": str, "datetime_dk": str}).to_parquet(
+            path=error_cube_filepath
+        )
+        logger.info(f"Backtesting error cube is saved at: {error_cube_filepath}")
+
+        run.summary["backtest_mape"] = summary_df.loc["all", "mape"]
+        run.summary["backtest_rmspe"] = summary_df.loc["all", "rmspe"]
+        wandb.log(
+            {
+                f"backtest/{model_name}": wandb.Table(
+                    dataframe=summary_df.reset_index(names="cutoff")
+                )
+            }
+        )
+
+        run.finish()
+
+    return summary_df
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "--fh",
+        type=int,
+        default=24,
+        help="Forecasting horizon period, needs to be in integer format.",
+    )
+
+    parser.add_argument(
+        "--summarize_period",
+        nargs="+",
+        type=int,
+        default=[24, 48, 72],
+        help="Period to summarize the target feature, "
+        "format needs to be in integer and multiple values are accepted.",
+    )
+
+    parser.add_argument(
+        "--views_name",
+        type=str,
+        default="denmark_energy_consumption_view",
+        help="Name of feature view within the feature group, needs to be in string format.",
+    )
+
+    parser.add_argument(
+        "--views_ver",
+        type=int,
+        default=1,
+        help="Version of feature view within the feature group, "
+        "needs to be in integer format.",
+    )
+
+    parser.add_argument(
+        "--dataset_ver",
+        type=int,
+        default=1,
+        help="Version of training dataset within the feature view, "
+        "needs to be in integer format.",
+    )
+
+    parser.add_argument(
+        "--n_folds",
+        type=int,
+        default=7,
+        help="Number of backtesting cutoffs, needs to be in integer format.",
+    )
+
+    parser.add_argument(
+        "--step",
+        type=int,
+        default=24,
+        help="Hours between two backtesting cutoffs, needs to be in integer format.",
+    )
+
+    parser.add_argument(
+        "--window_type",
+        type=str.lower,
+        default="expanding",
+        choices=["expanding", "sliding"],
+        help="Training window of every fold, either expanding or sliding.",
+    )
+
+    parser.add_argument(
+        "--window_hours",
+        type=int,
+        default=None,
+        help="Training hours of the sliding window, needs to be in integer format.",
+    )
+
+    parser.add_argument(
+        "--n_jobs",
+        type=int,
+        default=-1,
+        help="Number of worker processes, -1 uses all the CPU cores.",
+    )
+
+    parser.add_argument(
+        "--model_name",
+        type=str,
+        default="forecast_model",
+        help="Name of the model, needs to be in string format.",
+    )
+
+    parser.add_argument(
+        "--model_params_or_path",
+        type=Path,
+        default=None,
+        help="Relative filepath for JSON file containing the model parameters "
+        "for LightGBM model",
+    )
+
+    args = parser.parse_args()
+
+    run_backtesting_pipeline(
+        fh=args.fh,
+        summarize_period=args.summarize_period,
+        feature_view_name=args.views_name,
+        feature_view_ver=args.views_ver,
+        training_dataset_ver=args.dataset_ver,
+        n_folds=args.n_folds,
+        step=args.step,
+        window_type=args.window_type,
+        window_hours=args.window_hours,
+        n_jobs=args.n_jobs,
+        model_name=args.model_name,
+        model_params_or_path=args.model_params_or_path,
+    )
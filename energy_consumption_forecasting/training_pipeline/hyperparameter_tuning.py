@@ -1,4 +1,5 @@
 import argparse
+import math
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
@@ -30,6 +31,92 @@ ROOT_DIRPATH = Path(get_env_var(key="PROJECT_ROOT_DIR_PATH", default_value="."))
 ASSETS_DIRPATH = ROOT_DIRPATH / "data" / "assets" / "hyperparameter"
 
 
+def subsample_dataset(
+    X_train: pd.DataFrame,
+    y_train: pd.DataFrame,
+    X_test: pd.DataFrame,
+    y_test: pd.DataFrame,
+    series_fraction: float = 1.0,
+    history_days: Optional[int] = None,
+    seed: int = 42,
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    This function reduces the training and testing dataset to a lower fidelity by
+    taking a stratified sample of the municipality_num and branch series and by
+    shortening the training history.
+
+    The series are sampled separately within every branch, so each branch keeps the
+    same share of series. The sampling order is fixed by the seed, which makes the
+    samples nested i.e. a sample with a higher fraction always contains the series of
+    a sample with a lower fraction.
+
+    Parameters
+    ----------
+    X_train: pd.DataFrame
+        A pandas dataframe for training the model not containing the target feature.
+
+    y_train: pd.DataFrame
+        A pandas dataframe for training the model containing the target feature.
+
+    X_test: pd.DataFrame
+        A pandas dataframe for testing the model not containing the target feature.
+
+    y_test: pd.DataFrame
+        A pandas dataframe for testing the model containing the target feature.
+
+    series_fraction: float, default=1.0
+        Fraction of series to keep within every branch, needs to be between 0 and 1.
+
+    history_days: int or None, default=None
+        Number of the most recent days of training data to keep for every series.
+        If None is provided then the full training history is kept.
+
+    seed: int, default=42
+        Seed for the random order in which the series are sampled.
+
+    Returns
+    -------
+    Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]
+        Subsampled dataframe in train and test: (X_train, y_train, X_test, y_test).
+    """
+
+    if not 0 < series_fraction <= 1:
+        raise Exception(
+            f"Series fraction needs to be between 0 and 1, but got: {series_fraction}"
+        )
+
+    if series_fraction < 1:
+        series = y_train.index.droplevel("datetime_dk").unique()
+        rng = np.random.default_rng(seed=seed)
+
+        # Taking the same fraction of series from every branch
+        sampled_series = []
+        for branch in series.get_level_values("branch").unique():
+            branch_series = series[series.get_level_values("branch") == branch]
+            n_samples = math.ceil(series_fraction * len(branch_series))
+            order = rng.permutation(len(branch_series))
+            sampled_series.extend(branch_series[np.sort(order[:n_samples])])
+
+        sampled_series = pd.MultiIndex.from_tuples(
+            sampled_series, names=series.names
+        ).sort_values()
+
+        X_train, y_train, X_test, y_test = (
+            data[data.index.droplevel("datetime_dk").isin(sampled_series)]
+            for data in (X_train, y_train, X_test, y_test)
+        )
+
+    if history_days is not None:
+        train_datetime = y_train.index.get_level_values("datetime_dk")
+        history_start = train_datetime.max() - (history_days * 24 - 1)
+        X_train = X_train[
+            X_train.index.get_level_values("datetime_dk") >= history_start
+        ]
+        y_train = y_train[train_datetime >= history_start]
+
+    return X_train, y_train, X_test, y_test
+
+
 @validate_call(config=dict(arbitrary_types_allowed=True))
 def model_tuning(
     X_train: pd.DataFrame,
@@ -119,6 +206,14 @@ def run_hyperparameter_tuning(
     summarize_period: List[int] = [24, 48, 72],
     n_trials: int = 20,
     save_dir: Path = ASSETS_DIRPATH,
+    multi_fidelity: bool = False,
+    fidelity_levels: List[Tuple[float, Optional[int]]] = [
+        (0.25, 30),
+        (0.5, 90),
+        (1.0, None),
+    ],
+    reduction_factor: int = 3,
+    summarize_period_choices: Optional[List[List[int]]] = None,
 ) -> Tuple[Dict[str, Any], Path]:
     """
     This function tunes the model for finding the best hyperparameters and saves the
@@ -126,9 +221,30 @@ def run_hyperparameter_tuning(
 
     Parameters
     ----------
-    filepath: Path, default='./data/assets/hyperparameter/best_config.json'
-        The filepath to save the configuration as JSON file, the path needs to have a
-        .json extension at the end of the filename.
+    save_dir: Path, default='./data/assets/hyperparameter'
+        The directory to save the configuration as JSON file named
+        "best_config.json".
+
+    multi_fidelity: bool, default=False
+        Whether to run the trials with successive halving. Every trial is first
+        evaluated on the lowest fidelity level and only the promising trials are
+        promoted to the next level, the rest of the trials are pruned.
+
+    fidelity_levels: List[Tuple[float, Optional[int]]],
+    default=[(0.25, 30), (0.5, 90), (1.0, None)]
+        A list of (series_fraction, history_days) from the lowest to the full fidelity,
+        see the function "subsample_dataset" for the meaning of the values.
+        It is ignored if multi_fidelity is False.
+
+    reduction_factor: int, default=3
+        Only the top 1/reduction_factor of the trials at a fidelity level are promoted
+        to the next level. It is ignored if multi_fidelity is False.
+
+    summarize_period_choices: List[List[int]] or None, default=None
+        A list of summarize periods to tune along with the model hyperparameters.
+        If None is provided then the summarize_period argument is used for all the
+        trials. The best summarize period is saved in the best configuration with
+        the key "summarize_period".
     """
 
     logger.info("Getting the dataset from feature store.")
@@ -144,6 +260,26 @@ def run_hyperparameter_tuning(
 
     logger.info("Train and test dataset is available.")
 
+    # Building the dataset for every fidelity level only once, trials share them
+    if multi_fidelity:
+        fidelity_datasets = [
+            subsample_dataset(
+                X_train=X_train,
+                y_train=y_train,
+                X_test=X_test,
+                y_test=y_test,
+                series_fraction=series_fraction,
+                history_days=history_days,
+            )
+            for series_fraction, history_days in fidelity_levels
+        ]
+        logger.info(
+            f"Multi-fidelity tuning is enabled with fidelity levels: {fidelity_levels} "
+            f"and reduction factor: {reduction_factor}"
+        )
+    else:
+        fidelity_datasets = [(X_train, y_train, X_test, y_test)]
+
     def objective(trial: optuna.trial.Trial):
 
         lgbm_params = {
@@ -156,15 +292,39 @@ def run_hyperparameter_tuning(
             "bagging_freq": trial.suggest_int("bagging_freq", 1, 1),
         }
 
-        error = model_tuning(
-            X_train=X_train,
-            y_train=y_train,
-            X_test=X_test,
-            y_test=y_test,
-            fh=forecasting_horizon,
-            summarize_period=summarize_period,
-            model_params=lgbm_params,
-        )
+        trial_summarize_period = summarize_period
+        if summarize_period_choices is not None:
+            trial_summarize_period = [
+                int(i)
+                for i in trial.suggest_categorical(
+                    "summarize_period",
+                    [",".join(map(str, i)) for i in summarize_period_choices],
+                ).split(",")
+            ]
+
+        # Evaluating the trial from the lowest to the full fidelity, the pruner stops
+        # the trial at the first level where it falls behind the other trials
+        for level, (X_fid, y_fid, X_test_fid, y_test_fid) in enumerate(
+            fidelity_datasets
+        ):
+            error = model_tuning(
+                X_train=X_fid,
+                y_train=y_fid,
+                X_test=X_test_fid,
+                y_test=y_test_fid,
+                fh=forecasting_horizon,
+                summarize_period=trial_summarize_period,
+                model_params=lgbm_params,
+            )
+
+            if multi_fidelity and level < len(fidelity_datasets) - 1:
+                trial.report(value=error, step=reduction_factor**level)
+                if trial.should_prune():
+                    logger.info(
+                        f"Trial {trial.number} is pruned at fidelity level {level} "
+                        f"with MAPE error: {error}"
+                    )
+                    raise optuna.TrialPruned()
 
         return error
 
@@ -181,27 +341,44 @@ def run_hyperparameter_tuning(
         )
 
         # Using optuna to find the best hyperparameters and tracking it with WandB
-        study = optuna.create_study(direction="minimize")
+        pruner = (
+            optuna.pruners.SuccessiveHalvingPruner(
+                min_resource=1, reduction_factor=reduction_factor
+            )
+            if multi_fidelity
+            else None
+        )
+        study = optuna.create_study(direction="minimize", pruner=pruner)
         study.optimize(objective, n_trials=n_trials)
 
+        # Converting the tuned summarize period back into a list of integers
+        best_params = dict(study.best_params)
+        if "summarize_period" in best_params:
+            best_params["summarize_period"] = [
+                int(i) for i in best_params["summarize_period"].split(",")
+            ]
+
         # saving the best params locally and also logging it as an artifact
         filepath = save_dir / "best_config.json"
         Path(filepath).parent.mkdir(parents=True, exist_ok=True)
-        save_json_data(data=study.best_params, filepath=filepath)
+        save_json_data(data=best_params, filepath=filepath)
 
         artifact = wandb.Artifact(
-            name="best_config", type="model", metadata=study.best_params
+            name="best_config", type="model", metadata=best_params
         )
         artifact.add_file(local_path=filepath)
         run.log_artifact(artifact)
 
-        logger.info(f"Best params for the LightGBM model is: {study.best_params}")
+        logger.info(f"Best params for the LightGBM model is: {best_params}")
         logger.info(
             f'Hyperparameters has been saved to filepath: "{filepath}" and '
             "Artifact best_config has been logged successfully"
         )
 
         run.summary["best_mape"] = study.best_value
+        run.summary["pruned_trials"] = len(
+            study.get_trials(deepcopy=False, states=[optuna.trial.TrialState.PRUNED])
+        )
 
         run.log(
             {
@@ -213,7 +390,7 @@ def run_hyperparameter_tuning(
 
         run.finish()
 
-    return study.best_params, filepath
+    return best_params, filepath
 
 
 if __name__ == "__main__":
@@ -281,8 +458,29 @@ if __name__ == "__main__":
         "JSON file, argument needs to have a .json extension.",
     )
 
+    parser.add_argument(
+        "--multi_fidelity",
+        action="store_true",
+        help="Run the trials with successive halving on subsampled series and "
+        "history, only the promising trials are evaluated on the full dataset.",
+    )
+
+    parser.add_argument(
+        "--summarize_period_choices",
+        nargs="+",
+        default=None,
+        help="Summarize periods to tune along with the model hyperparameters, "
+        "format needs to be comma separated integers, eg. 24,48,72 24,168",
+    )
+
     args = parser.parse_args()
 
+    summarize_period_choices = args.summarize_period_choices
+    if summarize_period_choices is not None:
+        summarize_period_choices = [
+            [int(i) for i in choice.split(",")] for choice in summarize_period_choices
+        ]
+
     filepath = run_hyperparameter_tuning(
         feature_view_name=args.views_name,
         feature_view_ver=args.views_ver,
@@ -292,6 +490,8 @@ if __name__ == "__main__":
         summarize_period=args.summarize_period,
         n_trials=args.n_trials,
         save_filepath=args.save_filepath,
+        multi_fidelity=args.multi_fidelity,
+        summarize_period_choices=summarize_period_choices,
     )
 
     print(f"Model params JSON filepath: {filepath}")
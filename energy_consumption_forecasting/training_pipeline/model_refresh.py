@@ -0,0 +1,231 @@
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import lightgbm as lgb
+import pandas as pd
+
+from energy_consumption_forecasting.inference_pipeline.model_cache import (
+    get_cached_model_path,
+)
+from energy_consumption_forecasting.inference_pipeline.utils import get_gcs_bucket
+from energy_consumption_forecasting.logger import get_logger
+from energy_consumption_forecasting.model_artifact import (
+    NativeForecaster,
+    build_native_forecaster,
+    is_model_artifact,
+    load_model_artifact,
+)
+from energy_consumption_forecasting.utils import get_env_var
+from energy_consumption_forecasting.window_features import (
+    DATETIME_LEVEL,
+    build_feature_matrix,
+)
+
+logger = get_logger(name=Path(__file__).name)
+
+import hopsworks
+
+
+def select_training_window(
+    y_train: pd.DataFrame,
+    X_train: pd.DataFrame,
+    window_days: int,
+    window_length: int = 72,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    This function keeps only the most recent "window_days" of the training dataset,
+    along with the "window_length" hours needed to compute the window features of the
+    first training hour. This bounds the training time of a sliding window refit.
+
+    Parameters
+    ----------
+    y_train: pd.DataFrame
+        A dataframe indexed by municipality_num, branch and datetime_dk containing the
+        target feature.
+
+    X_train: pd.DataFrame
+        A dataframe with the same index as y_train not containing the target feature.
+
+    window_days: int
+        Number of days of training data to keep.
+
+    window_length: int, default=72
+        Number of past hours needed to compute the window features.
+
+    Returns
+    -------
+    Tuple[pd.DataFrame, pd.DataFrame]
+        The y_train and X_train dataframes of the sliding window.
+    """
+
+    datetime_index = y_train.index.get_level_values(DATETIME_LEVEL)
+    start_datetime = datetime_index.max() - (window_days * 24 + window_length)
+    is_window = datetime_index > start_datetime
+
+    return y_train[is_window], X_train[X_train.index.isin(y_train.index[is_window])]
+
+
+def load_previous_forecaster(
+    model_name: str = "forecast_model",
+    model_version: int = 1,
+) -> Optional[NativeForecaster]:
+    """
+    This function loads the currently registered model from the hopsworks model
+    registry through the local model cache, None is returned if the model is not found
+    or it is not a native model artifact.
+    """
+
+    try:
+        project = hopsworks.login(
+            project=get_env_var(key="FEATURE_STORE_PROJECT_NAME"),
+            api_key_value=get_env_var(key="FEATURE_STORE_API_KEY"),
+        )
+        model_path = get_cached_model_path(
+            project=project,
+            model_name=model_name,
+            model_version=model_version,
+            revalidate_after=0,
+            bucket=get_gcs_bucket(),
+        )
+    except Exception as e:
+        logger.info(f"Previous model could not be loaded from the model registry: {e}")
+        return None
+
+    if not is_model_artifact(model_path):
+        logger.info("Previous model is not a native model artifact.")
+        return None
+
+    return load_model_artifact(artifact_dirpath=model_path, checksum=model_path.name)
+
+
+def is_full_retrain_due(
+    forecaster: NativeForecaster,
+    training_cutoff: pd.Period,
+    full_retrain_every_days: int = 7,
+) -> bool:
+    """
+    This function checks whether the last full retraining of the forecaster is older
+    than "full_retrain_every_days" days of data, or the forecaster has no refresh
+    metadata.
+    """
+
+    full_retrain_cutoff = forecaster.metadata.get("full_retrain_cutoff")
+    if full_retrain_cutoff is None or "training_cutoff" not in forecaster.metadata:
+        return True
+
+    full_retrain_cutoff = pd.Period(full_retrain_cutoff, freq="H")
+    return (training_cutoff - full_retrain_cutoff).n >= full_retrain_every_days * 24
+
+
+def is_drift_detected(
+    metrics_dict: Dict[str, float],
+    refresh_metadata: Dict[str, Any],
+    drift_tolerance: float = 0.25,
+) -> bool:
+    """
+    This function detects a drift when the MAPE of an incrementally refreshed model is
+    more than "drift_tolerance" above the MAPE of the last fully retrained model.
+    """
+
+    baseline_mape = refresh_metadata.get("baseline_mape")
+    if baseline_mape is None:
+        return False
+
+    return metrics_dict["mape"] > baseline_mape * (1 + drift_tolerance)
+
+
+def refresh_model_incrementally(
+    y_train: pd.DataFrame,
+    model_params: Dict[str, Any],
+    model_name: str = "forecast_model",
+    model_version: int = 1,
+    n_estimators: int = 50,
+    full_retrain_every_days: int = 7,
+) -> Tuple[Optional[NativeForecaster], Dict[str, Any]]:
+    """
+    This function refreshes the registered LightGBM model with the training hours that
+    arrived after its last training. The boosting continues from the previous booster
+    (init_model) with "n_estimators" new trees on the new hours only, so the training
+    time does not grow with the history.
+
+    A full retraining is required, and None is returned instead of a forecaster, when
+    there is no previous native model or the last full retraining is older than
+    "full_retrain_every_days".
+
+    Parameters
+    ----------
+    y_train: pd.DataFrame
+        A dataframe indexed by municipality_num, branch and datetime_dk containing the
+        target feature of the training dataset.
+
+    model_params: Dict[str, Any]
+        A dict containing the hyperparameters of the LightGBM model.
+
+    model_name: str, default="forecast_model"
+        Name of the registered model.
+
+    model_version: int, default=1
+        Version of the registered model.
+
+    n_estimators: int, default=50
+        Number of boosting rounds added on the new hours.
+
+    full_retrain_every_days: int, default=7
+        Number of days of data after which a full retraining is required.
+
+    Returns
+    -------
+    Tuple[NativeForecaster or None, Dict[str, Any]]
+        The refreshed forecaster with the cutoff at the end of y_train, or None if a full
+        retraining is required, and the refresh metadata of the previous model.
+    """
+
+    training_cutoff = y_train.index.get_level_values(DATETIME_LEVEL).max()
+
+    previous_forecaster = load_previous_forecaster(
+        model_name=model_name, model_version=model_version
+    )
+    if previous_forecaster is None:
+        return None, {}
+
+    refresh_metadata = dict(previous_forecaster.metadata)
+    if is_full_retrain_due(
+        forecaster=previous_forecaster,
+        training_cutoff=training_cutoff,
+        full_retrain_every_days=full_retrain_every_days,
+    ):
+        logger.info("Full retraining of the model is due.")
+        return None, refresh_metadata
+
+    # Building the features of the new hours, with the past hours needed for the windows
+    feature_spec = previous_forecaster.feature_spec
+    previous_cutoff = pd.Period(refresh_metadata["training_cutoff"], freq="H")
+    datetime_index = y_train.index.get_level_values(DATETIME_LEVEL)
+    y_recent = y_train[datetime_index > previous_cutoff - feature_spec["window_length"]]
+    feature_matrix, target = build_feature_matrix(y=y_recent, feature_spec=feature_spec)
+    is_new = feature_matrix.index.get_level_values(DATETIME_LEVEL) > previous_cutoff
+
+    booster = previous_forecaster.booster
+    if is_new.any():
+        model = lgb.LGBMRegressor(**{**model_params, "n_estimators": n_estimators})
+        model.fit(
+            feature_matrix.loc[is_new, previous_forecaster.feature_names],
+            target[is_new],
+            init_model=booster,
+        )
+        booster = model.booster_
+        logger.info(
+            f"Model is refreshed incrementally on {is_new.sum()} new rows from "
+            f'"{previous_cutoff + 1}" to "{training_cutoff}".'
+        )
+    else:
+        logger.info("No new training hours, the previous booster is reused.")
+
+    forecaster = build_native_forecaster(
+        booster=booster,
+        feature_spec=feature_spec,
+        y=y_recent,
+        metadata=refresh_metadata,
+    )
+
+    return forecaster, refresh_metadata
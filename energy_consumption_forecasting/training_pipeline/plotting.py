@@ -0,0 +1,371 @@
+import argparse
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Tuple
+
+import matplotlib
+import pandas as pd
+from pydantic import validate_call
+
+import wandb
+from energy_consumption_forecasting.exceptions import log_exception
+from energy_consumption_forecasting.logger import get_logger
+from energy_consumption_forecasting.training_pipeline.utils import init_wandb_run
+from energy_consumption_forecasting.utils import get_env_var
+
+logger = get_logger(name=Path(__file__).name)
+ROOT_DIRPATH = Path(get_env_var(key="PROJECT_ROOT_DIR_PATH", default_value="."))
+DATA_DIRPATH = ROOT_DIRPATH / "data" / "assets" / "training"
+
+EVALUATION_DATA_FILENAMES = {
+    "y_test": "y_test.parquet",
+    "y_pred": "y_pred.parquet",
+    "grouped_result_df": "grouped_result.parquet",
+}
+
+
+def _init_plot_worker():
+    """
+    Selects the non-interactive Agg backend in the worker process, the plots are only
+    rendered into PNG files.
+    """
+
+    matplotlib.use("Agg")
+
+
+def plot_series_prediction(
+    y_test_data: pd.Series,
+    y_pred_data: pd.Series,
+    municipality_num: int,
+    branch: int,
+    filepath: Path,
+) -> Path:
+    """
+    This function plots the actual and prediction data of a single series and saves
+    the plot as a PNG file.
+    """
+
+    import matplotlib.pyplot as plt
+    from sktime.utils.plotting import plot_series
+
+    fig, axs = plot_series(
+        y_test_data,
+        y_pred_data,
+        labels=["Actual - y_test", "Prediction - y_pred"],
+        markers=["", ""],
+    )
+    fig.suptitle(f"Municipality Num: {municipality_num} - Branch: {branch}\n")
+    fig.savefig(filepath)
+    plt.close(fig)
+
+    return filepath
+
+
+def plot_metrics_result(grouped_result_df: pd.DataFrame, filepath: Path) -> Path:
+    """
+    This function plots the MAPE and RMSPE of every municipality_num and branch as a bar
+    chart and saves the plot as a PNG file.
+    """
+
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    fig, axs = plt.subplots(2, 1, figsize=(25, 25))
+    fig.suptitle(
+        t="Quantitative Performance Metrics: MAPE and RMSPE\n\n",
+        weight="bold",
+        size=25,
+    )
+
+    for i, metrics in enumerate(["mape", "rmspe"]):
+        sns.barplot(
+            data=grouped_result_df,
+            x="municipality_num",
+            y=metrics,
+            hue="branch",
+            palette="Set1",
+            ax=axs[i],
+        )
+        axs[i].set_xticks(axs[i].get_xticks())
+        axs[i].set_xticklabels(
+            grouped_result_df.municipality_num.unique(), rotation=90, size=12
+        )
+        axs[i].tick_params(axis="y", labelsize=12)
+        axs[i].set_xlabel("Municipality Number\n", size=20)
+        axs[i].set_ylabel(f"{metrics.upper()}", size=20)
+        axs[i].legend(
+            title="Branch",
+            title_fontsize=15,
+            fontsize=12,
+        )
+    fig.tight_layout()
+    fig.savefig(filepath)
+    plt.close(fig)
+
+    return filepath
+
+
+def render_evaluation_plots(
+    y_test: pd.DataFrame,
+    y_pred: pd.DataFrame,
+    grouped_result_df: pd.DataFrame,
+    save_dirpath: Path,
+    target_feature: str = "consumption_kwh",
+    n_jobs: int = -1,
+) -> List[Path]:
+    """
+    This function renders the actual and prediction plot of every series and the
+    metrics result plot in parallel processes with the Agg backend.
+
+    Parameters
+    ----------
+    y_test: pd.DataFrame
+        A dataframe indexed by municipality_num, branch and datetime_dk containing the
+        actual values of the target feature.
+
+    y_pred: pd.DataFrame
+        A dataframe with the same index as y_test containing the predicted values of
+        the target feature.
+
+    grouped_result_df: pd.DataFrame
+        A dataframe containing the municipality_num, branch, mape and rmspe of every
+        series.
+
+    save_dirpath: Path
+        The directory where the plots are saved.
+
+    target_feature: str, default="consumption_kwh"
+        The name of the target feature in the dataset.
+
+    n_jobs: int, default=-1
+        Number of worker processes, -1 uses all the CPU cores and 1 renders the plots
+        sequentially in the current process.
+
+    Returns
+    -------
+    List[Path]
+        The filepaths of the saved plots, named as
+        "pred_plot_<municipality_num>_<branch>.png" and "metrics_result.png".
+    """
+
+    save_dirpath.mkdir(parents=True, exist_ok=True)
+    y_pred_group = y_pred[target_feature].groupby(level=["municipality_num", "branch"])
+
+    plot_args: List[Tuple] = []
+    for (m_num, branch), y_test_data in y_test[target_feature].groupby(
+        level=["municipality_num", "branch"]
+    ):
+        plot_args.append(
+            (
+                y_test_data.droplevel(level=[0, 1]),
+                y_pred_group.get_group((m_num, branch)).droplevel(level=[0, 1]),
+                m_num,
+                branch,
+                save_dirpath / f"pred_plot_{m_num}_{branch}.png",
+            )
+        )
+
+    n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+    metrics_filepath = save_dirpath / "metrics_result.png"
+
+    if n_jobs <= 1:
+        _init_plot_worker()
+        plot_filepaths = [plot_series_prediction(*args) for args in plot_args]
+        plot_filepaths.append(plot_metrics_result(grouped_result_df, metrics_filepath))
+    else:
+        with ProcessPoolExecutor(
+            max_workers=n_jobs,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_plot_worker,
+        ) as executor:
+            # The large metrics plot is started first to overlap with the series plots
+            metrics_future = executor.submit(
+                plot_metrics_result, grouped_result_df, metrics_filepath
+            )
+            plot_filepaths = list(
+                executor.map(
+                    plot_series_prediction,
+                    *zip(*plot_args),
+                    chunksize=max(1, len(plot_args) // (n_jobs * 4)),
+                )
+            )
+            plot_filepaths.append(metrics_future.result())
+
+    logger.info(
+        f'{len(plot_filepaths)} plots are saved in the directory: "{save_dirpath}"'
+    )
+
+    return plot_filepaths
+
+
+def log_plots_to_wandb(plot_filepaths: List[Path]):
+    """
+    This function uploads all the plots to WandB in a single log call.
+    """
+
+    wandb.log(
+        {filepath.stem: wandb.Image(str(filepath)) for filepath in plot_filepaths}
+    )
+    logger.info(f"{len(plot_filepaths)} plots are logged in the WandB.")
+
+
+def save_evaluation_data(
+    y_test: pd.DataFrame,
+    y_pred: pd.DataFrame,
+    grouped_result_df: pd.DataFrame,
+    save_dirpath: Path,
+) -> List[Path]:
+    """
+    This function saves the evaluation data as parquet files, so that the plots can be
+    rendered later by "run_plotting_pipeline" outside of the training.
+    """
+
+    save_dirpath.mkdir(parents=True, exist_ok=True)
+
+    filepaths = []
+    for key, data in zip(
+        EVALUATION_DATA_FILENAMES, [y_test, y_pred, grouped_result_df]
+    ):
+        filepath = save_dirpath / EVALUATION_DATA_FILENAMES[key]
+        if "datetime_dk" in data.index.names:
+            data = data.reset_index(level="datetime_dk")
+            data["datetime_dk"] = data["datetime_dk"].dt.to_timestamp()
+        data.to_parquet(filepath)
+        filepaths.append(filepath)
+
+    return filepaths
+
+
+def load_evaluation_data(save_dirpath: Path) -> List[pd.DataFrame]:
+    """
+    This function loads the evaluation data saved by "save_evaluation_data" and returns
+    the y_test, y_pred and grouped_result_df dataframes.
+    """
+
+    data_list = []
+    for filename in EVALUATION_DATA_FILENAMES.values():
+        data = pd.read_parquet(save_dirpath / filename)
+        if "datetime_dk" in data.columns:
+            data["datetime_dk"] = data["datetime_dk"].dt.to_period(freq="H")
+            data = data.set_index("datetime_dk", append=True)
+        data_list.append(data)
+
+    return data_list
+
+
+@log_exception(logger=logger)
+@validate_call
+def run_plotting_pipeline(
+    model_name: str = "forecast_model",
+    model_id_or_ver: int = 1,
+    target_feature: str = "consumption_kwh",
+    n_jobs: int = -1,
+) -> List[Path]:
+    """
+    This function renders and logs the evaluation plots of a trained model, it is used
+    when the plots were deferred during the training pipeline. The evaluation data is
+    read from the local directory or else downloaded from the WandB artifact
+    "<model_name>_<model_id_or_ver>_evaluation_data".
+
+    Parameters
+    ----------
+    model_name: str, default="forecast_model"
+        Name of the model that was provided to the training pipeline.
+
+    model_id_or_ver: int, default=1
+        Version or ID of the model that was provided to the training pipeline.
+
+    target_feature: str, default="consumption_kwh"
+        The name of the target feature in the dataset.
+
+    n_jobs: int, default=-1
+        Number of worker processes, -1 uses all the CPU cores.
+
+    Returns
+    -------
+    List[Path]
+        The filepaths of the saved plots.
+    """
+
+    save_dirpath = DATA_DIRPATH / f"{model_name}_{model_id_or_ver}"
+
+    with init_wandb_run(
+        run_name=f"{model_name}_{model_id_or_ver}_plots",
+        add_timestamp_to_run_name=True,
+        job_type="model_evaluation_plots",
+        group="model",
+    ) as run:
+
+        data_dirpath = save_dirpath
+        if not all(
+            (save_dirpath / filename).exists()
+            for filename in EVALUATION_DATA_FILENAMES.values()
+        ):
+            artifact = run.use_artifact(
+                artifact_or_name=f"{model_name}_{model_id_or_ver}_evaluation_data:latest",
+                type="dataset",
+            )
+            data_dirpath = Path(artifact.download())
+
+        y_test, y_pred, grouped_result_df = load_evaluation_data(data_dirpath)
+        logger.info(f'Evaluation data is loaded from the directory: "{data_dirpath}"')
+
+        plot_filepaths = render_evaluation_plots(
+            y_test=y_test,
+            y_pred=y_pred,
+            grouped_result_df=grouped_result_df,
+            save_dirpath=save_dirpath,
+            target_feature=target_feature,
+            n_jobs=n_jobs,
+        )
+        log_plots_to_wandb(plot_filepaths)
+
+        run.finish()
+
+    return plot_filepaths
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "--model_name",
+        type=str,
+        default="forecast_model",
+        help="Name of the model for the training experiment, needs to be in "
+        "string format.",
+    )
+
+    parser.add_argument(
+        "--model_ver",
+        type=int,
+        default=1,
+        help="Model version or id for the training experiment, "
+        "needs to be in integer format.",
+    )
+
+    parser.add_argument(
+        "--target_feature",
+        type=str,
+        default="consumption_kwh",
+        help="Name of target feature, needs to be in string format.",
+    )
+
+    parser.add_argument(
+        "--n_jobs",
+        type=int,
+        default=-1,
+        help="Number of worker processes, -1 uses all the CPU cores.",
+    )
+
+    args = parser.parse_args()
+
+    run_plotting_pipeline(
+        model_name=args.model_name,
+        model_id_or_ver=args.model_ver,
+        target_feature=args.target_feature,
+        n_jobs=args.n_jobs,
+    )
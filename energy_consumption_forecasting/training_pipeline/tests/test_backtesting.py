@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from energy_consumption_forecasting.training_pipeline.backtesting import (
+    generate_cutoffs,
+    run_backtest,
+    summarize_backtest,
+)
+from energy_consumption_forecasting.training_pipeline.model_builder import (
+    build_lightgbm_model,
+)
+from energy_consumption_forecasting.window_features import (
+    build_feature_spec,
+    build_series_panel,
+    get_last_window,
+    recursive_forecast,
+)
+
+MODEL_PARAMS = {"n_estimators": 20, "n_jobs": 1, "verbose": -1}
+
+
+# Creating a dummy hierarchical dataset with a daily pattern for testing the functions
+@pytest.fixture
+def get_dataset():
+    datetime_range = pd.period_range("2024-01-01 00:00", periods=24 * 12, freq="H")
+    index = pd.MultiIndex.from_product(
+        [[101, 147], [1, 2], datetime_range],
+        names=["municipality_num", "branch", "datetime_dk"],
+    )
+    rng = np.random.default_rng(seed=42)
+    hours = index.get_level_values("datetime_dk").hour.to_numpy()
+    consumption = (
+        100 + 20 * np.sin(2 * np.pi * hours / 24) + rng.normal(size=len(hours))
+    )
+    y = pd.DataFrame({"consumption_kwh": consumption}, index=index)
+    X = pd.DataFrame(index=index)
+    return X, y
+
+
+def test_recursive_forecast_matches_sktime_pipeline(get_dataset):
+    """
+    In this test the native recursive forecast is compared to the prediction of the
+    fitted sktime forecasting pipeline.
+    """
+
+    X, y = get_dataset
+    model = build_lightgbm_model(summarize_period=[24, 48], model_params=MODEL_PARAMS)
+    model.fit(y=y, X=X)
+
+    last_datetime = y.index.get_level_values("datetime_dk").max()
+    forecast_datetime = pd.period_range(start=last_datetime + 1, periods=24, freq="H")
+    series = y.index.droplevel("datetime_dk").unique()
+    X_forecast = pd.DataFrame(
+        index=pd.MultiIndex.from_tuples(
+            [(*s, dt) for s in series for dt in forecast_datetime], names=y.index.names
+        )
+    )
+    sktime_prediction = model.predict(X=X_forecast, fh=np.arange(1, 25))
+
+    booster = model.steps_[-1][-1].estimator_.booster_
+    feature_spec = build_feature_spec(summarize_period=[24, 48])
+    prediction = recursive_forecast(
+        predict=booster.predict,
+        last_window=get_last_window(build_series_panel(y), feature_spec),
+        start_datetime=last_datetime + 1,
+        fh=24,
+        feature_spec=feature_spec,
+        feature_names=booster.feature_name(),
+    )
+
+    np.testing.assert_allclose(
+        prediction.ravel(), sktime_prediction["consumption_kwh"].to_numpy()
+    )
+
+
+def test_run_backtest(get_dataset):
+    """
+    In this test the error cube contains a row for every cutoff, series and lead and
+    the parallel backtest returns the same result as the sequential backtest.
+    """
+
+    _, y = get_dataset
+    cutoffs = generate_cutoffs(y.index.get_level_values("datetime_dk"), n_folds=3)
+
+    assert cutoffs[-1] == y.index.get_level_values("datetime_dk").max() - 24
+    assert cutoffs[1] == cutoffs[0] + 24
+
+    error_cube = run_backtest(
+        y=y, cutoffs=cutoffs, summarize_period=[24, 48], model_params=MODEL_PARAMS
+    )
+    sequential_cube = run_backtest(
+        y=y,
+        cutoffs=cutoffs,
+        summarize_period=[24, 48],
+        model_params=MODEL_PARAMS,
+        n_jobs=1,
+    )
+
+    assert list(error_cube.index.names) == [
+        "cutoff",
+        "municipality_num",
+        "branch",
+        "lead",
+    ]
+    assert len(error_cube) == 3 * 4 * 24
+    assert error_cube["prediction"].notna().all()
+    pd.testing.assert_frame_equal(error_cube, sequential_cube)
+
+    summary_df = summarize_backtest(error_cube)
+    assert list(summary_df.index) == [str(cutoff) for cutoff in cutoffs] + ["all"]
+
+    with pytest.raises(Exception) as exe_info:
+        run_backtest(y=y, cutoffs=cutoffs, window_type="sliding")
+
+    assert "window_hours is required" in str(exe_info.value)
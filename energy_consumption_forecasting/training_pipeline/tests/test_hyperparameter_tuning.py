@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from energy_consumption_forecasting.training_pipeline.hyperparameter_tuning import (
+    subsample_dataset,
+)
+
+
+# Creating a dummy hierarchical dataset for testing the functions
+@pytest.fixture
+def get_dataset():
+    datetime_range = pd.period_range("2024-01-01 00:00", periods=24 * 10, freq="H")
+    index = pd.MultiIndex.from_product(
+        [[101, 147, 151, 153], [1, 2, 3], datetime_range],
+        names=["municipality_num", "branch", "datetime_dk"],
+    )
+    y = pd.DataFrame({"consumption_kwh": np.arange(len(index), dtype="float64")}, index)
+    X = pd.DataFrame(index=index)
+
+    is_test = index.get_level_values("datetime_dk") > datetime_range[-25]
+    return X[~is_test], y[~is_test], X[is_test], y[is_test]
+
+
+def test_subsample_dataset_series(get_dataset):
+    """
+    In this test the series are sampled with the same share in every branch and the
+    samples of a lower fraction are contained in the samples of a higher fraction.
+    """
+
+    sampled_series = []
+    for series_fraction in [0.25, 0.5, 1.0]:
+        X_train, y_train, X_test, y_test = subsample_dataset(
+            *get_dataset, series_fraction=series_fraction
+        )
+        series = set(y_train.index.droplevel("datetime_dk").unique())
+
+        assert len(X_train) == len(y_train) and len(X_test) == len(y_test)
+        assert series == set(y_test.index.droplevel("datetime_dk").unique())
+        assert len(series) == 12 * series_fraction
+        assert {branch for _, branch in series} == {1, 2, 3}
+        sampled_series.append(series)
+
+    assert sampled_series[0] <= sampled_series[1] <= sampled_series[2]
+
+
+def test_subsample_dataset_history(get_dataset):
+    """
+    In this test only the most recent days of the training history are kept.
+    """
+
+    X_train, y_train, X_test, y_test = subsample_dataset(*get_dataset, history_days=2)
+
+    assert y_train.groupby(["municipality_num", "branch"]).size().unique() == [48]
+    assert len(X_train) == len(y_train)
+    assert len(y_test) == len(get_dataset[3])
+
+    with pytest.raises(Exception) as exe_info:
+        subsample_dataset(*get_dataset, series_fraction=0)
+
+    assert "Series fraction needs to be between 0 and 1" in str(exe_info.value)
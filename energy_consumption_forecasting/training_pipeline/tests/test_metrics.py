@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sktime.performance_metrics.forecasting import (
+    mean_absolute_percentage_error,
+    mean_squared_percentage_error,
+)
+
+from energy_consumption_forecasting.metrics import (
+    compute_grouped_metrics,
+    compute_segment_metrics,
+)
+
+
+# Creating a dummy hierarchical actual and prediction dataset for testing the metrics
+@pytest.fixture
+def get_dataset():
+    datetime_range = pd.period_range("2024-01-01 00:00", periods=48, freq="H")
+    index = pd.MultiIndex.from_product(
+        [[101, 147, 151], [1, 2], datetime_range],
+        names=["municipality_num", "branch", "datetime_dk"],
+    )
+    rng = np.random.default_rng(seed=42)
+    actual = rng.uniform(low=1, high=100, size=len(index))
+    actual[10] = 0
+    y_true = pd.DataFrame({"consumption_kwh": actual}, index=index)
+    y_pred = pd.DataFrame(
+        {"consumption_kwh": actual + rng.normal(size=len(index))}, index=index
+    )
+    return y_true, y_pred
+
+
+def test_compute_grouped_metrics(get_dataset):
+    """
+    In this test the vectorized metrics are compared with the sktime metrics for the
+    overall and for every municipality_num and branch series.
+    """
+
+    y_true, y_pred = get_dataset
+    result_dict, grouped_result_df = compute_grouped_metrics(
+        y_true=y_true, y_pred=y_pred.sample(frac=1, random_state=42)
+    )
+
+    np.testing.assert_allclose(
+        result_dict["mape"],
+        mean_absolute_percentage_error(y_true=y_true, y_pred=y_pred, symmetric=False),
+    )
+    np.testing.assert_allclose(
+        result_dict["rmspe"],
+        mean_squared_percentage_error(y_true=y_true, y_pred=y_pred, square_root=True),
+    )
+
+    assert len(grouped_result_df) == 6
+    for row in grouped_result_df.itertuples():
+        y_true_group = y_true.loc[(row.municipality_num, row.branch)]
+        y_pred_group = y_pred.loc[(row.municipality_num, row.branch)]
+
+        np.testing.assert_allclose(
+            row.mape,
+            mean_absolute_percentage_error(
+                y_true=y_true_group, y_pred=y_pred_group, symmetric=False
+            ),
+        )
+        np.testing.assert_allclose(
+            row.rmspe,
+            mean_squared_percentage_error(
+                y_true=y_true_group, y_pred=y_pred_group, square_root=True
+            ),
+        )
+
+    with pytest.raises(Exception) as exe_info:
+        compute_grouped_metrics(y_true=y_true, y_pred=y_pred.iloc[1:])
+
+    assert "not aligned" in str(exe_info.value)
+
+
+def test_compute_segment_metrics(get_dataset):
+    """
+    In this test the hourly metrics of the monitoring are compared with the sktime
+    metrics of every hour, only the predictions with a ground truth are scored.
+    """
+
+    y_true, y_pred = get_dataset
+    y_true = y_true.iloc[:-10].copy()
+    y_true.iloc[5] = np.nan
+
+    segment_result_df = compute_segment_metrics(
+        y_true=y_true.sample(frac=1, random_state=42), y_pred=y_pred
+    )
+
+    aligned = y_pred.join(y_true, rsuffix="_gt").dropna()
+    assert segment_result_df.index.name == "datetime_dk"
+    assert segment_result_df["count"].sum() == len(aligned)
+    for datetime_dk, row in segment_result_df.iterrows():
+        data = aligned.xs(datetime_dk, level="datetime_dk")
+
+        np.testing.assert_allclose(
+            row.mape,
+            mean_absolute_percentage_error(
+                y_true=data["consumption_kwh_gt"],
+                y_pred=data["consumption_kwh"],
+                symmetric=False,
+            ),
+        )
+        np.testing.assert_allclose(
+            row.rmspe,
+            mean_squared_percentage_error(
+                y_true=data["consumption_kwh_gt"],
+                y_pred=data["consumption_kwh"],
+                square_root=True,
+            ),
+        )
+        np.testing.assert_allclose(
+            row.bias, (data["consumption_kwh"] - data["consumption_kwh_gt"]).mean()
+        )
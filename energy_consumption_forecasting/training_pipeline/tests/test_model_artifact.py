@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from energy_consumption_forecasting.model_artifact import (
+    BOOSTER_FILENAME,
+    load_model_artifact,
+    save_model_artifact,
+)
+from energy_consumption_forecasting.training_pipeline.model_builder import (
+    build_lightgbm_model,
+)
+
+
+# Creating a dummy hierarchical dataset and a fitted LightGBM forecasting pipeline
+@pytest.fixture
+def get_fitted_model():
+    datetime_range = pd.period_range("2024-01-01 00:00", periods=24 * 8, freq="H")
+    index = pd.MultiIndex.from_product(
+        [[101, 147], [1, 2], datetime_range],
+        names=["municipality_num", "branch", "datetime_dk"],
+    )
+    rng = np.random.default_rng(seed=42)
+    hours = index.get_level_values("datetime_dk").hour.to_numpy()
+    consumption = (
+        100 + 20 * np.sin(2 * np.pi * hours / 24) + rng.normal(size=len(hours))
+    )
+    y = pd.DataFrame({"consumption_kwh": consumption}, index=index)
+    X = pd.DataFrame(index=index)
+
+    model = build_lightgbm_model(
+        summarize_period=[24, 48],
+        model_params={"n_estimators": 20, "n_jobs": 1, "verbose": -1},
+    )
+    model.fit(y=y, X=X)
+    return model, y
+
+
+def test_model_artifact_prediction(get_fitted_model, tmp_path):
+    """
+    In this test the forecaster loaded from the native artifact predicts the same
+    values with the same index as the sktime forecasting pipeline.
+    """
+
+    model, y = get_fitted_model
+    checksum = save_model_artifact(
+        model=model, artifact_dirpath=tmp_path, summarize_period=[24, 48]
+    )
+    forecaster = load_model_artifact(artifact_dirpath=tmp_path, checksum=checksum)
+
+    last_datetime = y.index.get_level_values("datetime_dk").max()
+    forecast_datetime = pd.period_range(start=last_datetime + 1, periods=24, freq="H")
+    X_forecast = pd.DataFrame(
+        index=pd.MultiIndex.from_product(
+            [[101, 147], [1, 2], forecast_datetime], names=y.index.names
+        )
+    )
+    fh = np.arange(24) + 1
+
+    pd.testing.assert_frame_equal(
+        forecaster.predict(fh=fh, X=X_forecast),
+        model.predict(fh=fh, X=X_forecast),
+    )
+    pd.testing.assert_frame_equal(
+        forecaster.predict(fh=fh, y=y), model.predict(fh=fh, X=X_forecast)
+    )
+
+
+def test_model_artifact_checksum(get_fitted_model, tmp_path):
+    """
+    In this test loading the artifact fails when the checksum does not match or a file
+    of the artifact has been modified.
+    """
+
+    model, _ = get_fitted_model
+    save_model_artifact(
+        model=model, artifact_dirpath=tmp_path, summarize_period=[24, 48]
+    )
+
+    with pytest.raises(Exception) as exe_info:
+        load_model_artifact(artifact_dirpath=tmp_path, checksum="0" * 64)
+
+    assert "does not match the checksum" in str(exe_info.value)
+
+    with open(tmp_path / BOOSTER_FILENAME, "a") as file:
+        file.write("\n")
+
+    with pytest.raises(Exception) as exe_info:
+        load_model_artifact(artifact_dirpath=tmp_path)
+
+    assert "failed the checksum" in str(exe_info.value)
+
+
+def test_model_artifact_update(get_fitted_model, tmp_path):
+    """
+    In this test the forecaster updated with new observations predicts the same values
+    as the sktime forecasting pipeline updated with the same observations.
+    """
+
+    model, y = get_fitted_model
+    datetime_index = y.index.get_level_values("datetime_dk")
+    update_datetime = datetime_index.max() - 24
+    model_y = y[datetime_index <= update_datetime]
+    model.fit(y=model_y, X=pd.DataFrame(index=model_y.index))
+
+    save_model_artifact(
+        model=model, artifact_dirpath=tmp_path, summarize_period=[24, 48]
+    )
+    forecaster = load_model_artifact(artifact_dirpath=tmp_path)
+
+    y_new = y[datetime_index > update_datetime]
+    forecaster.update(y=y_new)
+    model.update(y=y_new, X=pd.DataFrame(index=y_new.index), update_params=False)
+    assert forecaster.cutoff == datetime_index.max()
+
+    fh = np.arange(24) + 1
+    forecast_datetime = pd.period_range(
+        start=datetime_index.max() + 1, periods=24, freq="H"
+    )
+    X_forecast = pd.DataFrame(
+        index=pd.MultiIndex.from_product(
+            [[101, 147], [1, 2], forecast_datetime], names=y.index.names
+        )
+    )
+    pd.testing.assert_frame_equal(
+        forecaster.predict(fh=fh), model.predict(fh=fh, X=X_forecast)
+    )
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from energy_consumption_forecasting.model_artifact import build_native_forecaster
+from energy_consumption_forecasting.training_pipeline import model_refresh
+from energy_consumption_forecasting.training_pipeline.model_builder import (
+    build_lightgbm_model,
+)
+from energy_consumption_forecasting.window_features import build_feature_spec
+
+MODEL_PARAMS = {"n_estimators": 20, "n_jobs": 1, "verbose": -1}
+
+
+# Creating a dummy hierarchical dataset
+@pytest.fixture
+def get_dataset():
+    datetime_range = pd.period_range("2024-01-01 00:00", periods=24 * 10, freq="H")
+    index = pd.MultiIndex.from_product(
+        [[101, 147], [1, 2], datetime_range],
+        names=["municipality_num", "branch", "datetime_dk"],
+    )
+    rng = np.random.default_rng(seed=42)
+    hours = index.get_level_values("datetime_dk").hour.to_numpy()
+    consumption = (
+        100 + 20 * np.sin(2 * np.pi * hours / 24) + rng.normal(size=len(hours))
+    )
+    return pd.DataFrame({"consumption_kwh": consumption}, index=index)
+
+
+def build_previous_forecaster(y: pd.DataFrame, metadata: dict):
+    model = build_lightgbm_model(summarize_period=[24, 48], model_params=MODEL_PARAMS)
+    model.fit(y=y, X=pd.DataFrame(index=y.index))
+    return build_native_forecaster(
+        booster=model.steps_[-1][-1].estimator_.booster_,
+        feature_spec=build_feature_spec(summarize_period=[24, 48]),
+        y=y,
+        metadata=metadata,
+    )
+
+
+def test_refresh_model_incrementally(get_dataset, monkeypatch):
+    """
+    In this test the registered model is refreshed with new trees fitted on the new
+    hours only, and a full training is required once it is due.
+    """
+
+    datetime_index = get_dataset.index.get_level_values("datetime_dk")
+    previous_cutoff = datetime_index.max() - 48
+    previous_forecaster = build_previous_forecaster(
+        y=get_dataset[datetime_index <= previous_cutoff],
+        metadata={
+            "training_cutoff": str(previous_cutoff),
+            "full_retrain_cutoff": str(previous_cutoff - 24),
+            "baseline_mape": 0.1,
+        },
+    )
+    monkeypatch.setattr(
+        model_refresh,
+        "load_previous_forecaster",
+        lambda model_name, model_version: previous_forecaster,
+    )
+
+    forecaster, refresh_metadata = model_refresh.refresh_model_incrementally(
+        y_train=get_dataset, model_params=MODEL_PARAMS, n_estimators=5
+    )
+    assert refresh_metadata["baseline_mape"] == 0.1
+    assert forecaster.cutoff == datetime_index.max()
+    assert forecaster.booster.num_trees() == 25
+    assert forecaster.predict(fh=24).notna().all().all()
+
+    forecaster, _ = model_refresh.refresh_model_incrementally(
+        y_train=get_dataset,
+        model_params=MODEL_PARAMS,
+        full_retrain_every_days=2,
+    )
+    assert forecaster is None
+
+
+def test_select_training_window(get_dataset):
+    """
+    In this test the sliding window keeps the last days of every series along with the
+    hours needed for the window features.
+    """
+
+    X = pd.DataFrame(index=get_dataset.index)
+    y_window, X_window = model_refresh.select_training_window(
+        y_train=get_dataset, X_train=X, window_days=2, window_length=48
+    )
+
+    assert len(y_window) == 4 * (2 * 24 + 48)
+    assert y_window.index.equals(X_window.index)
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from energy_consumption_forecasting.metrics import compute_grouped_metrics
+from energy_consumption_forecasting.training_pipeline.plotting import (
+    load_evaluation_data,
+    render_evaluation_plots,
+    save_evaluation_data,
+)
+
+
+# Creating a dummy hierarchical actual and prediction dataset for testing the plots
+@pytest.fixture
+def get_dataset():
+    datetime_range = pd.period_range("2024-01-01 00:00", periods=24, freq="H")
+    index = pd.MultiIndex.from_product(
+        [[101, 147], [1, 2], datetime_range],
+        names=["municipality_num", "branch", "datetime_dk"],
+    )
+    rng = np.random.default_rng(seed=42)
+    y_test = pd.DataFrame(
+        {"consumption_kwh": rng.uniform(low=1, high=100, size=len(index))}, index=index
+    )
+    y_pred = y_test + rng.normal(size=(len(index), 1))
+    _, grouped_result_df = compute_grouped_metrics(y_true=y_test, y_pred=y_pred)
+    return y_test, y_pred, grouped_result_df
+
+
+def test_render_evaluation_plots(get_dataset, tmp_path):
+    """
+    In this test a plot is rendered in the worker processes for every series along
+    with the metrics result plot.
+    """
+
+    plot_filepaths = render_evaluation_plots(
+        *get_dataset, save_dirpath=tmp_path, n_jobs=2
+    )
+
+    assert sorted(filepath.name for filepath in plot_filepaths) == [
+        "metrics_result.png",
+        "pred_plot_101_1.png",
+        "pred_plot_101_2.png",
+        "pred_plot_147_1.png",
+        "pred_plot_147_2.png",
+    ]
+    assert all(filepath.stat().st_size > 0 for filepath in plot_filepaths)
+
+
+def test_save_and_load_evaluation_data(get_dataset, tmp_path):
+    """
+    In this test the deferred evaluation data is loaded back with the same index and
+    values.
+    """
+
+    save_evaluation_data(*get_dataset, save_dirpath=tmp_path)
+
+    for expected, loaded in zip(get_dataset, load_evaluation_data(tmp_path)):
+        pd.testing.assert_frame_equal(loaded, expected)
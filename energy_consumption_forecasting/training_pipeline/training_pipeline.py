@@ -5,23 +5,27 @@ from pathlib import Path
 from typing import Any, Dict, List, Literal, Optional, Tuple
 
 import joblib
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import seaborn as sns
 from pydantic import validate_call
-from sktime.performance_metrics.forecasting import (
-    mean_absolute_percentage_error,
-    mean_squared_percentage_error,
-)
-from sktime.utils.plotting import plot_series
 
 import wandb
 from energy_consumption_forecasting.exceptions import (
     CustomExceptionMessage,
     log_exception,
 )
+from energy_consumption_forecasting.inference_pipeline.model_cache import (
+    compute_model_dir_checksum,
+    publish_model_pointer,
+)
+from energy_consumption_forecasting.inference_pipeline.utils import get_gcs_bucket
 from energy_consumption_forecasting.logger import get_logger
+from energy_consumption_forecasting.metrics import compute_grouped_metrics
+from energy_consumption_forecasting.model_artifact import (
+    NativeForecaster,
+    save_model_artifact,
+    save_native_artifact,
+)
 from energy_consumption_forecasting.training_pipeline.data_preprocessing import (
     load_prepared_dataset_from_feature_store,
 )
@@ -29,6 +33,16 @@ from energy_consumption_forecasting.training_pipeline.model_builder import (
     build_lightgbm_model,
     build_naive_forecast_model,
 )
+from energy_consumption_forecasting.training_pipeline.model_refresh import (
+    is_drift_detected,
+    refresh_model_incrementally,
+    select_training_window,
+)
+from energy_consumption_forecasting.training_pipeline.plotting import (
+    log_plots_to_wandb,
+    render_evaluation_plots,
+    save_evaluation_data,
+)
 from energy_consumption_forecasting.training_pipeline.utils import init_wandb_run
 from energy_consumption_forecasting.utils import get_env_var, save_json_data
 
@@ -140,10 +154,12 @@ def evaluate_model(
     save_plot: bool = True,
     model_name: str = "forecast_model",
     model_id_or_ver: int = 1,
+    defer_plot: bool = False,
+    n_jobs: int = -1,
 ) -> Tuple[pd.DataFrame, Dict[str, float | pd.DataFrame]]:
     """
-    This function evaluates the model and calculates the error deviation using the MAPE
-    and RMSPE performance metrics.
+    This function evaluates the model and calculates the error deviation using the MAPE,
+    RMSPE, MAE and RMSE performance metrics for every series and overall.
 
     Parameters
     ----------
@@ -170,6 +186,13 @@ def evaluate_model(
     model_id_or_ver: int, default=1
         A integer for model identification.
 
+    defer_plot: bool, default=False
+        Whether to only save the evaluation data and log it as a WandB artifact, the
+        plots are then rendered by "plotting.run_plotting_pipeline" outside of training.
+
+    n_jobs: int, default=-1
+        Number of processes for rendering the plots, -1 uses all the CPU cores.
+
     Returns
     -------
     Tuple[pd.DataFrame, Dict[str, float | pd.DataFrame]]
@@ -184,108 +207,42 @@ def evaluate_model(
     # Performing model
     y_pred = perform_forecast(model=model, X_dataframe=X_test, fh=fh)
 
-    # Calculating quantitative performance metrics and adding it in a result dict.
-    result_dict = {}
-    mape = mean_absolute_percentage_error(y_true=y_test, y_pred=y_pred, symmetric=False)
-    rmspe = mean_squared_percentage_error(
-        y_true=y_test, y_pred=y_pred, square_root=True
+    # Calculating quantitative performance metrics for every branch in the hierarchy
+    # and the overall metrics in a single vectorized pass
+    result_dict, grouped_result_df = compute_grouped_metrics(
+        y_true=y_test, y_pred=y_pred
     )
-    result_dict["mape"] = mape
-    result_dict["rmspe"] = rmspe
 
-    # Grouping the data and evaluating for every branch in the hierarchy
-    grouped_result_df = pd.DataFrame(
-        columns=["municipality_num", "branch", "mape", "rmspe"]
-    )
-    y_test_group = y_test.reset_index(level=[0, 1]).groupby(
-        ["municipality_num", "branch"]
-    )
-    y_pred_group = y_pred.reset_index(level=[0, 1]).groupby(
-        ["municipality_num", "branch"]
-    )
-
-    for y_test_group, y_pred_group in zip(y_test_group, y_pred_group):
-        (y_test_m_num, y_test_branch), y_test_data = y_test_group
-        (y_pred_m_num, y_pred_branch), y_pred_data = y_pred_group
-
-        assert (
-            y_test_m_num == y_pred_m_num and y_test_branch == y_pred_branch
-        ), "y_test and y_pred grouped data are not aligned"
-
-        # Calculating quantitative performance metric on every branched data
-        mape_group = mean_absolute_percentage_error(
-            y_true=y_test_data, y_pred=y_pred_data, symmetric=False
+    # Rendering the plots in parallel processes and logging them in a single call,
+    # or saving the evaluation data for rendering the plots in a later step
+    if save_plot and defer_plot:
+        filepaths = save_evaluation_data(
+            y_test=y_test,
+            y_pred=y_pred,
+            grouped_result_df=grouped_result_df,
+            save_dirpath=save_dirpath,
         )
-        rmspe_group = mean_squared_percentage_error(
-            y_true=y_test_data, y_pred=y_pred_data, square_root=True
+        artifact = wandb.Artifact(
+            name=f"{model_name}_{model_id_or_ver}_evaluation_data", type="dataset"
         )
+        for filepath in filepaths:
+            artifact.add_file(local_path=filepath)
+        wandb.log_artifact(artifact)
 
-        group_df = pd.DataFrame(
-            {
-                "municipality_num": [y_test_m_num],
-                "branch": [y_test_branch],
-                "mape": [mape_group],
-                "rmspe": [rmspe_group],
-            }
+        logger.info(
+            f'Evaluation data is saved in the directory: "{save_dirpath}", the plots '
+            'are deferred to the "plotting.run_plotting_pipeline" step.'
         )
-        grouped_result_df = pd.concat([grouped_result_df, group_df], ignore_index=True)
-
-        # Plotting actual and prediction results and saving the plot
-        if save_plot:
-            fig, axs = plot_series(
-                y_test_data.consumption_kwh,
-                y_pred_data.consumption_kwh,
-                labels=["Actual - y_test", "Prediction - y_pred"],
-                markers=["", ""],
-            )
-            fig.suptitle(
-                f"Municipality Num: {y_test_m_num} - Branch: {y_test_branch}\n"
-            )
 
-            plot_filepath = (
-                save_dirpath / f"pred_plot_{y_test_m_num}_{y_test_branch}.png"
-            )
-            plt.savefig(plot_filepath)
-            plt.close(fig)
-
-            wandb.log({plot_filepath.stem: wandb.Image(str(plot_filepath))})
-
-    # Plotting and saving performance metrics result
-    if save_plot:
-        fig, axs = plt.subplots(2, 1, figsize=(25, 25))
-        fig.suptitle(
-            t="Quantitative Performance Metrics: MAPE and RMSPE\n\n",
-            weight="bold",
-            size=25,
+    elif save_plot:
+        plot_filepaths = render_evaluation_plots(
+            y_test=y_test,
+            y_pred=y_pred,
+            grouped_result_df=grouped_result_df,
+            save_dirpath=save_dirpath,
+            n_jobs=n_jobs,
         )
-
-        for i, metrics in enumerate(["mape", "rmspe"]):
-            sns.barplot(
-                data=grouped_result_df,
-                x="municipality_num",
-                y=metrics,
-                hue="branch",
-                palette="Set1",
-                ax=axs[i],
-            )
-            axs[i].set_xticks(axs[i].get_xticks())
-            axs[i].set_xticklabels(
-                grouped_result_df.municipality_num.unique(), rotation=90, size=12
-            )
-            axs[i].tick_params(axis="y", labelsize=12)
-            axs[i].set_xlabel("Municipality Number\n", size=20)
-            axs[i].set_ylabel(f"{metrics.upper()}", size=20)
-            axs[i].legend(
-                title="Branch",
-                title_fontsize=15,
-                fontsize=12,
-            )
-        plt.tight_layout()
-        plot_filepath = save_dirpath / "metrics_result.png"
-        plt.savefig(plot_filepath)
-        plt.close(fig)
-
-        wandb.log({plot_filepath.stem: wandb.Image(str(plot_filepath))})
+        log_plots_to_wandb(plot_filepaths)
 
         logger.info(
             f'All the plot are saved in the directory: "{save_dirpath}" '
@@ -308,6 +265,7 @@ def save_model_to_hopsworks(
     model_ver: int,
     model_filepath: Path,
     model_metrics: Dict[str, float],
+    model_checksum: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
     Save the model within the hopsworks registry, by connecting to the hopsworks
@@ -326,11 +284,15 @@ def save_model_to_hopsworks(
         Version of the model in integer format.
 
     model_filepath: pathlib.Path
-        Locally saved model filepath in pathlib.Path format.
+        Locally saved model filepath or model artifact directory in pathlib.Path format.
 
     model_metrics: Dict[str, float]
         Performance metrics to log with the model needs to be in dict format.
 
+    model_checksum: str or None, default=None
+        The SHA-256 checksum of the model artifact, it is saved in the model description
+        as JSON so that the artifact can be verified after downloading it.
+
     Returns
     -------
     Dict[str, Any]
@@ -366,6 +328,7 @@ def save_model_to_hopsworks(
         name=model_name,
         version=model_ver,
         metrics=model_metrics,
+        description=json.dumps({"artifact_checksum": model_checksum}),
     )
     model_meta_obj.save(model_path=model_filepath)
     logger.info(
@@ -385,10 +348,16 @@ def model_training_pipeline(
     training_dataset_ver: int = 1,
     target_feature: str = "consumption_kwh",
     save_plot: bool = True,
+    defer_plot: bool = False,
     model_type: Literal["naive", "lightgbm"] = "lightgbm",
     model_name: str = "forecast_model",
     model_id_or_ver: int = 1,
     model_params_or_path: Optional[str | Path | Dict[str, Any]] = None,
+    refresh_mode: Literal["full", "incremental", "sliding_window"] = "full",
+    sliding_window_days: int = 90,
+    full_retrain_every_days: int = 7,
+    incremental_n_estimators: int = 50,
+    drift_tolerance: float = 0.25,
 ) -> Dict[str, Any]:
     """
     This function performs the model training pipeline, where it builds the specified
@@ -424,6 +393,10 @@ def model_training_pipeline(
     save_plot: bool, default=True
         Save the generated plot locally and log it in WandB, takes in only boolean values.
 
+    defer_plot: bool, default=False
+        Whether to defer the plots, the evaluation data is logged as a WandB artifact
+        and the plots are rendered later by "plotting.run_plotting_pipeline".
+
     model_type: Literal["naive", "lightgbm"], default="lightgbm",
         Build, train and evaluate the model, currently supports only two models "naive" and
         "lightgbm" as model_type values.
@@ -438,6 +411,33 @@ def model_training_pipeline(
     model_params_or_path: str or Path or dict or None, default=None
         A json file path or dict containing model parameters of LightGBM model.
         It is ignored if model_type "naive" is been provided.
+        If it contains the key "summarize_period", then that value is used instead
+        of the summarize_period argument.
+
+    refresh_mode: Literal["full", "incremental", "sliding_window"], default="full"
+        How the LightGBM model is refreshed with the new data, it is ignored if
+        model_type "naive" is been provided.
+        "full": the model is trained on the complete training dataset.
+        "incremental": the boosting of the registered model continues on the hours
+        that arrived after its last training, a full training is performed when there
+        is no registered model, the last full training is older than
+        full_retrain_every_days or a drift is detected.
+        "sliding_window": the model is trained on the last sliding_window_days of the
+        training dataset, so the training time does not grow with the history.
+
+    sliding_window_days: int, default=90
+        Number of days of training data used by the "sliding_window" refresh mode.
+
+    full_retrain_every_days: int, default=7
+        Number of days after which the "incremental" refresh mode performs a full
+        training.
+
+    incremental_n_estimators: int, default=50
+        Number of boosting rounds added by the "incremental" refresh mode.
+
+    drift_tolerance: float, default=0.25
+        Relative increase of the MAPE over the last fully trained model, above which
+        the "incremental" refresh mode performs a full training.
 
     Returns
     -------
@@ -497,6 +497,13 @@ def model_training_pipeline(
                 with open(Path(model_params_or_path)) as file:
                     model_params_or_path = json.load(file)
 
+            # Summarize period is not a LightGBM parameter, it is present in the
+            # configuration only when it was tuned along with the hyperparameters
+            model_params_or_path = dict(model_params_or_path)
+            summarize_period = model_params_or_path.pop(
+                "summarize_period", summarize_period
+            )
+
             # Updating the WandB config with the hyperparameters
             run.config.update(model_params_or_path)
 
@@ -509,9 +516,36 @@ def model_training_pipeline(
                 f"{model_params_or_path} and now ready for training."
             )
 
-        forecast_model = train_model(
-            model=forecast_model, X_train=X_train, y_train=y_train, fh=fh
-        )
+        # Refreshing the registered model with the new hours instead of training it
+        is_refreshed, refresh_metadata = False, {}
+        if model_type == "lightgbm" and refresh_mode == "incremental":
+            refreshed_model, refresh_metadata = refresh_model_incrementally(
+                y_train=y_train,
+                model_params=model_params_or_path,
+                model_name=model_name,
+                model_version=model_id_or_ver,
+                n_estimators=incremental_n_estimators,
+                full_retrain_every_days=full_retrain_every_days,
+            )
+            if refreshed_model is not None:
+                forecast_model, is_refreshed = refreshed_model, True
+
+        if model_type == "lightgbm" and refresh_mode == "sliding_window":
+            y_train, X_train = select_training_window(
+                y_train=y_train,
+                X_train=X_train,
+                window_days=sliding_window_days,
+                window_length=max(summarize_period),
+            )
+            logger.info(
+                f"Model is trained on the last {sliding_window_days} days of the "
+                "training dataset."
+            )
+
+        if not is_refreshed:
+            forecast_model = train_model(
+                model=forecast_model, X_train=X_train, y_train=y_train, fh=fh
+            )
         logger.info("Model training has been completed successfully.")
 
         y_pred, metrics_dict = evaluate_model(
@@ -520,9 +554,42 @@ def model_training_pipeline(
             y_test=y_test,
             fh=fh,
             save_plot=save_plot,
+            defer_plot=defer_plot,
             model_name=model_name,
             model_id_or_ver=model_id_or_ver,
         )
+
+        # Falling back to a full training when the refreshed model has drifted
+        if is_refreshed and is_drift_detected(
+            metrics_dict=metrics_dict,
+            refresh_metadata=refresh_metadata,
+            drift_tolerance=drift_tolerance,
+        ):
+            logger.info(
+                f'Refreshed model MAPE "{metrics_dict["mape"]}" has drifted from the '
+                f'last fully trained model MAPE "{refresh_metadata["baseline_mape"]}", '
+                "performing a full training."
+            )
+            forecast_model = train_model(
+                model=build_lightgbm_model(
+                    summarize_period=summarize_period,
+                    model_params=model_params_or_path,
+                ),
+                X_train=X_train,
+                y_train=y_train,
+                fh=fh,
+            )
+            is_refreshed = False
+            y_pred, metrics_dict = evaluate_model(
+                model=forecast_model,
+                X_test=X_test,
+                y_test=y_test,
+                fh=fh,
+                save_plot=save_plot,
+                defer_plot=defer_plot,
+                model_name=model_name,
+                model_id_or_ver=model_id_or_ver,
+            )
         metrics_df = metrics_dict.pop("grouped_result_df")
 
         pred_start_datetime = y_pred.index.get_level_values("datetime_dk").min()
@@ -561,6 +628,44 @@ def model_training_pipeline(
             f"Model pickle file is been saved locally at: {save_model_filepath}"
         )
 
+        # Saving the LightGBM model as a compact native artifact, which is registered
+        # in the model registry instead of the pickle file for a fast inference load,
+        # along with the refresh state needed by the next incremental refresh
+        registry_model_path, model_checksum = save_model_filepath, None
+        if model_type == "lightgbm":
+            refresh_metadata = {
+                "refresh_mode": "incremental" if is_refreshed else refresh_mode,
+                "training_cutoff": str(train_end_datetime),
+                "full_retrain_cutoff": (
+                    refresh_metadata["full_retrain_cutoff"]
+                    if is_refreshed
+                    else str(train_end_datetime)
+                ),
+                "baseline_mape": (
+                    refresh_metadata["baseline_mape"]
+                    if is_refreshed
+                    else metrics_dict["mape"]
+                ),
+            }
+            registry_model_path = save_dirpath / "model_artifact"
+            if isinstance(forecast_model, NativeForecaster):
+                forecast_model.metadata = refresh_metadata
+                model_checksum = save_native_artifact(
+                    forecaster=forecast_model, artifact_dirpath=registry_model_path
+                )
+            else:
+                model_checksum = save_model_artifact(
+                    model=forecast_model,
+                    artifact_dirpath=registry_model_path,
+                    summarize_period=summarize_period,
+                    target_feature=target_feature,
+                    metadata=refresh_metadata,
+                )
+            logger.info(
+                f"Model artifact is been saved locally at: {registry_model_path} "
+                f"with the checksum: {model_checksum}"
+            )
+
         # Creating a wandb artifact of model and logging it in wandb
         # and also saving the model in the hopsworks model registry
         metadata = {
@@ -583,19 +688,38 @@ def model_training_pipeline(
             },
             "result": {"metrics": metrics_dict},
             "model_params": model_params_or_path,
+            "model_checksum": model_checksum,
+            "model_refresh": refresh_metadata,
         }
 
         metadata["model_registry"] = save_model_to_hopsworks(
             model_name=model_name,
             model_ver=model_id_or_ver,
-            model_filepath=save_model_filepath,
+            model_filepath=registry_model_path,
             model_metrics=metrics_dict,
+            model_checksum=model_checksum,
+        )
+
+        # Publishing the checksum of the registered model, the model caches revalidate
+        # it with the pointer blob instead of requesting the model registry
+        publish_model_pointer(
+            bucket=get_gcs_bucket(),
+            model_name=model_name,
+            model_version=model_id_or_ver,
+            checksum=(
+                model_checksum
+                if model_checksum is not None
+                else compute_model_dir_checksum(registry_model_path)
+            ),
         )
+        logger.info(f"Model pointer of {model_name}_{model_id_or_ver} is published.")
 
         artifact = wandb.Artifact(
             name=f"{model_name}_{model_id_or_ver}", type="model", metadata=metadata
         )
         artifact.add_file(local_path=save_model_filepath)
+        if model_checksum is not None:
+            artifact.add_dir(local_path=registry_model_path, name="model_artifact")
         run.log_artifact(artifact)
 
         metadata_filepath = save_dirpath / f"{model_name}_{model_id_or_ver}.json"
@@ -666,6 +790,13 @@ if __name__ == "__main__":
         'only boolean values accepted either "True" or "False"',
     )
 
+    parser.add_argument(
+        "--defer_plot",
+        action="store_true",
+        help="Save the evaluation data instead of the plots, the plots are rendered "
+        'later by the "plotting.py" module.',
+    )
+
     parser.add_argument(
         "--model_type",
         type=str.lower,
@@ -699,6 +830,48 @@ if __name__ == "__main__":
         "for LightGBM model",
     )
 
+    parser.add_argument(
+        "--refresh_mode",
+        type=str.lower,
+        default="full",
+        choices=["full", "incremental", "sliding_window"],
+        help="How the LightGBM model is refreshed with the new data, either a full "
+        "training, an incremental boosting of the registered model or a training on "
+        "a sliding window of the recent data.",
+    )
+
+    parser.add_argument(
+        "--sliding_window_days",
+        type=int,
+        default=90,
+        help='Number of days of training data used by the "sliding_window" refresh '
+        "mode, needs to be in integer format.",
+    )
+
+    parser.add_argument(
+        "--full_retrain_every_days",
+        type=int,
+        default=7,
+        help='Number of days after which the "incremental" refresh mode performs a '
+        "full training, needs to be in integer format.",
+    )
+
+    parser.add_argument(
+        "--incremental_n_estimators",
+        type=int,
+        default=50,
+        help='Number of boosting rounds added by the "incremental" refresh mode, '
+        "needs to be in integer format.",
+    )
+
+    parser.add_argument(
+        "--drift_tolerance",
+        type=float,
+        default=0.25,
+        help="Relative increase of the MAPE above which the incremental refresh "
+        "falls back to a full training, needs to be in float format.",
+    )
+
     args = parser.parse_args()
 
     model_training_pipeline(
@@ -709,8 +882,14 @@ if __name__ == "__main__":
         training_dataset_ver=args.dataset_ver,
         target_feature=args.target_feature,
         save_plot=args.save_plot,
+        defer_plot=args.defer_plot,
         model_type=args.model_type,
         model_name=args.model_name,
         model_id_or_ver=args.model_ver,
         model_params_or_path=args.model_params_or_path,
+        refresh_mode=args.refresh_mode,
+        sliding_window_days=args.sliding_window_days,
+        full_retrain_every_days=args.full_retrain_every_days,
+        incremental_n_estimators=args.incremental_n_estimators,
+        drift_tolerance=args.drift_tolerance,
     )
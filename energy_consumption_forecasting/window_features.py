@@ -0,0 +1,288 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+SERIES_LEVELS = ["municipality_num", "branch"]
+DATETIME_LEVEL = "datetime_dk"
+
+
+def build_feature_spec(
+    summarize_period: List[int] = [24, 48, 72],
+    target_feature: str = "consumption_kwh",
+) -> Dict[str, Any]:
+    """
+    This function builds the feature specification of the LightGBM forecasting model.
+    The specification describes the same features that are generated by the sktime
+    pipeline in "model_builder.build_lightgbm_model", i.e. the WindowSummarizer lag,
+    mean and std features and the DateTimeFeatures calendar features.
+
+    Parameters
+    ----------
+    summarize_period: List[int], default=[24, 48, 72]
+        The period at which the window summarizer transformer will be applied and
+        calculate the lag, mean and std.
+        For eg. [24, 48, 72] indicate: lag of 72 period, mean and std of first
+        24 period, then 48 period and last 72 period.
+
+    target_feature: str, default="consumption_kwh"
+        The name of the target feature in the dataset.
+
+    Returns
+    -------
+    Dict[str, Any]
+        A JSON serializable dict containing the feature specification.
+    """
+
+    windows = [[1, i] for i in summarize_period]
+    lags = list(range(1, summarize_period[-1] + 1))
+
+    return {
+        "target_feature": target_feature,
+        "lag": lags,
+        "mean": windows,
+        "std": windows,
+        "calendar": ["day_of_week", "hour_of_day"],
+        # Number of past observations needed to compute every window feature
+        "window_length": max(lags + [lag + length - 1 for lag, length in windows]),
+        "dtype": "float64",
+    }
+
+
+def get_feature_names(feature_spec: Dict[str, Any]) -> List[str]:
+    """
+    This function returns the names of all the features in the feature specification,
+    the names are the same as the column names generated by the sktime pipeline.
+    """
+
+    target_feature = feature_spec["target_feature"]
+    names = [f"{target_feature}_lag_{lag}" for lag in feature_spec["lag"]]
+    for summarizer in ["mean", "std"]:
+        names += [
+            f"{target_feature}_{summarizer}_{lag}_{length}"
+            for lag, length in feature_spec[summarizer]
+        ]
+
+    return names + list(feature_spec["calendar"])
+
+
+def build_series_panel(
+    y: pd.DataFrame, target_feature: str = "consumption_kwh"
+) -> pd.DataFrame:
+    """
+    This function transforms the hierarchical target dataframe into a panel, where
+    every row is a hour and every column is a (municipality_num, branch) series.
+    Missing hours are added as NaN values to keep the hourly frequency.
+
+    Parameters
+    ----------
+    y: pd.DataFrame
+        A dataframe indexed by municipality_num, branch and datetime_dk containing the
+        target feature.
+
+    target_feature: str, default="consumption_kwh"
+        The name of the target feature in the dataset.
+
+    Returns
+    -------
+    pd.DataFrame
+        A panel dataframe indexed by datetime_dk with a column for every series.
+    """
+
+    panel = y[target_feature].unstack(level=SERIES_LEVELS).sort_index(axis=1)
+    datetime_index = panel.index
+
+    panel = panel.reindex(
+        pd.period_range(
+            start=datetime_index.min(), end=datetime_index.max(), freq="H"
+        ).rename(DATETIME_LEVEL)
+    )
+
+    return panel.astype("float64")
+
+
+def compute_calendar_features(
+    datetime_index: pd.PeriodIndex, feature_spec: Dict[str, Any]
+) -> Dict[str, np.ndarray]:
+    """
+    This function computes the calendar features of the sktime DateTimeFeatures
+    transformer for the provided hourly datetime index.
+    """
+
+    calendar_features = {
+        "day_of_week": datetime_index.dayofweek,
+        "hour_of_day": datetime_index.hour,
+    }
+
+    return {
+        name: np.asarray(calendar_features[name], dtype="int64")
+        for name in feature_spec["calendar"]
+    }
+
+
+def build_feature_matrix(
+    y: pd.DataFrame, feature_spec: Dict[str, Any]
+) -> Tuple[pd.DataFrame, pd.Series]:
+    """
+    This function builds the training feature matrix and the target for all the series
+    in a single vectorized pass. The rows are ordered by municipality_num, branch and
+    datetime_dk like the sktime reduction, and the first "window_length" hours of every
+    series are left out because their window features are incomplete.
+
+    Parameters
+    ----------
+    y: pd.DataFrame
+        A dataframe indexed by municipality_num, branch and datetime_dk containing the
+        target feature.
+
+    feature_spec: Dict[str, Any]
+        The feature specification generated by "build_feature_spec".
+
+    Returns
+    -------
+    Tuple[pd.DataFrame, pd.Series]
+        The feature matrix and the target series, indexed like y.
+    """
+
+    target_feature = feature_spec["target_feature"]
+    target = y[target_feature].sort_index().astype(feature_spec["dtype"])
+    grouped_target = target.groupby(level=SERIES_LEVELS)
+
+    features = {}
+    for lag in feature_spec["lag"]:
+        features[f"{target_feature}_lag_{lag}"] = grouped_target.shift(lag)
+
+    # Like the WindowSummarizer the rolling window runs over the concatenated series,
+    # the NaN values of the shifted series keep the windows from crossing two series
+    for summarizer in ["mean", "std"]:
+        for lag, length in feature_spec[summarizer]:
+            features[f"{target_feature}_{summarizer}_{lag}_{length}"] = getattr(
+                grouped_target.shift(lag).rolling(window=length, min_periods=length),
+                summarizer,
+            )()
+
+    features.update(
+        compute_calendar_features(
+            datetime_index=target.index.get_level_values(DATETIME_LEVEL),
+            feature_spec=feature_spec,
+        )
+    )
+    feature_matrix = pd.DataFrame(features, index=target.index)[
+        get_feature_names(feature_spec)
+    ]
+
+    # Keeping only the rows with a complete window of past observations
+    has_window = grouped_target.cumcount() >= feature_spec["window_length"]
+
+    return feature_matrix[has_window], target[has_window]
+
+
+def get_last_window(
+    panel: pd.DataFrame,
+    feature_spec: Dict[str, Any],
+    cutoff: Optional[pd.Period] = None,
+) -> np.ndarray:
+    """
+    This function returns the last "window_length" observations of every series in
+    the panel up to and including the cutoff, the returned array has a row for every
+    series in the same order as the panel columns.
+    """
+
+    if cutoff is not None:
+        panel = panel.loc[:cutoff]
+
+    return panel.iloc[-feature_spec["window_length"] :].to_numpy(dtype="float64").T
+
+
+def recursive_forecast(
+    predict: Callable[[np.ndarray], np.ndarray],
+    last_window: np.ndarray,
+    start_datetime: pd.Period,
+    fh: int,
+    feature_spec: Dict[str, Any],
+    feature_names: Optional[List[str]] = None,
+) -> np.ndarray:
+    """
+    This function performs a recursive forecast for all the series at once. At every
+    step the features are computed from the window of the past observations and
+    previous predictions, the model predicts the next hour for all the series and the
+    prediction is added to the window.
+
+    The window features are computed on the same window of "window_length + 1" hours
+    as the sktime recursive reducer, which makes the predictions numerically identical
+    to the predictions of the sktime forecasting pipeline.
+
+    Parameters
+    ----------
+    predict: Callable[[np.ndarray], np.ndarray]
+        A function that takes a 2D feature array and returns a prediction for every
+        row, for eg. "lightgbm.Booster.predict".
+
+    last_window: np.ndarray
+        A 2D array of the last "window_length" observations with a row for every series.
+
+    start_datetime: pd.Period
+        The first hour of the forecast.
+
+    fh: int
+        A period that indicates the forecast horizon while making prediction in Hours.
+
+    feature_spec: Dict[str, Any]
+        The feature specification generated by "build_feature_spec".
+
+    feature_names: List[str] or None, default=None
+        The order of the features expected by the model, by default the order of
+        "get_feature_names".
+
+    Returns
+    -------
+    np.ndarray
+        A 2D array of the predictions with a row for every series and a column for
+        every hour of the forecast horizon.
+    """
+
+    if feature_names is None:
+        feature_names = get_feature_names(feature_spec)
+
+    target_feature = feature_spec["target_feature"]
+    window_length = feature_spec["window_length"]
+    n_series = last_window.shape[0]
+
+    # The window holds the past observations and a slot for the predicted hour
+    window = np.full((n_series, window_length + 1), np.nan, dtype="float64")
+    window[:, :window_length] = last_window[:, -window_length:]
+
+    forecast_datetime = pd.period_range(start=start_datetime, periods=fh, freq="H")
+    calendar_features = compute_calendar_features(
+        datetime_index=forecast_datetime, feature_spec=feature_spec
+    )
+
+    prediction = np.empty((n_series, fh), dtype="float64")
+    for step in range(fh):
+        panel = pd.DataFrame(window.T)
+        features = {
+            f"{target_feature}_lag_{lag}": window[:, window_length - lag]
+            for lag in feature_spec["lag"]
+        }
+        for summarizer in ["mean", "std"]:
+            for lag, length in feature_spec[summarizer]:
+                features[f"{target_feature}_{summarizer}_{lag}_{length}"] = (
+                    getattr(
+                        panel.shift(lag).rolling(window=length, min_periods=length),
+                        summarizer,
+                    )()
+                    .iloc[-1]
+                    .to_numpy()
+                )
+        for name, values in calendar_features.items():
+            features[name] = np.full(n_series, values[step], dtype="float64")
+
+        feature_array = np.column_stack([features[name] for name in feature_names])
+        prediction[:, step] = predict(feature_array)
+
+        # Moving the window by an hour and adding the prediction as an observation
+        window[:, :-1] = window[:, 1:]
+        window[:, window_length - 1] = prediction[:, step]
+        window[:, window_length] = np.nan
+
+    return prediction